@@ -4,13 +4,16 @@ AlphaFund 投研智能体 - 多智能体协同工作流
 使用 Google Search 工具获取实时市场数据
 """
 
+import logging
 import os
 import json
 import asyncio
-import requests
 from typing import Dict, List, Optional, Any
 from datetime import datetime
 from dotenv import load_dotenv
+from services.http_client import http_session
+
+logger = logging.getLogger(__name__)
 
 load_dotenv()
 
@@ -41,7 +44,7 @@ def call_gemini_with_search(prompt: str, use_search: bool = False, temperature:
         payload["tools"] = [{"googleSearch": {}}]
     
     try:
-        resp = requests.post(
+        resp = http_session().post(
             api_url,
             headers={
                 "Content-Type": "application/json",
@@ -293,9 +296,9 @@ class AlphaFundAgent:
             # Debug: 检查是否包含表格
             content = result["text"]
             has_table = '|' in content and '---' in content
-            print(f"[AlphaFund] 量化分析输出长度: {len(content)}, 包含表格: {has_table}, 搜索来源数: {len(result['sources'])}")
+            logger.debug("[AlphaFund] 量化分析输出长度: %s, 包含表格: %s, 搜索来源数: %s", len(content), has_table, len(result['sources']))
             if not has_table:
-                print(f"[AlphaFund] ⚠️ 量化分析缺少 Markdown 表格！")
+                logger.warning("[AlphaFund] ⚠️ 量化分析缺少 Markdown 表格！")
             
             return {
                 "role": "QUANT_ANALYST",
@@ -514,11 +517,11 @@ class AlphaFundAgent:
         }
         
         try:
-            print(f"[AlphaFund] 开始流式工作流：{topic}，深度研究={deep_research}")
+            logger.info("[AlphaFund] 开始流式工作流：%s，深度研究=%s", topic, deep_research)
             
             # 1. 深度研究（可选）
             if deep_research:
-                print("[AlphaFund] 执行：深度研究")
+                logger.debug("[AlphaFund] 执行：深度研究")
                 deep_msg = await self.run_deep_researcher(topic)
                 self.shared_context.append(deep_msg)
                 report_data["deepResearchAnalysis"] = deep_msg.get("content", "")
@@ -526,7 +529,7 @@ class AlphaFundAgent:
                 yield {"type": "agent_complete", "agent": deep_msg, "report": report_data.copy()}
             
             # 2. 市场分析
-            print("[AlphaFund] 执行：市场分析")
+            logger.debug("[AlphaFund] 执行：市场分析")
             analyst_msg = await self.run_market_analyst(topic, self.shared_context)
             self.shared_context.append(analyst_msg)
             report_data["marketAnalysis"] = analyst_msg.get("content", "")
@@ -534,7 +537,7 @@ class AlphaFundAgent:
             yield {"type": "agent_complete", "agent": analyst_msg, "report": report_data.copy()}
             
             # 3. 量化分析
-            print("[AlphaFund] 执行：量化分析")
+            logger.debug("[AlphaFund] 执行：量化分析")
             quant_msg = await self.run_quant_analyst(topic, self.shared_context)
             self.shared_context.append(quant_msg)
             report_data["quantAnalysis"] = quant_msg.get("content", "")
@@ -542,7 +545,7 @@ class AlphaFundAgent:
             yield {"type": "agent_complete", "agent": quant_msg, "report": report_data.copy()}
             
             # 4. 投资组合经理
-            print("[AlphaFund] 执行：投资组合经理")
+            logger.debug("[AlphaFund] 执行：投资组合经理")
             pm_result = await self.run_portfolio_manager(topic, self.shared_context)
             self.shared_context.append(pm_result["message"])
             report_data["title"] = pm_result.get("title", "")
@@ -550,30 +553,28 @@ class AlphaFundAgent:
             yield {"type": "agent_complete", "agent": pm_result["message"], "report": report_data.copy()}
             
             # 5. 评审专家
-            print("[AlphaFund] 执行：评审专家")
+            logger.debug("[AlphaFund] 执行：评审专家")
             critic_msg = await self.run_critic(self.shared_context)
             self.shared_context.append(critic_msg)
             report_data["critiqueAnalysis"] = critic_msg.get("content", "")
             yield {"type": "agent_complete", "agent": critic_msg, "report": report_data.copy()}
             
             # 6. 风险官
-            print("[AlphaFund] 执行：风险官")
+            logger.debug("[AlphaFund] 执行：风险官")
             risk_assessment = await self.run_risk_officer(self.shared_context)
             report_data["riskAssessment"] = risk_assessment
             
             report_data["status"] = "completed"
             report_data["agentContext"] = self.shared_context
             
-            print(f"[AlphaFund] 工作流完成，agentContext 长度={len(self.shared_context)}")
+            logger.info("[AlphaFund] 工作流完成，agentContext 长度=%s", len(self.shared_context))
             yield {"type": "complete", "report": report_data}
             
         except Exception as e:
-            import traceback
-            traceback.print_exc()
             report_data["status"] = "error"
             report_data["error"] = str(e)
             report_data["agentContext"] = self.shared_context
-            print(f"[AlphaFund] 工作流异常，已收集 agentContext={len(self.shared_context)} 条")
+            logger.exception("[AlphaFund] 工作流异常，已收集 agentContext=%s 条", len(self.shared_context))
             yield {"type": "error", "error": str(e), "report": report_data}
     
     async def run_workflow(self, topic: str, deep_research: bool = False) -> Dict:
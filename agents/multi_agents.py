@@ -3,6 +3,8 @@
 每个智能体都有独特的专长和个性
 """
 
+import asyncio
+import logging
 from typing import Dict, List, Optional, Any, Callable
 import urllib.request
 import urllib.error
@@ -21,15 +23,26 @@ except ImportError:
 from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
 from langchain_core.messages import SystemMessage, HumanMessage, AIMessage
 from langchain_core.output_parsers import StrOutputParser
+from langchain_core.callbacks import BaseCallbackHandler
 import os
 import re
 import json
+import functools
+import inspect
+import time
 from dotenv import load_dotenv
 
 load_dotenv()
 
 
 from services.mcp_service import mcp_manager
+from services.http_client import http_session
+from services.analytics import metrics_collector, current_span
+from services.metrics import LLM_REQUEST_SECONDS
+from tools.table_query import TableQueryEngine, build_tool_prompt, parse_tool_call
+from utils.rate_limiter import gemini_limiter
+
+logger = logging.getLogger(__name__)
 
 AGENT_IDS = {
     "文档分析师": "doc_analyst",
@@ -79,8 +92,72 @@ def get_gemini_llm():
     )
 
 
+class _TokenUsageCallback(BaseCallbackHandler):
+    """记录 LLM 接口耗时，并把返回的 token 用量计入当前智能体调用"""
+
+    def __init__(self):
+        self._started: Dict[Any, tuple] = {}
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, metadata=None, **kwargs):
+        self.on_llm_start(serialized, [], run_id=run_id, metadata=metadata, **kwargs)
+
+    def on_llm_start(self, serialized, prompts, *, run_id, metadata=None, **kwargs):
+        metadata = metadata or {}
+        model = metadata.get("ls_model_name") or (kwargs.get("invocation_params") or {}).get("model", "")
+        self._started[run_id] = (time.perf_counter(), metadata.get("ls_provider", ""), model)
+
+    def _observe(self, run_id):
+        started = self._started.pop(run_id, None)
+        if started:
+            start, provider, model = started
+            LLM_REQUEST_SECONDS.observe(time.perf_counter() - start, provider=provider, model=model)
+
+    def on_llm_error(self, error, *, run_id, **kwargs):
+        self._observe(run_id)
+
+    def on_llm_end(self, response, *, run_id, **kwargs):
+        self._observe(run_id)
+        for generations in response.generations:
+            for generation in generations:
+                usage = getattr(getattr(generation, "message", None), "usage_metadata", None)
+                if usage:
+                    metrics_collector.add_tokens(usage.get("total_tokens", 0))
+
+
+_token_usage_callback = _TokenUsageCallback()
+
+
+def _instrument_invoke(invoke: Callable) -> Callable:
+    """为智能体的 invoke 计时（子类通过 super().invoke 嵌套调用时只记录最外层）"""
+    def is_nested(agent) -> bool:
+        span = current_span("agent")
+        return span is not None and span.name == agent.name
+
+    if inspect.iscoroutinefunction(invoke):
+        @functools.wraps(invoke)
+        async def async_wrapper(self, *args, **kwargs):
+            if is_nested(self):
+                return await invoke(self, *args, **kwargs)
+            with metrics_collector.track("agent", self.name, labels={"model": self.model_name}):
+                return await invoke(self, *args, **kwargs)
+        return async_wrapper
+
+    @functools.wraps(invoke)
+    def wrapper(self, *args, **kwargs):
+        if is_nested(self):
+            return invoke(self, *args, **kwargs)
+        with metrics_collector.track("agent", self.name, labels={"model": self.model_name}):
+            return invoke(self, *args, **kwargs)
+    return wrapper
+
+
 class Agent:
     """智能体基类"""
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        if "invoke" in cls.__dict__:
+            cls.invoke = _instrument_invoke(cls.__dict__["invoke"])
     
     def __init__(
         self,
@@ -110,6 +187,9 @@ class Agent:
         api_key = os.getenv("LLM_API_KEY") or os.getenv("GEMINI_API_KEY")
         model_name = os.getenv("LLM_MODEL_NAME") or os.getenv("GEMINI_MODEL", "gemini-3-pro-preview")
         base_url = os.getenv("LLM_BASE_URL")
+        self.model_name = model_name
+        # 只有 Gemini 调用计入 gemini_limiter 的配额
+        self.provider = provider if provider in ["openai", "deepseek", "local"] else "gemini"
         
         # Fallback for existing .env files or default to Gemini
         if not api_key and provider == "gemini":
@@ -123,7 +203,8 @@ class Agent:
                 model=model_name,
                 temperature=self.temperature,
                 google_api_key=api_key,
-                convert_system_message_to_human=True
+                convert_system_message_to_human=True,
+                callbacks=[_token_usage_callback]
             )
         elif provider in ["openai", "deepseek", "local"]:
             if ChatOpenAI is None:
@@ -133,7 +214,8 @@ class Agent:
                 model=model_name,
                 temperature=self.temperature,
                 api_key=api_key,
-                base_url=base_url
+                base_url=base_url,
+                callbacks=[_token_usage_callback]
             )
         else:
             self.llm = ChatGoogleGenerativeAI(
@@ -142,9 +224,12 @@ class Agent:
                 google_api_key=os.getenv("GEMINI_API_KEY"),
                 convert_system_message_to_human=True,
                 max_retries=3,  # 遇到 429 自动重试3次
-                request_timeout=60  # 60秒超时
+                request_timeout=60,  # 60秒超时
+                callbacks=[_token_usage_callback]
             )
+            self.model_name = "gemini-3-pro-preview"
     
+    @_instrument_invoke
     def invoke(self, messages: List[Any], context: Optional[Dict] = None) -> str:
         """调用智能体处理任务"""
         # 构建完整的消息列表
@@ -158,10 +243,21 @@ class Agent:
                 full_messages.insert(1, HumanMessage(content=context_msg))
         
         # 调用 LLM
-        response = self.llm.invoke(full_messages)
-        
-        # 提取文本内容 - 处理可能的列表格式
-        content = response.content
+        return self._call_llm(full_messages)
+
+    def _call_llm(self, messages: List[Any]) -> str:
+        """调用 LLM 并返回文本（Gemini 经过共享限流器；接口耗时与 token 用量由 LLM 回调记录）"""
+        if self.provider == "gemini":
+            return self._call_gemini(messages)
+        return self._content_text(self.llm.invoke(messages).content)
+
+    @gemini_limiter
+    def _call_gemini(self, messages: List[Any]) -> str:
+        return self._content_text(self.llm.invoke(messages).content)
+
+    @staticmethod
+    def _content_text(content: Any) -> str:
+        """提取文本内容 - 处理可能的列表格式"""
         if isinstance(content, list):
             text_parts = []
             for item in content:
@@ -276,7 +372,56 @@ class ContentCreatorAgent(Agent):
         self.example = "请为年度总结撰写一封正式但不失亲和的邮件。"
 
 
-class DataExpertAgent(Agent):
+class TableQueryAgent(Agent):
+    """
+    可查询上传表格的智能体基类
+
+    上下文中带有表格（context["tables"]，表格内容哈希列表）时，把表结构和查询工具写入系统提示词，
+    模型通过 JSON 工具调用执行 SQL / 聚合，拿到小结果集后再作答；没有表格时与普通智能体相同
+    """
+
+    max_tool_steps = 4
+
+    def invoke(self, messages: List[Any], context: Optional[Dict] = None) -> str:
+        table_refs = (context or {}).get("tables")
+        if not table_refs:
+            return super().invoke(messages, context)
+
+        engine = TableQueryEngine(table_refs)
+        if not engine.tables:
+            return super().invoke(messages, context)
+
+        try:
+            full_messages = [SystemMessage(content=self.system_prompt + "\n" + build_tool_prompt(engine))]
+            context_msg = self._format_context(context)
+            if context_msg:
+                full_messages.append(HumanMessage(content=context_msg))
+            full_messages.extend(messages)
+
+            for _ in range(self.max_tool_steps):
+                content = self._call_llm(full_messages)
+                tool_call = parse_tool_call(content)
+                if tool_call is None:
+                    return content
+
+                tool_name = tool_call["tool"]
+                tool_args = tool_call.get("args") or {}
+                logger.debug("[%s] 表格查询: %s args=%s", self.name, tool_name, tool_args)
+                with metrics_collector.track("tool", f"table.{tool_name}") as span:
+                    result = engine.execute(tool_name, tool_args)
+                    if result.startswith("❌"):
+                        span.success = False
+
+                full_messages.append(AIMessage(content=content))
+                full_messages.append(HumanMessage(content=f"工具 {tool_name} 的查询结果:\n{result}"))
+
+            full_messages.append(HumanMessage(content="请基于以上查询结果直接给出最终回答，不要再调用工具。"))
+            return self._call_llm(full_messages)
+        finally:
+            engine.close()
+
+
+class DataExpertAgent(TableQueryAgent):
     """数据分析专家 - 擅长处理表格、数据分析、可视化建议"""
     
     def __init__(self):
@@ -424,7 +569,7 @@ class TranslatorAgent(Agent):
         self.example = "请将这段英文研报摘要翻译成专业但易读的中文。"
 
 
-class DataVisualizationAgent(Agent):
+class DataVisualizationAgent(TableQueryAgent):
     """数据可视化专家 - 生成HTML交互式图表"""
     
     def __init__(self):
@@ -588,11 +733,10 @@ class ImageGeneratorAgent(Agent):
             target = "gemini-2.5-flash-image"
         api_url = f"{base.rstrip('/')}/models/{target}:generateContent"
         
-        print(f"\n[ImageGen] 配置信息:")
-        print(f"  Base URL: {base}")
-        print(f"  Target Model: {target}")
-        print(f"  API URL: {api_url}")
-        print(f"  API Key: {'已配置' if api_key else '未配置'}")
+        logger.debug(
+            "[ImageGen] 配置信息: base=%s model=%s url=%s api_key=%s",
+            base, target, api_url, '已配置' if api_key else '未配置'
+        )
         
         if not api_key:
             return {
@@ -644,8 +788,8 @@ class ImageGeneratorAgent(Agent):
             }
 
         try:
-            print(f"[ImageGen] 发送请求到 Gemini API...")
-            resp = requests.post(
+            logger.debug("[ImageGen] 发送请求到 Gemini API...")
+            resp = http_session().post(
                 api_url,
                 headers={
                     "Content-Type": "application/json",
@@ -654,28 +798,28 @@ class ImageGeneratorAgent(Agent):
                 json=payload,
                 timeout=120,
             )
-            print(f"[ImageGen] 响应状态码: {resp.status_code}")
+            logger.debug("[ImageGen] 响应状态码: %s", resp.status_code)
         except requests.Timeout:
-            print(f"[ImageGen] 请求超时（120秒）")
+            logger.warning("[ImageGen] 请求超时（120秒）")
             return {"success": False, "error": "请求超时", "hint": "Gemini 图像生成 API 响应超时（超过120秒），请稍后重试"}
         except Exception as e:
-            print(f"[ImageGen] 请求异常: {e}")
+            logger.error("[ImageGen] 请求异常: %s", e)
             return {"success": False, "error": str(e), "hint": "网络连接失败或 API 不可用"}
 
         try:
-            print(f"[ImageGen] POST {api_url} -> {resp.status_code}")
+            logger.debug("[ImageGen] POST %s -> %s", api_url, resp.status_code)
         except Exception:
             pass
 
         if resp.status_code != 200:
             body = resp.text[:500] if resp.text else ""
-            print(f"[ImageGen] API 错误响应: {body}")
+            logger.error("[ImageGen] API 错误响应: %s", body)
             hint = f"HTTP {resp.status_code}"
             # Fallback to local demo service if available
             try:
                 demo_url = os.getenv("NANOBANANA_DEMO_URL", "http://localhost:3000/api/generate")
-                print(f"[ImageGen] 尝试 fallback 到本地服务: {demo_url}")
-                dr = requests.post(
+                logger.warning("[ImageGen] 尝试 fallback 到本地服务: %s", demo_url)
+                dr = http_session().post(
                     demo_url,
                     headers={"Content-Type": "application/json"},
                     json={"prompt": prompt, "model": target},
@@ -685,48 +829,46 @@ class ImageGeneratorAgent(Agent):
                     dj = dr.json()
                     b64 = dj.get("imageBase64")
                     if b64:
-                        print(f"[ImageGen] ✓ 本地服务成功")
+                        logger.info("[ImageGen] ✓ 本地服务成功")
                         return {"success": True, "data": {"image_base64": b64}}
                     return {"success": True, "data": dj}
             except Exception as fallback_error:
-                print(f"[ImageGen] 本地服务也失败: {fallback_error}")
+                logger.warning("[ImageGen] 本地服务也失败: %s", fallback_error)
                 pass
             return {"success": False, "error": f"HTTP {resp.status_code}", "hint": f"API返回错误: {body[:100]}"}
 
         try:
             obj = resp.json()
-            print(f"[ImageGen] 解析响应 JSON 成功")
+            logger.debug("[ImageGen] 解析响应 JSON 成功")
         except Exception as e:
-            print(f"[ImageGen] JSON 解析失败: {e}")
+            logger.warning("[ImageGen] JSON 解析失败: %s", e)
             obj = {"raw": base64.b64encode(resp.content).decode("utf-8")}
 
         if isinstance(obj, dict):
             try:
                 cands = obj.get("candidates") or []
-                print(f"[ImageGen] 找到 {len(cands)} 个候选结果")
+                logger.debug("[ImageGen] 找到 %s 个候选结果", len(cands))
                 for c in cands:
                     content = c.get("content") or {}
                     parts_list = content.get("parts") or []
-                    print(f"[ImageGen] 候选结果有 {len(parts_list)} 个 parts")
+                    logger.debug("[ImageGen] 候选结果有 %s 个 parts", len(parts_list))
                     for idx, p in enumerate(parts_list):
-                        print(f"[ImageGen] Part {idx}: keys={list(p.keys())}")
+                        logger.debug("[ImageGen] Part %s: keys=%s", idx, list(p.keys()))
                         # 尝试两种命名方式：camelCase 和 snake_case
                         inline_camel = p.get("inlineData")
                         inline_snake = p.get("inline_data")
                         inline = inline_camel or inline_snake
                         
                         if inline and inline.get("data"):
-                            print(f"[ImageGen] ✓ 成功提取图片数据（{'camelCase' if inline_camel else 'snake_case'}）")
+                            logger.info("[ImageGen] ✓ 成功提取图片数据（%s）", 'camelCase' if inline_camel else 'snake_case')
                             return {"success": True, "data": {"image_base64": inline.get("data")}}
-                print(f"[ImageGen] 未在响应中找到图片数据")
-                print(f"[ImageGen] 完整响应: {str(obj)[:500]}...")
+                logger.warning("[ImageGen] 未在响应中找到图片数据")
+                logger.debug("[ImageGen] 完整响应: %.500s...", obj)
             except Exception as e:
-                print(f"[ImageGen] 提取图片数据失败: {e}")
-                import traceback
-                traceback.print_exc()
+                logger.exception("[ImageGen] 提取图片数据失败: %s", e)
                 pass
         
-        print(f"[ImageGen] 返回原始响应数据")
+        logger.info("[ImageGen] 返回原始响应数据")
         return {"success": True, "data": obj}
 
     def _summarize_document(self, doc_content: str, user_intent: str) -> str:
@@ -749,10 +891,10 @@ class ImageGeneratorAgent(Agent):
 
             response = self.llm.invoke([HumanMessage(content=summary_prompt)])
             summary = response.content if isinstance(response.content, str) else str(response.content)
-            print(f"[ImageGen] 文档摘要生成成功: {summary[:100]}...")
+            logger.info("[ImageGen] 文档摘要生成成功: %.100s...", summary)
             return summary.strip()
         except Exception as e:
-            print(f"[ImageGen] 文档摘要生成失败: {e}")
+            logger.warning("[ImageGen] 文档摘要生成失败: %s", e)
             return user_intent
 
     def invoke(self, messages: List[Any], context: Optional[Dict] = None) -> str:
@@ -763,7 +905,7 @@ class ImageGeneratorAgent(Agent):
         
         if context and context.get('document'):
             doc_content = context['document']
-            print(f"[ImageGen] 检测到文档内容，长度: {len(doc_content)} 字符")
+            logger.info("[ImageGen] 检测到文档内容，长度: %s 字符", len(doc_content))
             
             # 使用 LLM 先总结文档，生成简短的图片提示词
             image_prompt = self._summarize_document(doc_content, user_prompt)
@@ -844,7 +986,7 @@ class DrawingAgent(Agent):
                         tools = ['nano-banana']
                     else:
                         tools = [tool_name]
-                    print(f"[DrawingAgent] 从自然语言中识别到工具指定: {tools}")
+                    logger.info("[DrawingAgent] 从自然语言中识别到工具指定: %s", tools)
                     break
         
         # 调用 generate_images 生成图片
@@ -879,8 +1021,7 @@ class DrawingAgent(Agent):
             
             return "\n\n".join(output_parts)
         except Exception as e:
-            import traceback
-            traceback.print_exc()
+            logger.exception("[ImageGen] 生成图片失败")
             return f"生成图片时出错：{str(e)}"
 
     def _llm_diagram(self, prompt: str, tool: str) -> str:
@@ -1015,7 +1156,7 @@ participant 数据库
                 out = "".join([str(item.get("text", "")) if isinstance(item, dict) else str(item) for item in out])
             return str(out).strip()
         except Exception as e:
-            print(f"[DrawingAgent] LLM调用失败: {e}")
+            logger.warning("[DrawingAgent] LLM调用失败: %s", e)
             return ""
 
     def _render_kroki(self, diagram_type: str, source: str) -> Dict[str, Any]:
@@ -1029,7 +1170,7 @@ participant 数据库
         if diagram_type == "excalidraw":
             url = f"{base}/excalidraw/svg"
             try:
-                r = requests.post(url, json={"diagram_source": source}, headers={"Accept": "image/svg+xml"}, timeout=120)
+                r = http_session().post(url, json={"diagram_source": source}, headers={"Accept": "image/svg+xml"}, timeout=120)
             except Exception as e:
                 return {"success": False, "error": str(e), "hint": "连接 Kroki 失败 (Excalidraw)"}
             if r.status_code != 200:
@@ -1039,7 +1180,7 @@ participant 数据库
         else:
             url = f"{base}/{diagram_type}/svg"
             try:
-                r = requests.post(url, headers={"Content-Type": "text/plain", "Accept": "image/svg+xml"}, data=source, timeout=120)
+                r = http_session().post(url, headers={"Content-Type": "text/plain", "Accept": "image/svg+xml"}, data=source, timeout=120)
             except Exception as e:
                 return {"success": False, "error": str(e), "hint": f"连接 Kroki 失败 ({diagram_type})"}
             if r.status_code != 200:
@@ -1072,13 +1213,12 @@ participant 数据库
             pass
         
         # 打印调试信息
-        print(f"\n[DrawingAgent] 规范化 {t} 代码:")
-        print(f"原始输出: {s[:200]}...")
+        logger.debug("[DrawingAgent] 规范化 %s 代码，原始输出: %.200s...", t, s)
         
         if t == "mermaid":
             has_type = any(x in s for x in ["graph ", "sequenceDiagram", "classDiagram", "stateDiagram", "erDiagram", "gantt", "pie "])
             if not has_type:
-                print(f"[DrawingAgent] Mermaid缺少类型声明，使用fallback")
+                logger.warning("[DrawingAgent] Mermaid缺少类型声明，使用fallback")
                 pp = (prompt or "").lower()
                 if any(k in pp for k in ["时序", "sequence", "登录", "调用链", "cas"]):
                     parts = [w for w in ["用户", "客户端", "CAS服务", "业务系统"] if any(k in prompt for k in [w, w.lower()])]
@@ -1101,7 +1241,7 @@ participant 数据库
                     s = "\n".join(lines)
         elif t == "plantuml":
             if "@startuml" not in s:
-                print(f"[DrawingAgent] PlantUML缺少@startuml/@enduml，使用fallback")
+                logger.warning("[DrawingAgent] PlantUML缺少@startuml/@enduml，使用fallback")
                 pp = (prompt or "").lower()
                 if any(k in pp for k in ["时序", "sequence", "登录", "调用链", "cas"]):
                     actors = [w for w in ["用户", "客户端", "CAS认证中心", "业务系统"] if any(k in prompt for k in [w, w.lower()])]
@@ -1132,7 +1272,7 @@ participant 数据库
                 if not parsed.get("elements") or len(parsed.get("elements", [])) == 0:
                     raise ValueError("Empty elements")
             except Exception as e:
-                print(f"[DrawingAgent] Excalidraw JSON解析失败或为空: {e}，使用fallback")
+                logger.warning("[DrawingAgent] Excalidraw JSON解析失败或为空: %s，使用fallback", e)
                 # 根据 prompt 生成更丰富的 fallback
                 pp = (prompt or "").lower()
                 if any(k in pp for k in ["cas", "认证", "登录"]):
@@ -1173,7 +1313,7 @@ participant 数据库
                         "files": {}
                     })
         
-        print(f"[DrawingAgent] 规范化后: {s[:200]}...")
+        logger.debug("[DrawingAgent] 规范化后: %.200s...", s)
         return s
 
     def _choose_tools(self, prompt: str) -> List[str]:
@@ -1222,27 +1362,27 @@ participant 数据库
             tt = t.strip().lower()
             if tt in ["mermaid", "plantuml", "excalidraw"]:
                 try:
-                    print(f"\n[DrawingAgent] 正在使用LLM生成 {tt} 代码...")
+                    logger.debug("[DrawingAgent] 正在使用LLM生成 %s 代码...", tt)
                     src = self._llm_diagram(prompt, tt)
-                    print(f"[DrawingAgent] LLM输出: {src[:100]}...")
+                    logger.debug("[DrawingAgent] LLM输出: %.100s...", src)
                 except Exception as e:
-                    print(f"[DrawingAgent] LLM生成失败: {e}")
+                    logger.warning("[DrawingAgent] LLM生成失败: %s", e)
                     src = "" if tt in ["mermaid", "plantuml"] else json.dumps({"type":"excalidraw","elements":[]}, ensure_ascii=False)
                 src = self._normalize_source(tt, src, prompt)
-                print(f"[DrawingAgent] 最终代码: {src[:200]}...")
+                logger.debug("[DrawingAgent] 最终代码: %.200s...", src)
                 rr = self._render_kroki(tt, src)
                 if rr.get("success"):
-                    print(f"[DrawingAgent] ✓ {tt} 渲染成功")
+                    logger.info("[DrawingAgent] ✓ %s 渲染成功", tt)
                     results.append({"tool": tt, "image_base64": rr.get("image_base64"), "mime": rr.get("mime", "image/png"), "source_code": src})
                 else:
-                    print(f"[DrawingAgent] ✗ {tt} 渲染失败: {rr.get('error')}")
+                    logger.error("[DrawingAgent] ✗ %s 渲染失败: %s", tt, rr.get('error'))
                     # 只有在允许 fallback 且是 mermaid 时才尝试 fallback
                     if tt == "mermaid" and enable_fallback:
-                        print(f"[DrawingAgent] 尝试Mermaid->PlantUML fallback")
+                        logger.warning("[DrawingAgent] 尝试Mermaid->PlantUML fallback")
                         puml = self._fallback_mermaid_to_plantuml(prompt)
                         rr2 = self._render_kroki("plantuml", puml)
                         if rr2.get("success"):
-                            print(f"[DrawingAgent] ✓ PlantUML fallback成功")
+                            logger.info("[DrawingAgent] ✓ PlantUML fallback成功")
                             results.append({"tool": "plantuml (fallback)", "image_base64": rr2.get("image_base64"), "mime": rr2.get("mime", "image/png"), "source_code": puml})
                         else:
                             results.append({"tool": tt, "error": rr.get("error"), "hint": rr.get("hint"), "source_code": src})
@@ -1308,13 +1448,13 @@ class NewsAggregatorAgent(Agent):
                             "command": aktools_config.get("command", "npx"),
                             "args": aktools_config.get("args", [])
                         }
-                        print(f"[NewsAggregatorAgent] ✅ 已加载 akshare MCP 配置")
+                        logger.info("[NewsAggregatorAgent] ✅ 已加载 akshare MCP 配置")
                     else:
-                        print(f"[NewsAggregatorAgent] ⚠️ 未找到 mcp-aktools 配置")
+                        logger.warning("[NewsAggregatorAgent] ⚠️ 未找到 mcp-aktools 配置")
             else:
-                print(f"[NewsAggregatorAgent] ⚠️ mcp_servers.json 文件不存在")
+                logger.warning("[NewsAggregatorAgent] ⚠️ mcp_servers.json 文件不存在")
         except Exception as e:
-            print(f"[NewsAggregatorAgent] ⚠️ 加载配置失败: {e}")
+            logger.warning("[NewsAggregatorAgent] ⚠️ 加载配置失败: %s", e)
     
     async def _get_akshare_tools(self):
         """获取 akshare 可用工具列表"""
@@ -1335,14 +1475,14 @@ class NewsAggregatorAgent(Agent):
                 timeout=10.0
             )
             self._akshare_tools = tools
-            print(f"[NewsAggregatorAgent] ✅ 获取到 {len(tools)} 个 akshare 工具")
+            logger.info("[NewsAggregatorAgent] ✅ 获取到 %s 个 akshare 工具", len(tools))
             return tools
         except asyncio.TimeoutError:
-            print(f"[NewsAggregatorAgent] ⚠️ 获取工具列表超时（10秒），将使用 LLM 知识回答")
+            logger.warning("[NewsAggregatorAgent] ⚠️ 获取工具列表超时（10秒），将使用 LLM 知识回答")
             self._akshare_tools = []  # 标记为已尝试
             return []
         except Exception as e:
-            print(f"[NewsAggregatorAgent] ⚠️ 获取工具列表失败: {e}")
+            logger.warning("[NewsAggregatorAgent] ⚠️ 获取工具列表失败: %s", e)
             self._akshare_tools = []  # 标记为已尝试
             return []
     
@@ -1440,7 +1580,7 @@ class NewsAggregatorAgent(Agent):
             current_messages.insert(0, SystemMessage(content=enhanced_prompt))
         
         for step in range(max_steps):
-            print(f"[NewsAggregatorAgent] Step {step+1}/{max_steps} - 调用 LLM...")
+            logger.debug("[NewsAggregatorAgent] Step %s/%s - 调用 LLM...", step+1, max_steps)
             
             # 1. 调用 LLM
             try:
@@ -1461,10 +1601,10 @@ class NewsAggregatorAgent(Agent):
                 elif not isinstance(content, str):
                     content = str(content)
                 
-                print(f"[NewsAggregatorAgent] LLM 响应长度: {len(content)}")
+                logger.debug("[NewsAggregatorAgent] LLM 响应长度: %s", len(content))
                 
             except Exception as e:
-                print(f"[NewsAggregatorAgent] LLM 调用失败: {e}")
+                logger.warning("[NewsAggregatorAgent] LLM 调用失败: %s", e)
                 return f"❌ 模型调用出错: {e}"
             
             if not content or not content.strip():
@@ -1482,7 +1622,7 @@ class NewsAggregatorAgent(Agent):
                     tool_name = tool_call.get("tool")
                     tool_args = tool_call.get("args", {})
                     
-                    print(f"[NewsAggregatorAgent] 调用工具: {tool_name}, 参数: {tool_args}")
+                    logger.debug("[NewsAggregatorAgent] 调用工具: %s, 参数: %s", tool_name, tool_args)
                     
                     # 3. 格式化和验证参数
                     from tools.akshare_helper import format_tool_args, validate_tool_args
@@ -1507,7 +1647,7 @@ class NewsAggregatorAgent(Agent):
                         
                         # 5. 解析工具结果
                         tool_output = self._format_tool_result(tool_name, result, formatted_args)
-                        print(f"[NewsAggregatorAgent] 工具执行成功，结果长度: {len(str(tool_output))}")
+                        logger.debug("[NewsAggregatorAgent] 工具执行成功，结果长度: %s", len(str(tool_output)))
                         
                         # 检查是否返回了错误信息
                         actual_content = str(result)
@@ -1520,7 +1660,7 @@ class NewsAggregatorAgent(Agent):
                         if "Not Found" in actual_content and tool_name in ["stock_info", "stock_prices", "stock_news"]:
                             symbol = formatted_args.get('symbol', '')
                             if symbol and step == 0:
-                                print(f"[NewsAggregatorAgent] 股票代码 {symbol} 未找到，尝试搜索...")
+                                logger.warning("[NewsAggregatorAgent] 股票代码 %s 未找到，尝试搜索...", symbol)
                                 # 尝试搜索股票代码
                                 search_result = await self._try_search_stock(symbol)
                                 if search_result:
@@ -1535,22 +1675,18 @@ class NewsAggregatorAgent(Agent):
                         current_messages.append(HumanMessage(content=f"工具执行结果:\n{tool_output[:1000]}{'...(结果较长，已截断)' if len(str(tool_output)) > 1000 else ''}"))
                         
                     except Exception as tool_error:
-                        print(f"[NewsAggregatorAgent] 工具调用失败: {tool_error}")
-                        import traceback
-                        traceback.print_exc()
+                        logger.exception("[NewsAggregatorAgent] 工具调用失败: %s", tool_error)
                         error_msg = f"❌ 工具调用失败: {str(tool_error)}"
                         current_messages.append(AIMessage(content=content))
                         current_messages.append(HumanMessage(content=error_msg))
                         continue
                         
                 except json.JSONDecodeError as e:
-                    print(f"[NewsAggregatorAgent] JSON 解析失败: {e}")
+                    logger.warning("[NewsAggregatorAgent] JSON 解析失败: %s", e)
                     # JSON 解析失败，返回 LLM 的原始响应
                     return content
                 except Exception as e:
-                    print(f"[NewsAggregatorAgent] 工具执行异常: {e}")
-                    import traceback
-                    traceback.print_exc()
+                    logger.exception("[NewsAggregatorAgent] 工具执行异常: %s", e)
                     return f"❌ 执行出错: {str(e)}"
             else:
                 # 没有工具调用，返回最终响应
@@ -1587,7 +1723,7 @@ class NewsAggregatorAgent(Agent):
 **提示**: 请使用上述搜索结果中的正确股票代码重新查询。
 """
         except Exception as e:
-            print(f"[NewsAggregatorAgent] 搜索股票失败: {e}")
+            logger.warning("[NewsAggregatorAgent] 搜索股票失败: %s", e)
         
         return None
     
@@ -1684,7 +1820,7 @@ class NewsAggregatorAgent(Agent):
 """
                 
         except Exception as e:
-            print(f"[NewsAggregatorAgent] 格式化结果失败: {e}")
+            logger.warning("[NewsAggregatorAgent] 格式化结果失败: %s", e)
             return f"✅ 工具执行成功，但格式化输出时出错: {str(e)}\n\n原始结果: {str(result)[:500]}"
 
 
@@ -1812,14 +1948,14 @@ class KnowledgeManagerAgent(Agent):
         # 延迟导入以避免循环依赖
         from tools.vector_store import vector_store_manager
         
-        print(f"[KnowledgeManager] Searching for: {query}")
-        search_results = vector_store_manager.search(query, k=5)
+        logger.debug("[KnowledgeManager] Searching for: %s", query)
+        passages = vector_store_manager.retrieve(query)
         
         # 3. 构建上下文
-        if search_results:
+        if passages:
             context_text = "\n\n".join([
-                f"--- 来源: {r['metadata'].get('source', 'unknown')} (相似度: {r['similarity_score']:.2f}) ---\n{r['content']}"
-                for r in search_results
+                f"--- 来源: {p['source']}{self._format_pages(p['pages'])} (相关度: {p['score']:.2f}) ---\n{p['content']}"
+                for p in passages
             ])
             
             rag_prompt = f"""请基于以下从知识库中检索到的上下文信息回答用户的问题。
@@ -1835,15 +1971,24 @@ class KnowledgeManagerAgent(Agent):
             
             # 替换最后一条消息
             messages[-1] = HumanMessage(content=rag_prompt)
-            print(f"[KnowledgeManager] RAG context injected ({len(search_results)} chunks)")
+            logger.info("[KnowledgeManager] RAG context injected (%s passages)", len(passages))
         else:
-            print(f"[KnowledgeManager] No results found in knowledge base.")
+            logger.info("[KnowledgeManager] No results found in knowledge base.")
             # 如果没有检索到结果，让 LLM 尝试直接回答或告知无数据
             pass
             
         # 4. 调用 LLM
         return super().invoke(messages, context)
 
+    @staticmethod
+    def _format_pages(pages: List[int]) -> str:
+        """格式化页码引用"""
+        if not pages:
+            return ""
+        if len(pages) == 1:
+            return f" 第{pages[0]}页"
+        return f" 第{min(pages)}-{max(pages)}页"
+
 
 class CoordinatorAgent(Agent):
     """协调者 - 负责任务分配和智能体协作"""
@@ -2019,9 +2164,9 @@ class AKShareDataAgent(Agent):
                         "command": akshare_server.get("command", "npx"),
                         "args": akshare_server.get("args", [])
                     }
-                    print(f"[AKShareDataAgent] ✅ 已加载 AKShare MCP 配置")
+                    logger.info("[AKShareDataAgent] ✅ 已加载 AKShare MCP 配置")
         except Exception as e:
-            print(f"[AKShareDataAgent] ⚠️ 无法加载 MCP 配置: {e}")
+            logger.warning("[AKShareDataAgent] ⚠️ 无法加载 MCP 配置: %s", e)
         
         super().__init__(
             id=AGENT_IDS["AKShare数据专家"],
@@ -2085,9 +2230,9 @@ class AKShareDataAgent(Agent):
                 self._akshare_config["command"],
                 self._akshare_config["args"]
             )
-            print(f"[AKShareDataAgent] 可用工具数量: {len(available_tools)}")
+            logger.info("[AKShareDataAgent] 可用工具数量: %s", len(available_tools))
         except Exception as e:
-            print(f"[AKShareDataAgent] ⚠️ 无法获取工具列表: {e}")
+            logger.warning("[AKShareDataAgent] ⚠️ 无法获取工具列表: %s", e)
             return self._fallback_to_llm_knowledge(messages[-1].content, "无法连接到 AKShare MCP 服务")
         
         # 2. 构建工具描述
@@ -2105,14 +2250,14 @@ class AKShareDataAgent(Agent):
             current_messages.insert(0, SystemMessage(content=enhanced_prompt))
         
         for step in range(max_steps):
-            print(f"[AKShareDataAgent] Step {step+1}/{max_steps} - 调用 LLM...")
+            logger.debug("[AKShareDataAgent] Step %s/%s - 调用 LLM...", step+1, max_steps)
             
             # 调用 LLM
             try:
                 response = await self.llm.ainvoke(current_messages)
                 content = response.content if hasattr(response, 'content') else str(response)
             except Exception as e:
-                print(f"[AKShareDataAgent] LLM 调用失败: {e}")
+                logger.warning("[AKShareDataAgent] LLM 调用失败: %s", e)
                 return self._fallback_to_llm_knowledge(messages[-1].content)
             
             if not content or not content.strip():
@@ -2132,7 +2277,7 @@ class AKShareDataAgent(Agent):
                     tool_name = tool_call.get("tool")
                     tool_args = tool_call.get("args", {})
                     
-                    print(f"[AKShareDataAgent] 调用工具: {tool_name}, 参数: {tool_args}")
+                    logger.debug("[AKShareDataAgent] 调用工具: %s, 参数: %s", tool_name, tool_args)
                     
                     # 格式化和验证参数
                     from tools.akshare_helper import format_tool_args, validate_tool_args
@@ -2160,7 +2305,7 @@ class AKShareDataAgent(Agent):
                         
                         # 格式化工具结果
                         tool_output = self._format_tool_result(tool_name, result, formatted_args)
-                        print(f"[AKShareDataAgent] 工具执行成功，结果长度: {len(str(tool_output))}")
+                        logger.debug("[AKShareDataAgent] 工具执行成功，结果长度: %s", len(str(tool_output)))
                         
                         # 对于单步查询，直接返回格式化结果
                         if step == 0 and tool_name in ["stock_info", "stock_prices", "stock_news", "search", "get_current_time"]:
@@ -2171,12 +2316,10 @@ class AKShareDataAgent(Agent):
                         current_messages.append(HumanMessage(content=f"工具执行结果:\n{tool_output[:1000]}{'...(结果较长，已截断)' if len(str(tool_output)) > 1000 else ''}"))
                         
                     except asyncio.TimeoutError:
-                        print(f"[AKShareDataAgent] ⚠️ MCP 工具调用超时 (10秒)")
+                        logger.warning("[AKShareDataAgent] ⚠️ MCP 工具调用超时 (10秒)")
                         return self._fallback_to_llm_knowledge(messages[-1].content, "MCP 工具调用超时，可能网络不稳定或远程服务响应慢。")
                     except Exception as tool_error:
-                        print(f"[AKShareDataAgent] 工具调用失败: {tool_error}")
-                        import traceback
-                        traceback.print_exc()
+                        logger.exception("[AKShareDataAgent] 工具调用失败: %s", tool_error)
                         
                         # 尝试搜索股票代码
                         if tool_name in ["stock_info", "stock_prices", "stock_news"] and "Not Found" in str(tool_error):
@@ -2192,12 +2335,10 @@ class AKShareDataAgent(Agent):
                         continue
                         
                 except json.JSONDecodeError as e:
-                    print(f"[AKShareDataAgent] JSON 解析失败: {e}")
+                    logger.warning("[AKShareDataAgent] JSON 解析失败: %s", e)
                     return content
                 except Exception as e:
-                    print(f"[AKShareDataAgent] 工具执行异常: {e}")
-                    import traceback
-                    traceback.print_exc()
+                    logger.exception("[AKShareDataAgent] 工具执行异常: %s", e)
                     return f"❌ 执行出错: {str(e)}"
             else:
                 # 没有工具调用，返回最终响应
@@ -2208,7 +2349,7 @@ class AKShareDataAgent(Agent):
     async def _try_search_stock(self, symbol: str, mcp_manager) -> Optional[str]:
         """尝试搜索股票代码"""
         try:
-            print(f"[AKShareDataAgent] 尝试搜索股票: {symbol}")
+            logger.info("[AKShareDataAgent] 尝试搜索股票: %s", symbol)
             from tools.akshare_helper import format_tool_args
             
             search_args = format_tool_args("search", {"keyword": symbol})
@@ -2224,7 +2365,7 @@ class AKShareDataAgent(Agent):
             
             return self._format_tool_result("search", search_result, search_args)
         except Exception as e:
-            print(f"[AKShareDataAgent] 搜索失败: {e}")
+            logger.warning("[AKShareDataAgent] 搜索失败: %s", e)
             return None
     
     def _format_tools_description(self, tools: List[Dict]) -> str:
@@ -2260,7 +2401,7 @@ class AKShareDataAgent(Agent):
             else:
                 return f"✅ 查询结果:\n\n{str(result)}"
         except Exception as e:
-            print(f"[AKShareDataAgent] 格式化结果失败: {e}")
+            logger.warning("[AKShareDataAgent] 格式化结果失败: %s", e)
             return f"✅ 查询成功（原始结果）:\n\n{str(result)}"
     
     def _format_stock_info(self, info: Dict, args: Dict) -> str:
@@ -2603,24 +2744,23 @@ dot.onclick = () => goToSlide(index);
         # 如果用户输入的主题超过5个字符，认为是明确的主题
         if len(topic.strip()) > 5 and topic != user_message:
             user_has_explicit_topic = True
-            print(f"[PPTGen] 检测到用户明确输入主题: {topic}")
+            logger.debug("[PPTGen] 检测到用户明确输入主题: %s", topic)
         
         # 如果用户没有明确主题，且有文档，才使用文档内容
         if context and context.get("document") and not user_has_explicit_topic:
             document_content = context["document"]
-            print(f"[PPTGen] 使用文档内容作为主题来源")
+            logger.info("[PPTGen] 使用文档内容作为主题来源")
         elif user_has_explicit_topic:
             # 用户有明确主题，不使用文档内容
             document_content = None
-            print(f"[PPTGen] 忽略文档内容，使用用户输入的主题")
+            logger.info("[PPTGen] 忽略文档内容，使用用户输入的主题")
         
         try:
             # 步骤1：生成大纲
-            print(f"[PPTGen] 开始生成 PPT 大纲...")
-            print(f"[PPTGen] 主题: {topic}")
-            print(f"[PPTGen] 幻灯片数量: {slide_count}")
-            print(f"[PPTGen] 风格: {visual_style}")
-            print(f"[PPTGen] 复杂度: {complexity_level}")
+            logger.info(
+                "[PPTGen] 开始生成 PPT 大纲: 主题=%.50s 数量=%s 风格=%s 复杂度=%s",
+                topic, slide_count, visual_style, complexity_level
+            )
             
             outline_result = generate_presentation_outline(
                 topic=topic,
@@ -2641,11 +2781,11 @@ dot.onclick = () => goToSlide(index);
                 return "❌ 未能生成有效的幻灯片大纲"
             
             # 步骤2：生成每张幻灯片的图片
-            print(f"[PPTGen] 开始生成 {len(outline)} 张幻灯片图片...")
+            logger.info("[PPTGen] 开始生成 %s 张幻灯片图片...", len(outline))
             slides = []
             
             for idx, slide_outline in enumerate(outline):
-                print(f"[PPTGen] 生成第 {idx + 1}/{len(outline)} 张幻灯片...")
+                logger.debug("[PPTGen] 生成第 %s/%s 张幻灯片...", idx + 1, len(outline))
                 image_result = generate_slide_image(slide_outline, visual_style)
                 
                 if image_result.get("success"):
@@ -2684,14 +2824,12 @@ dot.onclick = () => goToSlide(index);
                 # 生成 PDF
                 pdf_result = create_pdf_from_slides(slides, pdf_path, topic)
                 if pdf_result.get("success"):
-                    print(f"[PPTGen] ✅ PDF 文件已生成: {pdf_filename}")
+                    logger.info("[PPTGen] ✅ PDF 文件已生成: %s", pdf_filename)
                 else:
-                    print(f"[PPTGen] ⚠️ PDF 生成失败: {pdf_result.get('error')}")
+                    logger.warning("[PPTGen] ⚠️ PDF 生成失败: %s", pdf_result.get('error'))
                     pdf_filename = None
             except Exception as e:
-                print(f"[PPTGen] ⚠️ PDF 生成异常: {e}")
-                import traceback
-                traceback.print_exc()
+                logger.exception("[PPTGen] ⚠️ PDF 生成异常: %s", e)
                 pdf_filename = None
             
             # 步骤4：格式化输出
@@ -2729,8 +2867,7 @@ dot.onclick = () => goToSlide(index);
             return result
             
         except Exception as e:
-            import traceback
-            traceback.print_exc()
+            logger.exception("[PPTGen] 生成 PPT 失败")
             return f"❌ 生成 PPT 时出错: {str(e)}"
 
 
@@ -2845,25 +2982,25 @@ Assistant:
             
         for _ in range(max_steps):
             # 1. Call LLM
-            print(f"[MCPAgent] Step {_+1} invoking LLM...")
+            logger.debug("[MCPAgent] Step %s invoking LLM...", _+1)
             try:
                 response = self.llm.invoke(current_messages)
                 content = response.content
-                print(f"[MCPAgent] LLM Response (Raw): {str(content)[:200]}...")
+                logger.debug("[MCPAgent] LLM Response (Raw): %.200s...", content)
             except Exception as e:
-                print(f"[MCPAgent] LLM Invoke Error: {e}")
+                logger.error("[MCPAgent] LLM Invoke Error: %s", e)
                 return f"模型调用出错: {e}"
             
             # Handle empty content
             if not content:
-                print("[MCPAgent] Empty response received.")
+                logger.warning("[MCPAgent] Empty response received.")
                 return "我无法处理这个请求。请尝试更明确地描述您想要做什么。"
 
             # Convert list content to string if necessary
             if isinstance(content, list):
                 # Check if list is empty
                 if not content:
-                    print("[MCPAgent] Empty list received.")
+                    logger.warning("[MCPAgent] Empty list received.")
                     return "我无法处理这个请求。请尝试更明确地描述您想要做什么。"
                     
                 text_parts = []
@@ -2878,7 +3015,7 @@ Assistant:
                 
                 # Check if result is still empty after conversion
                 if not content or not content.strip():
-                    print("[MCPAgent] Empty content after list conversion.")
+                    logger.warning("[MCPAgent] Empty content after list conversion.")
                     return "我无法处理这个请求。请尝试更明确地描述您想要做什么。"
             elif not isinstance(content, str):
                 content = str(content)
@@ -2896,17 +3033,17 @@ Assistant:
                     tool_name = tool_call.get("tool")
                     tool_args = tool_call.get("args", {})
                     
-                    print(f"[MCPAgent] Calling tool: {tool_name} args={tool_args}")
+                    logger.debug("[MCPAgent] Calling tool: %s args=%s", tool_name, tool_args)
                     
                     # 3. Execute Tool (直接 await 异步调用)
                     try:
                         result = await mcp_manager.call_tool(command, args, tool_name, tool_args)
                     except Exception as tool_error:
-                        print(f"[MCPAgent] Tool call error: {tool_error}")
+                        logger.warning("[MCPAgent] Tool call error: %s", tool_error)
                         return f"❌ 工具调用失败: {str(tool_error)}"
                     
                     tool_output = str(result)
-                    print(f"[MCPAgent] Tool Output len: {len(tool_output)}")
+                    logger.debug("[MCPAgent] Tool Output len: %s", len(tool_output))
                     
                     # 尝试从 MCP 响应中提取实际内容
                     actual_content = tool_output
@@ -2925,7 +3062,7 @@ Assistant:
                             if match:
                                 actual_content = match.group(1)
                     except Exception as e:
-                        print(f"[MCPAgent] Failed to parse tool output: {e}")
+                        logger.warning("[MCPAgent] Failed to parse tool output: %s", e)
                         pass
                     
                     # 对于单步查询操作，直接返回结果
@@ -2958,7 +3095,7 @@ Assistant:
                                     formatted += f"\n\n**总计**: {len(items)} 项"
                                     return formatted
                             except Exception as e:
-                                print(f"[MCPAgent] Format error: {e}")
+                                logger.warning("[MCPAgent] Format error: %s", e)
                                 pass
                         
                         if tool_name == "get_file_info":
@@ -2976,9 +3113,7 @@ Assistant:
                     current_messages.append(HumanMessage(content=f"Tool Result:\n{actual_content[:500]}\n\n{'...(truncated)' if len(actual_content) > 500 else ''}"))
                     
                 except Exception as e:
-                    print(f"[MCPAgent] Tool execution failed: {e}")
-                    import traceback
-                    traceback.print_exc()
+                    logger.exception("[MCPAgent] Tool execution failed: %s", e)
                     return f"❌ 工具执行失败: {str(e)}"
             else:
                 # No tool call, return final response
@@ -3234,14 +3369,26 @@ class MultiAgentSystem:
         self.router = AgentRouter(self.registry)
         self.conversation = ConversationManager()
     
-    async def chat(self, message: str, document: Optional[str] = None, scenario: Optional[str] = None) -> Dict[str, Any]:
-        """处理用户消息"""
+    async def chat(
+        self,
+        message: str,
+        document: Optional[str] = None,
+        scenario: Optional[str] = None,
+        tables: Optional[List[str]] = None
+    ) -> Dict[str, Any]:
+        """
+        处理用户消息
+
+        tables 为本轮文档对应的表格内容哈希（tools.table_tools.open_table 返回句柄的 digest），
+        供数据类智能体直接查询
+        """
         # 添加用户消息到历史
         self.conversation.add_message("user", message)
         
-        # 如果有文档，添加到上下文
+        # 如果有文档，添加到上下文（换了文档时同时替换可查询的表格）
         if document:
             self.conversation.set_context("document", document)
+            self.conversation.set_context("tables", tables or [])
         
         # 路由到合适的智能体
         routing_result = self.router.route(message, self.conversation.get_context(), scenario)
@@ -3255,13 +3402,12 @@ class MultiAgentSystem:
         current_message = HumanMessage(content=clean_message)
         messages = history_messages + [current_message]
         
-        # 调用智能体（如果是异步的就 await）
+        # 调用智能体（异步的直接 await；同步的放到线程中执行，限流等待和 LLM 调用不阻塞事件循环）
         try:
-            import inspect
             if inspect.iscoroutinefunction(agent.invoke):
                 response = await agent.invoke(messages, self.conversation.get_context())
             else:
-                response = agent.invoke(messages, self.conversation.get_context())
+                response = await asyncio.to_thread(agent.invoke, messages, self.conversation.get_context())
             
             # 添加响应到历史
             self.conversation.add_message("assistant", response, agent.name)
@@ -3298,7 +3444,7 @@ class MultiAgentSystem:
                             pass
 
                 except Exception as e:
-                    print(f"解析协调者计划失败: {e}")
+                    logger.warning("解析协调者计划失败: %s", e)
                     pass
 
             return {
@@ -3318,8 +3464,7 @@ class MultiAgentSystem:
             }
         
         except Exception as e:
-            import traceback
-            traceback.print_exc()
+            logger.exception("智能体调用失败")
             return {
                 "success": False,
                 "error": str(e),
@@ -3345,15 +3490,15 @@ class MultiAgentSystem:
             # 构建上下文：包含之前的执行结果
             step_context = {
                 "document": document,
+                "tables": self.conversation.get_context("tables"),
                 "previous_results": "\n\n".join([f"--- {r['agent']} 的输出 ---\n{r['response']}" for r in results])
             }
             
-            # 执行步骤（如果是异步的就 await）
-            import inspect
+            # 执行步骤（异步的直接 await，同步的放到线程中执行）
             if inspect.iscoroutinefunction(agent.invoke):
                 response = await agent.invoke([HumanMessage(content=instruction)], step_context)
             else:
-                response = agent.invoke([HumanMessage(content=instruction)], step_context)
+                response = await asyncio.to_thread(agent.invoke, [HumanMessage(content=instruction)], step_context)
             
             results.append({
                 "agent": agent_name,
@@ -3399,10 +3544,10 @@ class MultiAgentSystem:
 
     def reload_agents(self):
         """重新加载所有智能体（用于更新配置后）"""
-        print("🔄 正在重新加载智能体配置...")
+        logger.info("🔄 正在重新加载智能体配置...")
         self.registry = AgentRegistry()
         self.router = AgentRouter(self.registry)
-        print("✅ 智能体重新加载完成")
+        logger.info("✅ 智能体重新加载完成")
 
 
 # 创建全局实例
@@ -1,11 +1,21 @@
+import logging
 import json
 import os
+import sqlite3
+import threading
 import uuid
+from datetime import datetime
 from typing import List, Dict, Optional
 from agents.multi_agents import multi_agent_system, PromptAgent
 from langchain_core.messages import HumanMessage
+from services.metrics import record_cache
 
-PROMPTS_FILE = "user_prompts.json"
+logger = logging.getLogger(__name__)
+
+PROMPTS_FILE = "user_prompts.json"  # 旧版 JSON 存储，仅用于首次迁移
+PROMPTS_DB = "user_prompts.db"
+# PRAGMA user_version 达到该值表示旧版 JSON 提示词库已迁移
+LEGACY_MIGRATED_VERSION = 1
 
 # 丰富最佳实践内容
 BEST_PRACTICES = [
@@ -278,61 +288,193 @@ BEST_PRACTICES = [
 ]
 
 class PromptManager:
-    def __init__(self):
-        self.file_path = PROMPTS_FILE
-        self._ensure_file()
-
-    def _ensure_file(self):
-        if not os.path.exists(self.file_path):
-            with open(self.file_path, 'w', encoding='utf-8') as f:
-                json.dump([], f)
-
-    def _read_prompts(self) -> List[Dict]:
-        try:
-            with open(self.file_path, 'r', encoding='utf-8') as f:
-                return json.load(f)
-        except:
-            return []
-
-    def _save_prompts(self, prompts: List[Dict]):
-        with open(self.file_path, 'w', encoding='utf-8') as f:
-            json.dump(prompts, f, indent=2, ensure_ascii=False)
+    """
+    提示词库管理
+
+    存储在 SQLite 中（提示词表 + 标签表），写操作在事务中原子完成；
+    列表结果缓存在内存中，任意写操作后失效。
+    """
+
+    def __init__(self, db_path: str = PROMPTS_DB, legacy_file: str = PROMPTS_FILE):
+        self.db_path = db_path
+        self.legacy_file = legacy_file
+        self._lock = threading.Lock()
+        self._cache: Optional[List[Dict]] = None
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._init_db()
+
+    def _init_db(self):
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA foreign_keys=ON")
+            self._conn.executescript("""
+                CREATE TABLE IF NOT EXISTS prompts (
+                    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+                    id TEXT UNIQUE NOT NULL,
+                    title TEXT NOT NULL,
+                    content TEXT NOT NULL,
+                    created_at TEXT NOT NULL,
+                    updated_at TEXT NOT NULL
+                );
+                CREATE TABLE IF NOT EXISTS prompt_tags (
+                    prompt_id TEXT NOT NULL REFERENCES prompts(id) ON DELETE CASCADE,
+                    tag TEXT NOT NULL,
+                    PRIMARY KEY (prompt_id, tag)
+                );
+                CREATE INDEX IF NOT EXISTS idx_prompt_tags_tag ON prompt_tags(tag);
+            """)
+            self._conn.commit()
+            migrated = self._conn.execute("PRAGMA user_version").fetchone()[0] >= LEGACY_MIGRATED_VERSION
+        if not migrated:
+            self._migrate_legacy_file()
+
+    def _migrate_legacy_file(self):
+        """
+        导入旧版 JSON 提示词库（保留原文件）
+
+        整个导入提交后才把 user_version 标记为已迁移；读取或写入失败时不标记，下次启动重试。
+        单条记录有问题只回滚并跳过该条，已存在的 id 直接忽略，不会中断整个迁移
+        """
+        legacy = []
+        if os.path.exists(self.legacy_file):
+            try:
+                with open(self.legacy_file, 'r', encoding='utf-8') as f:
+                    legacy = json.load(f)
+            except Exception as e:
+                logger.warning("[PromptManager] 读取旧版提示词库失败，下次启动重试: %s", e)
+                return
+
+        imported = 0
+        with self._lock:
+            with self._conn:
+                self._conn.execute("BEGIN")
+                for p in legacy:
+                    # 每条提示词与其标签在一个保存点内写入，出错时整条回滚，不会留下缺少标签的记录
+                    self._conn.execute("SAVEPOINT legacy_row")
+                    try:
+                        created_at = p.get('created_at') or datetime.now().isoformat()
+                        if self._insert(p['id'], p['title'], p['content'], p.get('tags', []), created_at,
+                                        ignore_existing=True):
+                            imported += 1
+                    except (KeyError, TypeError, AttributeError, sqlite3.Error) as e:
+                        self._conn.execute("ROLLBACK TO legacy_row")
+                        logger.warning("[PromptManager] 跳过无法迁移的提示词 %r: %s", p, e)
+                    self._conn.execute("RELEASE legacy_row")
+            # 导入事务提交之后才标记为已迁移
+            self._conn.execute(f"PRAGMA user_version = {LEGACY_MIGRATED_VERSION}")
+            self._conn.commit()
+        if legacy:
+            logger.info("[PromptManager] 已从 %s 迁移 %s/%s 条提示词", self.legacy_file, imported, len(legacy))
+
+    def _insert(self, prompt_id: str, title: str, content: str, tags: List[str], created_at: str,
+                ignore_existing: bool = False) -> bool:
+        """
+        插入提示词及标签（调用方负责加锁与事务）
+
+        Returns:
+            是否插入了新记录（ignore_existing 时 id 已存在返回 False）
+        """
+        cursor = self._conn.execute(f"""
+            INSERT {"OR IGNORE " if ignore_existing else ""}INTO prompts (id, title, content, created_at, updated_at)
+            VALUES (?, ?, ?, ?, ?)
+        """, (prompt_id, title, content, created_at, created_at))
+        if cursor.rowcount == 0:
+            return False
+        self._conn.executemany(
+            "INSERT OR IGNORE INTO prompt_tags (prompt_id, tag) VALUES (?, ?)",
+            [(prompt_id, tag) for tag in tags]
+        )
+        return True
+
+    def _load_all(self) -> List[Dict]:
+        rows = self._conn.execute("""
+            SELECT id, title, content, created_at, updated_at FROM prompts ORDER BY seq
+        """).fetchall()
+        tags: Dict[str, List[str]] = {}
+        for row in self._conn.execute("SELECT prompt_id, tag FROM prompt_tags ORDER BY rowid"):
+            tags.setdefault(row['prompt_id'], []).append(row['tag'])
+        return [{**dict(row), "tags": tags.get(row['id'], [])} for row in rows]
 
     def list_prompts(self) -> List[Dict]:
-        return self._read_prompts()
+        with self._lock:
+            record_cache("prompt_library", hit=self._cache is not None)
+            if self._cache is None:
+                self._cache = self._load_all()
+            return [dict(p) for p in self._cache]
+
+    def search_prompts(self, keyword: Optional[str] = None, tag: Optional[str] = None) -> List[Dict]:
+        """
+        按标签和/或关键词（标题、内容）搜索提示词
+
+        Args:
+            keyword: 关键词
+            tag: 标签（精确匹配，走索引）
+        """
+        prompts = self.list_prompts()
+        if tag:
+            with self._lock:
+                ids = {row['prompt_id'] for row in self._conn.execute(
+                    "SELECT prompt_id FROM prompt_tags WHERE tag = ?", (tag,)
+                )}
+            prompts = [p for p in prompts if p['id'] in ids]
+        if keyword:
+            kw = keyword.lower()
+            prompts = [
+                p for p in prompts
+                if kw in p['title'].lower() or kw in p['content'].lower()
+            ]
+        return prompts
+
+    def list_tags(self) -> List[Dict]:
+        """列出所有标签及其使用次数"""
+        with self._lock:
+            rows = self._conn.execute("""
+                SELECT tag, COUNT(*) as count FROM prompt_tags
+                GROUP BY tag ORDER BY count DESC, tag
+            """).fetchall()
+        return [dict(row) for row in rows]
 
     def save_prompt(self, title: str, content: str, tags: List[str] = []) -> Dict:
-        prompts = self._read_prompts()
+        now = datetime.now().isoformat()
         new_prompt = {
             "id": str(uuid.uuid4()),
             "title": title,
             "content": content,
-            "tags": tags,
-            "created_at": str(uuid.uuid1())  # Simple timestamp
+            "tags": list(tags),
+            "created_at": now,
+            "updated_at": now
         }
-        prompts.append(new_prompt)
-        self._save_prompts(prompts)
+        with self._lock, self._conn:
+            self._insert(new_prompt['id'], title, content, tags, now)
+            self._cache = None
         return new_prompt
 
     def delete_prompt(self, prompt_id: str) -> bool:
-        prompts = self._read_prompts()
-        initial_len = len(prompts)
-        prompts = [p for p in prompts if p['id'] != prompt_id]
-        if len(prompts) < initial_len:
-            self._save_prompts(prompts)
-            return True
-        return False
+        with self._lock, self._conn:
+            cursor = self._conn.execute("DELETE FROM prompts WHERE id = ?", (prompt_id,))
+            self._cache = None
+            return cursor.rowcount > 0
 
     def update_prompt(self, prompt_id: str, title: str, content: str, tags: List[str] = []) -> Optional[Dict]:
-        prompts = self._read_prompts()
-        for p in prompts:
-            if p['id'] == prompt_id:
-                p['title'] = title
-                p['content'] = content
-                p['tags'] = tags
-                self._save_prompts(prompts)
-                return p
-        return None
+        now = datetime.now().isoformat()
+        with self._lock, self._conn:
+            cursor = self._conn.execute("""
+                UPDATE prompts SET title = ?, content = ?, updated_at = ? WHERE id = ?
+            """, (title, content, now, prompt_id))
+            if cursor.rowcount == 0:
+                return None
+            self._conn.execute("DELETE FROM prompt_tags WHERE prompt_id = ?", (prompt_id,))
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO prompt_tags (prompt_id, tag) VALUES (?, ?)",
+                [(prompt_id, tag) for tag in tags]
+            )
+            row = self._conn.execute(
+                "SELECT id, title, content, created_at, updated_at FROM prompts WHERE id = ?",
+                (prompt_id,)
+            ).fetchone()
+            self._cache = None
+        return {**dict(row), "tags": list(tags)}
 
     def get_best_practices(self) -> List[Dict]:
         return BEST_PRACTICES
@@ -3,11 +3,12 @@
 FastAPI + 前端界面
 """
 
-from fastapi import FastAPI, File, UploadFile, Form, HTTPException, Request
-from fastapi.responses import HTMLResponse, JSONResponse, FileResponse, RedirectResponse, StreamingResponse
+from fastapi import FastAPI, File, UploadFile, Form, HTTPException, Query, Request
+from fastapi.responses import HTMLResponse, JSONResponse, FileResponse, RedirectResponse, StreamingResponse, Response
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
 import json
+import logging
 import os
 import uuid
 import asyncio
@@ -19,6 +20,9 @@ from pydantic import BaseModel
 # 加载环境变量
 load_dotenv()
 
+from utils.logging_config import setup_logging, request_id_var
+setup_logging()
+
 # 导入项目模块
 from graph.document_graph import process_document
 from graph.compliance_graph import run_compliance_flow
@@ -30,11 +34,16 @@ from tools.file_tools import (
     read_file
 )
 from tools.document_tools import create_summary_card, markdown_to_docx
+from tools.table_tools import open_table
 from agents.multi_agents import multi_agent_system
 from agents.prompt_manager import prompt_manager
 from agents.alphafund_agent import AlphaFundAgent
+from services.analytics import metrics_collector
+from services.metrics import registry as metrics_registry, CONTENT_TYPE as METRICS_CONTENT_TYPE
 from langchain_core.messages import HumanMessage
 
+logger = logging.getLogger(__name__)
+
 # 创建 FastAPI 应用
 app = FastAPI(
     title="AgentDesk - 资管智能体工作台",
@@ -42,6 +51,20 @@ app = FastAPI(
     version="1.0.0"
 )
 
+
+@app.middleware("http")
+async def request_id_middleware(request: Request, call_next):
+    """为每个请求分配请求 ID（沿用上游的 X-Request-ID），写入日志上下文与响应头"""
+    request_id = request.headers.get("x-request-id") or uuid.uuid4().hex[:12]
+    token = request_id_var.set(request_id)
+    try:
+        response = await call_next(request)
+    finally:
+        request_id_var.reset(token)
+    response.headers["X-Request-ID"] = request_id
+    return response
+
+
 # 挂载静态文件
 app.mount("/static", StaticFiles(directory="static"), name="static")
 
@@ -53,6 +76,28 @@ UPLOAD_DIR = "uploads"
 os.makedirs(UPLOAD_DIR, exist_ok=True)
 
 
+async def _save_upload(file: UploadFile, file_path: str) -> bytes:
+    """把上传文件写入磁盘并记录上传指标，返回文件内容（供 detect_file_type 直接嗅探，免去再次读盘）"""
+    file_type = os.path.splitext(file.filename or "")[1].lower().lstrip(".") or "unknown"
+    with metrics_collector.track("upload", file_type) as span:
+        content = await file.read()
+        with open(file_path, "wb") as f:
+            f.write(content)
+        span.bytes = len(content)
+    return content
+
+
+def _table_refs(file_path: str, file_type: str) -> List[str]:
+    """表格文件返回其内容哈希（供数据类智能体查询），其他类型返回空列表"""
+    if file_type not in ("csv", "xlsx", "parquet"):
+        return []
+    try:
+        return [open_table(file_path, file_type).digest]
+    except Exception as e:
+        logger.warning("表格注册失败: %s", e)
+        return []
+
+
 @app.get("/login", response_class=HTMLResponse)
 async def login_page(request: Request):
     """返回登录页"""
@@ -327,7 +372,7 @@ async def old_home(request: Request):
                                 <p class="text-muted text-center">在这里和智能体进行对话</p>
                             </div>
                             <div class="mt-3 d-flex gap-2">
-                                <input type="file" id="chatDoc" class="form-control" style="max-width:220px" accept=".txt,.pdf,.docx,.xlsx,.csv,.md,.json">
+                                <input type="file" id="chatDoc" class="form-control" style="max-width:220px" accept=".txt,.pdf,.docx,.xlsx,.csv,.md,.json,.parquet">
                                 <textarea id="chatInput" class="form-control" rows="2" placeholder="请输入问题，支持 @智能体 提及..."></textarea>
                             </div>
                             <div class="mt-2 d-flex justify-content-end gap-2">
@@ -351,7 +396,7 @@ async def old_home(request: Request):
                                     <div class="col-md-6">
                                         <div class="mb-3">
                                             <label for="file" class="form-label">选择文件</label>
-                                            <input type="file" class="form-control" id="file" name="file" required accept=".txt,.pdf,.docx,.xlsx,.csv,.md,.json">
+                                            <input type="file" class="form-control" id="file" name="file" required accept=".txt,.pdf,.docx,.xlsx,.csv,.md,.json,.parquet">
                                             <div class="form-text">支持: TXT, PDF, DOCX, XLSX, CSV, MD, JSON</div>
                                         </div>
                                     </div>
@@ -662,6 +707,9 @@ async def old_home(request: Request):
     return HTMLResponse(content=html_content)
 
 
+DOCUMENT_OPERATIONS = ["summarize", "generate", "convert", "extract_table", "extract_key_points", "analyze"]
+
+
 @app.post("/upload")
 async def upload_file(
     file: UploadFile = File(...),
@@ -670,13 +718,12 @@ async def upload_file(
 ):
     """上传文件并处理"""
     # 验证操作类型
-    valid_operations = ["summarize", "generate", "convert", "extract_table", "extract_key_points", "analyze"]
-    if operation not in valid_operations:
+    if operation not in DOCUMENT_OPERATIONS:
         return JSONResponse(
             status_code=400,
             content={
                 "success": False,
-                "error": f"无效的操作类型。支持的操作: {', '.join(valid_operations)}"
+                "error": f"无效的操作类型。支持的操作: {', '.join(DOCUMENT_OPERATIONS)}"
             }
         )
 
@@ -701,18 +748,14 @@ async def upload_file(
     file_path = os.path.join(UPLOAD_DIR, f"{unique_id}_{file.filename}")
 
     try:
-        with open(file_path, "wb") as f:
-            content = await file.read()
-            f.write(content)
+        await _save_upload(file, file_path)
 
         # 使用 LangGraph 处理
-        print(f"\n{'='*60}")
-        print(f"开始处理文件: {file.filename}")
-        print(f"操作类型: {operation}")
-        print(f"保存路径: {file_path}")
-        print(f"{'='*60}\n")
+        logger.info("开始处理文件: %s (操作: %s, 路径: %s)", file.filename, operation, file_path)
 
-        result = process_document(
+        # 长文档摘要会并发调用多次 LLM，放到线程中执行，避免阻塞事件循环
+        result = await asyncio.to_thread(
+            process_document,
             file_path=file_path,
             operation=operation,
             instruction=instruction,
@@ -756,9 +799,7 @@ async def upload_file(
         }
 
     except Exception as e:
-        print(f"处理失败: {e}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("处理失败: %s", file.filename)
 
         return JSONResponse(
             status_code=500,
@@ -777,6 +818,98 @@ async def upload_file(
                 pass
 
 
+def _remove_upload(file_path: str):
+    """删除上传的原始文件（不存在时忽略）"""
+    try:
+        os.remove(file_path)
+    except OSError:
+        pass
+
+
+@app.post("/upload/stream")
+async def upload_file_stream(
+    file: UploadFile = File(...),
+    operation: Optional[str] = Form(...),
+    instruction: Optional[str] = Form("")
+):
+    """上传文件并处理，以 SSE 推送进度（长文档摘要时每完成一个分段推送一次）"""
+    if operation not in DOCUMENT_OPERATIONS:
+        return JSONResponse(
+            status_code=400,
+            content={
+                "success": False,
+                "error": f"无效的操作类型。支持的操作: {', '.join(DOCUMENT_OPERATIONS)}"
+            }
+        )
+
+    unique_id = str(uuid.uuid4())[:8]
+    file_path = os.path.join(UPLOAD_DIR, f"{unique_id}_{file.filename}")
+    await _save_upload(file, file_path)
+
+    async def event_generator():
+        loop = asyncio.get_running_loop()
+        progress: asyncio.Queue = asyncio.Queue()
+
+        def on_progress(event: Dict):
+            # 在工作线程中调用，转交给事件循环
+            loop.call_soon_threadsafe(progress.put_nowait, event)
+
+        def run():
+            # 由工作线程在处理结束后清理原始文件（保留处理结果）：客户端断开时线程仍可能在读取该文件
+            try:
+                return process_document(file_path, operation, instruction, file.filename, on_progress)
+            finally:
+                _remove_upload(file_path)
+
+        task = None
+        try:
+            yield f"data: {json.dumps({'type': 'start', 'message': f'开始处理: {file.filename}'}, ensure_ascii=False)}\n\n"
+            task = asyncio.create_task(asyncio.to_thread(run))
+
+            while not task.done() or not progress.empty():
+                getter = asyncio.create_task(progress.get())
+                await asyncio.wait({getter, task}, return_when=asyncio.FIRST_COMPLETED)
+                if getter.done():
+                    yield f"data: {json.dumps({'type': 'progress', **getter.result()}, ensure_ascii=False)}\n\n"
+                else:
+                    getter.cancel()
+
+            result = task.result()
+            if result.get('error'):
+                yield f"data: {json.dumps({'type': 'error', 'message': result['error']}, ensure_ascii=False)}\n\n"
+            else:
+                metadata = result.get('metadata') or {}
+                payload = {
+                    'type': 'result',
+                    'result_preview': (result.get('result') or '')[:2000],
+                    'output_file': metadata.get('output_file'),
+                    'needs_review': result.get('needs_review', False),
+                    'metadata': metadata
+                }
+                yield f"data: {json.dumps(payload, ensure_ascii=False)}\n\n"
+
+        except Exception as e:
+            logger.exception("[上传处理] 流式处理失败: %s", file.filename)
+            yield f"data: {json.dumps({'type': 'error', 'message': f'处理失败: {str(e)}'}, ensure_ascii=False)}\n\n"
+
+        finally:
+            # 处理尚未开始（客户端在首个事件前断开）时由这里清理
+            if task is None:
+                _remove_upload(file_path)
+
+        yield f"data: {json.dumps({'type': 'done'}, ensure_ascii=False)}\n\n"
+
+    return StreamingResponse(
+        event_generator(),
+        media_type="text/event-stream",
+        headers={
+            "Cache-Control": "no-cache",
+            "Connection": "keep-alive",
+            "X-Accel-Buffering": "no"
+        }
+    )
+
+
 @app.get("/download/{filename}")
 async def download_file(filename: str, preview: bool = False):
     """下载结果文件"""
@@ -905,9 +1038,7 @@ async def simple_upload(file: UploadFile = File(...)):
             file_path = os.path.join(UPLOAD_DIR, final_filename)
             counter += 1
         
-        with open(file_path, "wb") as f:
-            content = await file.read()
-            f.write(content)
+        await _save_upload(file, file_path)
             
         return {
             "success": True,
@@ -949,13 +1080,14 @@ async def delete_file(filename: str):
 
 @app.delete("/clear-uploads")
 async def clear_uploads():
-    """清理上传目录"""
+    """清理上传目录（知识库入库队列中尚未处理完的文件除外）"""
     try:
         count = 0
         if os.path.exists(UPLOAD_DIR):
+            in_use = ingestion_queue.active_file_paths()
             for filename in os.listdir(UPLOAD_DIR):
                 file_path = os.path.join(UPLOAD_DIR, filename)
-                if os.path.isfile(file_path):
+                if os.path.isfile(file_path) and os.path.abspath(file_path) not in in_use:
                     os.remove(file_path)
                     count += 1
 
@@ -1049,8 +1181,7 @@ async def update_model_settings(settings: ModelSettings):
             "message": f"已切换到 {settings.provider} 模型 ({settings.model_name or '默认'})"
         }
     except Exception as e:
-        import traceback
-        traceback.print_exc()
+        logger.exception("更新模型配置失败")
         return JSONResponse(
             status_code=500,
             content={
@@ -1111,25 +1242,35 @@ async def analytics_page():
 
 
 @app.get("/api/analytics/data")
-async def get_analytics_data():
-    """获取分析数据（模拟）"""
-    return {
-        "success": True,
-        "kpi": {
-            "docs": 1284,
-            "calls": 5432,
-            "time": 1.2,
-            "health": 100
-        },
-        "trend": [120, 200, 150, 80, 70, 110, 130],
-        "distribution": [
-            {"value": 1048, "name": "PDF"},
-            {"value": 735, "name": "Word"},
-            {"value": 580, "name": "Excel"},
-            {"value": 484, "name": "TXT"}
-        ],
-        "activity": [120, 200, 150, 80, 70]
-    }
+async def get_analytics_data(days: int = 7):
+    """
+    获取分析数据
+
+    KPI 为最近 24 小时的文档解析数、智能体调用数、平均响应时间（秒）与成功率（%），
+    trend / distribution / activity 为最近 days 天的每日调用量、文档类型分布和最活跃的智能体
+    """
+    try:
+        data = await asyncio.to_thread(metrics_collector.get_analytics, max(1, min(days, 90)))
+        return {"success": True, **data}
+    except Exception as e:
+        return JSONResponse(
+            status_code=500,
+            content={
+                "success": False,
+                "error": str(e)
+            }
+        )
+
+
+@app.on_event("startup")
+async def start_metrics_collector():
+    """启动指标汇总的定期写入"""
+    await metrics_collector.start()
+
+
+@app.on_event("shutdown")
+async def stop_metrics_collector():
+    await metrics_collector.stop()
 
 
 @app.get("/api/agents")
@@ -1164,6 +1305,7 @@ async def chat_with_agent(
     try:
         # 处理文档（如果有）
         document_content = None
+        table_refs: List[str] = []
         active_filename = None  # 记录当前活动文件名（用于上下文）
         
         if document:
@@ -1172,24 +1314,21 @@ async def chat_with_agent(
             unique_id = str(uuid.uuid4())[:8]
             file_path = os.path.join(UPLOAD_DIR, f"{unique_id}_{document.filename}")
             
-            with open(file_path, "wb") as f:
-                content = await document.read()
-                f.write(content)
+            upload_data = await _save_upload(document, file_path)
             
             # 读取文档内容
             try:
-                file_type = detect_file_type(file_path)
-                document_content = read_file(file_path, file_type)
+                file_type = detect_file_type(file_path, upload_data)
+                document_content = await asyncio.to_thread(read_file, file_path, file_type)
+                table_refs = await asyncio.to_thread(_table_refs, file_path, file_type)
                 active_filename = document.filename
-                print(f"✅ 文档读取成功: {document.filename}")
-                print(f"   文件类型: {file_type}")
-                print(f"   内容长度: {len(document_content) if document_content else 0} 字符")
+                logger.info("✅ 文档读取成功: %s", document.filename)
+                logger.debug("文件类型: %s", file_type)
+                logger.debug("内容长度: %s 字符", len(document_content) if document_content else 0)
                 if document_content:
-                    print(f"   内容预览: {document_content[:200]}...")
+                    logger.debug("内容预览: %.200s...", document_content)
             except Exception as e:
-                print(f"❌ 读取文档失败: {e}")
-                import traceback
-                traceback.print_exc()
+                logger.exception("❌ 读取文档失败: %s", e)
             finally:
                 # 清理临时文件
                 if os.path.exists(file_path):
@@ -1202,38 +1341,36 @@ async def chat_with_agent(
             # 从现有文件读取
             active_filename = filename
             file_path = os.path.join(UPLOAD_DIR, filename)
-            print(f"📂 尝试读取文件: {file_path}")
+            logger.info("📂 尝试读取文件: %s", file_path)
             if os.path.exists(file_path):
                 try:
                     file_type = detect_file_type(file_path)
-                    document_content = read_file(file_path, file_type)
-                    print(f"✅ 读取现有文件成功: {filename}")
-                    print(f"   文件类型: {file_type}")
-                    print(f"   内容长度: {len(document_content) if document_content else 0} 字符")
+                    document_content = await asyncio.to_thread(read_file, file_path, file_type)
+                    table_refs = await asyncio.to_thread(_table_refs, file_path, file_type)
+                    logger.info("✅ 读取现有文件成功: %s", filename)
+                    logger.debug("文件类型: %s", file_type)
+                    logger.debug("内容长度: %s 字符", len(document_content) if document_content else 0)
                 except Exception as e:
-                    print(f"❌ 读取文件失败: {e}")
-                    import traceback
-                    traceback.print_exc()
+                    logger.exception("❌ 读取文件失败: %s", e)
             else:
-                print(f"⚠️ 文件不存在于 uploads 目录: {filename}")
-                print(f"   完整路径: {file_path}")
+                logger.warning("⚠️ 文件不存在于 uploads 目录: %s", filename)
+                logger.debug("完整路径: %s", file_path)
                 # 列出 uploads 目录中的文件以便调试
                 try:
                     files_in_dir = os.listdir(UPLOAD_DIR)
-                    print(f"   uploads 目录中的文件: {files_in_dir[:10]}{'...' if len(files_in_dir) > 10 else ''}")
+                    logger.debug("uploads 目录中的文件: %s%s", files_in_dir[:10], '...' if len(files_in_dir) > 10 else '')
                 except Exception as e:
-                    print(f"   无法列出目录: {e}")
+                    logger.warning("无法列出目录: %s", e)
         
         elif document_text:
             document_content = document_text
-            print(f"📝 使用文本内容: {len(document_text) if document_text else 0} 字符")
+            logger.info("📝 使用文本内容: %s 字符", len(document_text) if document_text else 0)
         
         # 调用多智能体系统
-        print(f"🤖 调用多智能体系统...")
-        print(f"   消息: {message}")
-        print(f"   场景: {scenario}")
-        print(f"   有文档内容: {document_content is not None}")
-        print(f"   活动文件名: {active_filename}")
+        logger.debug(
+            "🤖 调用多智能体系统: 消息=%.200s 场景=%s 有文档内容=%s 活动文件名=%s",
+            message, scenario, document_content is not None, active_filename
+        )
 
         if agent_id:
             try:
@@ -1250,7 +1387,7 @@ async def chat_with_agent(
             explicit_mentions = []
 
         if scenario == 'compliance' and not document_content and not explicit_mentions:
-            print("⚖️ 触发合规营销工作流...")
+            logger.info("⚖️ 触发合规营销工作流...")
             result = run_compliance_flow(message)
 
             final_content = result.get('content', '')
@@ -1290,15 +1427,14 @@ async def chat_with_agent(
             # 尝试告诉智能体用户正在预览什么文件
             file_hint = f"\n\n[系统提示：用户当前正在预览文件「{active_filename}」，但文件内容未能读取。请根据文件名推断用户意图，或询问用户提供更多信息。]"
             enhanced_message = message + file_hint
-            print(f"📎 添加文件上下文提示: {active_filename}")
+            logger.info("📎 添加文件上下文提示: %s", active_filename)
         
-        result = await multi_agent_system.chat(enhanced_message, document_content, scenario)
+        result = await multi_agent_system.chat(enhanced_message, document_content, scenario, tables=table_refs)
         
-        print(f"[聊天API] multi_agent_system.chat 返回结果:")
-        print(f"  success: {result.get('success')}")
-        print(f"  agent: {result.get('agent')}")
-        print(f"  response 长度: {len(str(result.get('response', '')))}")
-        print(f"  response 前100字符: {str(result.get('response', ''))[:100]}")
+        logger.debug(
+            "[聊天API] multi_agent_system.chat 返回: success=%s agent=%s response=%.100s",
+            result.get('success'), result.get('agent'), result.get('response', '')
+        )
         
         if result["success"]:
             response_data = {
@@ -1312,13 +1448,13 @@ async def chat_with_agent(
             context = multi_agent_system.conversation.get_context()
             if context and context.get("pdf_filename"):
                 response_data["pdf_filename"] = context["pdf_filename"]
-                print(f"[聊天API] 包含 PDF 文件: {context['pdf_filename']}")
+                logger.info("[聊天API] 包含 PDF 文件: %s", context['pdf_filename'])
             
-            print(f"[聊天API] 返回数据: success={response_data['success']}, agent={response_data.get('agent', {}).get('name', 'N/A')}, response长度={len(str(response_data['response']))}")
+            logger.debug("[聊天API] 返回数据: success=%s, agent=%s, response长度=%s", response_data['success'], response_data.get('agent', {}).get('name', 'N/A'), len(str(response_data['response'])))
             return response_data
         else:
             error_msg = result.get("error", "处理失败")
-            print(f"[聊天API] 返回错误: {error_msg}")
+            logger.error("[聊天API] 返回错误: %s", error_msg)
             return JSONResponse(
                 status_code=500,
                 content={
@@ -1328,8 +1464,7 @@ async def chat_with_agent(
             )
     
     except Exception as e:
-        import traceback
-        traceback.print_exc()
+        logger.exception("[聊天API] 处理失败")
         return JSONResponse(
             status_code=500,
             content={
@@ -1470,6 +1605,7 @@ async def chat_with_agent_stream(
             
             # 处理文档
             document_content = None
+            table_refs: List[str] = []
             active_filename = None
             
             if document:
@@ -1480,13 +1616,12 @@ async def chat_with_agent_stream(
                 unique_id = str(uuid.uuid4())[:8]
                 file_path = os.path.join(UPLOAD_DIR, f"{unique_id}_{document.filename}")
                 
-                with open(file_path, "wb") as f:
-                    content = await document.read()
-                    f.write(content)
+                upload_data = await _save_upload(document, file_path)
                 
                 try:
-                    file_type = detect_file_type(file_path)
-                    document_content = read_file(file_path, file_type)
+                    file_type = detect_file_type(file_path, upload_data)
+                    document_content = await asyncio.to_thread(read_file, file_path, file_type)
+                    table_refs = await asyncio.to_thread(_table_refs, file_path, file_type)
                     active_filename = document.filename
                     yield f"data: {json.dumps({'type': 'step', 'step': '文档解析', 'message': f'文档解析成功，共 {len(document_content)} 字符'}, ensure_ascii=False)}\n\n"
                 except Exception as e:
@@ -1507,7 +1642,8 @@ async def chat_with_agent_stream(
                 if os.path.exists(file_path):
                     try:
                         file_type = detect_file_type(file_path)
-                        document_content = read_file(file_path, file_type)
+                        document_content = await asyncio.to_thread(read_file, file_path, file_type)
+                        table_refs = await asyncio.to_thread(_table_refs, file_path, file_type)
                         yield f"data: {json.dumps({'type': 'step', 'step': '文件解析', 'message': f'文件解析成功，共 {len(document_content)} 字符'}, ensure_ascii=False)}\n\n"
                     except Exception as e:
                         yield f"data: {json.dumps({'type': 'warning', 'message': f'文件解析失败: {str(e)}'}, ensure_ascii=False)}\n\n"
@@ -1548,7 +1684,7 @@ async def chat_with_agent_stream(
             # 调用多智能体系统
             yield f"data: {json.dumps({'type': 'step', 'step': 'LLM处理', 'message': '正在生成响应，请稍候...'}, ensure_ascii=False)}\n\n"
             
-            result = await multi_agent_system.chat(enhanced_message, document_content, scenario)
+            result = await multi_agent_system.chat(enhanced_message, document_content, scenario, tables=table_refs)
             
             if result["success"]:
                 agent_info = result.get("agent", {})
@@ -1567,8 +1703,7 @@ async def chat_with_agent_stream(
                 yield f"data: {json.dumps({'type': 'error', 'message': error_msg}, ensure_ascii=False)}\n\n"
         
         except Exception as e:
-            import traceback
-            traceback.print_exc()
+            logger.exception("[聊天API] 流式处理失败")
             yield f"data: {json.dumps({'type': 'error', 'message': f'处理失败: {str(e)}'}, ensure_ascii=False)}\n\n"
         
         # 发送结束标记
@@ -1626,6 +1761,8 @@ async def get_chat_history():
 
 # ==================== 向量存储 API ====================
 from tools.vector_store import vector_store_manager
+from services.ingestion_queue import JOB_STATUSES, ingestion_queue
+from services.http_client import http_clients
 # MCP Service
 from services.mcp_service import mcp_manager
 import sys
@@ -1660,47 +1797,78 @@ async def connect_mcp(
             "count": len(tools)
         }
     except Exception as e:
-        import traceback
-        traceback.print_exc()
+        logger.exception("连接 MCP Server 失败")
         return JSONResponse(status_code=500, content={"success": False, "error": str(e)})
 
-@app.get("/api/knowledge/add")
+@app.on_event("startup")
+async def start_http_clients():
+    """创建共享的 HTTP 连接池"""
+    await http_clients.start()
+
+
+@app.on_event("shutdown")
+async def stop_http_clients():
+    await http_clients.stop()
+
+
+@app.get("/api/metrics/http")
+async def get_http_metrics():
+    """出站 HTTP 连接复用统计"""
+    return http_clients.get_stats()
+
+
+@app.get("/metrics")
+async def prometheus_metrics():
+    """Prometheus 抓取端点（文本格式）"""
+    return Response(content=metrics_registry.render(), media_type=METRICS_CONTENT_TYPE)
+
+
+@app.on_event("startup")
+async def start_ingestion_queue():
+    """启动知识库后台入库 worker"""
+    await ingestion_queue.start(vector_store_manager.add_document)
+
+
+@app.on_event("shutdown")
+async def stop_ingestion_queue():
+    await ingestion_queue.stop()
+
+
+@app.post("/api/knowledge/add")
 async def add_to_knowledge_base(file: UploadFile = File(...)):
     """
-    将文档添加到知识库（向量化存储）
+    将文档添加到知识库（后台向量化存储）
+    
+    文件落盘后立即返回任务ID，解析与向量化由后台 worker 完成，
+    可通过 /api/knowledge/jobs/{job_id} 查询状态或订阅 /events 获取进度
     """
     try:
-        # 保存文件
-        file_path = os.path.join(UPLOAD_DIR, file.filename)
+        # 保存文件（加前缀避免同名文件在排队期间被覆盖）
+        unique_id = str(uuid.uuid4())[:8]
+        file_path = os.path.join(UPLOAD_DIR, f"{unique_id}_{file.filename}")
         
-        with open(file_path, "wb") as f:
-            content = await file.read()
-            f.write(content)
+        await _save_upload(file, file_path)
         
-        # 添加到向量存储
-        result = vector_store_manager.add_document(
+        # 提交入库任务
+        job = await ingestion_queue.submit(
             file_path,
+            file.filename,
             metadata={
                 "filename": file.filename,
                 "upload_time": datetime.now().isoformat()
             }
         )
         
-        if result["success"]:
-            return {
+        return JSONResponse(
+            status_code=202,
+            content={
                 "success": True,
-                "message": "文档已添加到知识库",
-                "doc_id": result["doc_id"],
-                "chunks_count": result["chunks_count"]
+                "message": "文档已加入知识库入库队列",
+                "job_id": job["job_id"],
+                "status": job["status"],
+                "queue_depth": ingestion_queue.depth
             }
-        else:
-            return JSONResponse(
-                status_code=500,
-                content={
-                    "success": False,
-                    "error": result["error"]
-                }
-            )
+        )
     
     except Exception as e:
         return JSONResponse(
@@ -1712,6 +1880,60 @@ async def add_to_knowledge_base(file: UploadFile = File(...)):
         )
 
 
+@app.get("/api/knowledge/jobs")
+async def list_knowledge_jobs(
+    limit: int = Query(20, ge=1, le=200),
+    status: Optional[str] = Query(None, pattern=f"^({'|'.join(JOB_STATUSES)})$")
+):
+    """
+    列出最近的知识库入库任务
+    """
+    jobs = ingestion_queue.list_jobs(limit=limit, status=status)
+    return {
+        "success": True,
+        "jobs": jobs,
+        "count": len(jobs),
+        "queue_depth": ingestion_queue.depth
+    }
+
+
+@app.get("/api/knowledge/jobs/{job_id}")
+async def get_knowledge_job(job_id: str):
+    """
+    查询知识库入库任务状态
+    """
+    job = ingestion_queue.get_job(job_id)
+    if not job:
+        return JSONResponse(
+            status_code=404,
+            content={
+                "success": False,
+                "error": "任务不存在"
+            }
+        )
+    return {"success": True, "job": job}
+
+
+@app.get("/api/knowledge/jobs/{job_id}/events")
+async def stream_knowledge_job(job_id: str):
+    """
+    通过 SSE 推送知识库入库进度
+    """
+    async def event_generator():
+        async for event in ingestion_queue.subscribe(job_id):
+            yield f"data: {json.dumps(event, ensure_ascii=False)}\n\n"
+    
+    return StreamingResponse(
+        event_generator(),
+        media_type="text/event-stream",
+        headers={
+            "Cache-Control": "no-cache",
+            "Connection": "keep-alive",
+            "X-Accel-Buffering": "no"
+        }
+    )
+
+
 @app.post("/api/knowledge/search")
 async def search_knowledge_base(
     query: str = Form(...),
@@ -1741,17 +1963,20 @@ async def search_knowledge_base(
 
 
 @app.get("/api/knowledge/list")
-async def list_knowledge_base():
+async def list_knowledge_base(limit: int = Query(50, ge=1, le=200), offset: int = Query(0, ge=0)):
     """
-    列出知识库中的所有文档
+    分页列出知识库中的文档
     """
     try:
-        documents = vector_store_manager.list_documents()
+        documents = vector_store_manager.list_documents(limit=limit, offset=offset)
         
         return {
             "success": True,
             "documents": documents,
-            "count": len(documents)
+            "count": len(documents),
+            "total": vector_store_manager.count_documents(),
+            "limit": limit,
+            "offset": offset
         }
     
     except Exception as e:
@@ -1851,10 +2076,13 @@ async def optimize_prompt_api(
         return JSONResponse(status_code=500, content={"success": False, "error": str(e)})
 
 @app.get("/api/prompt/library")
-async def list_prompts_api():
-    """获取提示词库"""
+async def list_prompts_api(keyword: Optional[str] = None, tag: Optional[str] = None):
+    """获取提示词库（可按关键词/标签过滤）"""
     try:
-        prompts = prompt_manager.list_prompts()
+        if keyword or tag:
+            prompts = prompt_manager.search_prompts(keyword=keyword, tag=tag)
+        else:
+            prompts = prompt_manager.list_prompts()
         return {"success": True, "prompts": prompts}
     except Exception as e:
         return JSONResponse(status_code=500, content={"success": False, "error": str(e)})
@@ -1873,6 +2101,11 @@ async def save_prompt_api(
     except Exception as e:
         return JSONResponse(status_code=500, content={"success": False, "error": str(e)})
 
+@app.get("/api/prompt/tags")
+async def list_prompt_tags_api():
+    """获取提示词标签及使用次数"""
+    return {"success": True, "tags": prompt_manager.list_tags()}
+
 @app.delete("/api/prompt/library/{prompt_id}")
 async def delete_prompt_api(prompt_id: str):
     """删除提示词"""
@@ -1905,15 +2138,11 @@ async def workflow_document_review(
         unique_id = str(uuid.uuid4())[:8]
         file_path = os.path.join(UPLOAD_DIR, f"review_{unique_id}_{file.filename}")
         
-        with open(file_path, "wb") as f:
-            content = await file.read()
-            f.write(content)
+        upload_data = await _save_upload(file, file_path)
             
         # 2. 读取内容
-        file_type = detect_file_type(file_path)
-        doc_content = read_file(file_path, file_type)
-        if len(doc_content) > 50000: # 简单截断防止过长
-            doc_content = doc_content[:50000]
+        file_type = detect_file_type(file_path, upload_data)
+        doc_content = await asyncio.to_thread(read_file, file_path, file_type, max_chars=50000)  # 截断防止过长
             
         # 3. 编排 Agent
         
@@ -1927,7 +2156,7 @@ async def workflow_document_review(
         文档内容:
         {doc_content[:10000]}... (略)
         """
-        analyst_result = analyst.invoke([HumanMessage(content=analyst_prompt)])
+        analyst_result = await asyncio.to_thread(analyst.invoke, [HumanMessage(content=analyst_prompt)])
         
         # 提取文本内容 - Agent 可能直接返回列表
         if isinstance(analyst_result, list):
@@ -1959,7 +2188,7 @@ async def workflow_document_review(
         else:
             analyst_text = str(analyst_result)
         
-        print(f"[审查工作流] 文档分析师完成，输出长度: {len(analyst_text)}")
+        logger.debug("[审查工作流] 文档分析师完成，输出长度: %s", len(analyst_text))
         
         # 3.2 合规官
         compliance = multi_agent_system.registry.get("合规官")
@@ -1968,7 +2197,7 @@ async def workflow_document_review(
         文档内容:
         {doc_content[:10000]}... (略)
         """
-        compliance_result = compliance.invoke([HumanMessage(content=compliance_prompt)])
+        compliance_result = await asyncio.to_thread(compliance.invoke, [HumanMessage(content=compliance_prompt)])
         # 提取文本内容 - Agent 可能直接返回列表
         if isinstance(compliance_result, list):
             text_parts = []
@@ -1999,7 +2228,7 @@ async def workflow_document_review(
         else:
             compliance_text = str(compliance_result)
         
-        print(f"[审查工作流] 合规官完成，输出长度: {len(compliance_text)}")
+        logger.debug("[审查工作流] 合规官完成，输出长度: %s", len(compliance_text))
         
         # Step 2: 汇总 (Creator)
         
@@ -2021,7 +2250,7 @@ async def workflow_document_review(
            - 综合建议
         3. 语气：专业、客观、严谨
         """
-        final_report = creator.invoke([HumanMessage(content=creator_prompt)])
+        final_report = await asyncio.to_thread(creator.invoke, [HumanMessage(content=creator_prompt)])
         # 提取文本内容 - Agent 可能直接返回列表
         if isinstance(final_report, list):
             text_parts = []
@@ -2052,8 +2281,8 @@ async def workflow_document_review(
         else:
             final_text = str(final_report)
         
-        print(f"[审查工作流] 内容创作者完成，输出长度: {len(final_text)}")
-        print(f"[审查工作流] 内容创作者前100字符: {final_text[:100]}")
+        logger.debug("[审查工作流] 内容创作者完成，输出长度: %s", len(final_text))
+        logger.debug("[审查工作流] 内容创作者前100字符: %.100s", final_text)
         
         return {
             "success": True,
@@ -2066,8 +2295,7 @@ async def workflow_document_review(
         }
 
     except Exception as e:
-        import traceback
-        traceback.print_exc()
+        logger.exception("[审查工作流] 执行失败")
         return JSONResponse(status_code=500, content={"success": False, "error": str(e)})
     finally:
         # Cleanup
@@ -2124,8 +2352,7 @@ async def workflow_daily_tech(
             }
         }
     except Exception as e:
-        import traceback
-        traceback.print_exc()
+        logger.exception("[每日科技] 工作流执行失败")
         return JSONResponse(status_code=500, content={"success": False, "error": str(e)})
 
 
@@ -2142,17 +2369,17 @@ async def compose_contest(
         if not os.path.exists(file_path):
             return JSONResponse(status_code=404, content={"success": False, "error": "文件不存在"})
         ft = detect_file_type(file_path)
-        content = read_file(file_path, ft)
+        content = await asyncio.to_thread(read_file, file_path, ft, max_chars=20000)
         if not content:
             return JSONResponse(status_code=500, content={"success": False, "error": "读取失败或内容为空"})
-        base_text = content[:20000]
+        base_text = content
         analyst = multi_agent_system.registry.get("文档分析师")
         analyst_prompt = f"""请提取以下文档的版式与章节结构要点，并输出JSON蓝图：
 字段: title, sections[]，每个section包含: name, level(1-3), order, notes。
 文档：
 {base_text}
 """
-        blueprint = analyst.invoke([HumanMessage(content=analyst_prompt)])
+        blueprint = await asyncio.to_thread(analyst.invoke, [HumanMessage(content=analyst_prompt)])
         creator = multi_agent_system.registry.get("内容创作者")
         creator_prompt = f"""基于以下结构蓝图，撰写参赛作品《{project_name}》。
 要求：
@@ -2167,7 +2394,7 @@ async def compose_contest(
 结构蓝图：
 {blueprint}
 """
-        result_text = creator.invoke([HumanMessage(content=creator_prompt)])
+        result_text = await asyncio.to_thread(creator.invoke, [HumanMessage(content=creator_prompt)])
 
         output_file = None
         download_url = None
@@ -2180,7 +2407,7 @@ async def compose_contest(
                 output_file = filename
                 download_url = f"/download/{filename}"
             except Exception as e:
-                print(f"❌ DOCX 导出失败: {e}")
+                logger.error("❌ DOCX 导出失败: %s", e)
 
         return {
             "success": True,
@@ -2190,8 +2417,7 @@ async def compose_contest(
             "download_url": download_url
         }
     except Exception as e:
-        import traceback
-        traceback.print_exc()
+        logger.exception("[参赛材料] 生成失败")
         return JSONResponse(status_code=500, content={"success": False, "error": str(e)})
 
 if __name__ == "__main__":
@@ -2236,8 +2462,7 @@ async def start_alphafund_workflow(
                 await asyncio.sleep(0.01)
             
         except Exception as e:
-            import traceback
-            traceback.print_exc()
+            logger.exception("[AlphaFund] 工作流流式输出失败")
             yield f"data: {json.dumps({'type': 'error', 'error': str(e)}, ensure_ascii=False)}\n\n"
     
     return StreamingResponse(
@@ -2257,10 +2482,24 @@ async def start_alphafund_workflow(
 # ============================================
 
 from services.qa_database import (
-    init_database, create_session, save_qa_record,
-    get_session_history, get_recent_sessions, get_recent_qa_history,
-    search_qa_history, get_statistics
+    init_database, create_session, save_qa_record, save_qa_record_async,
+    qa_write_queue, get_session_history, get_recent_sessions, get_recent_qa_history,
+    search_qa_history, get_statistics, encode_cursor
 )
+from services.conversation_context import build_conversation_context, update_session_summary
+
+
+@app.on_event("startup")
+async def start_qa_write_queue():
+    """启动问答记录写队列"""
+    qa_write_queue.start()
+
+
+@app.on_event("shutdown")
+async def flush_qa_write_queue():
+    """停止前写完积压的问答记录"""
+    await qa_write_queue.stop()
+
 
 class IntentRequest(BaseModel):
     """意图识别请求"""
@@ -2333,6 +2572,59 @@ async def parse_intent(request: IntentRequest):
     }
 
 
+# 后台任务引用，防止任务在完成前被回收
+_background_tasks = set()
+
+
+def _gemini_api_key() -> Optional[str]:
+    return os.getenv("GOOGLE_API_KEY") or os.getenv("GEMINI_API_KEY")
+
+
+async def _gemini_generate(prompt: str, temperature: float = 0.7, max_output_tokens: int = 1024) -> str:
+    """通过 Gemini REST 接口生成文本（复用共享连接池）"""
+    base = os.getenv("GEMINI_BASE_URL", "https://generativelanguage.googleapis.com/v1beta").rstrip("/")
+    model = os.getenv("LANDING_QA_MODEL", "gemini-2.0-flash")
+    
+    response = await http_clients.post(
+        f"{base}/models/{model}:generateContent",
+        json={
+            "contents": [{"parts": [{"text": prompt}]}],
+            "generationConfig": {
+                "temperature": temperature,
+                "maxOutputTokens": max_output_tokens
+            }
+        },
+        headers={
+            "Content-Type": "application/json",
+            "x-goog-api-key": _gemini_api_key()
+        }
+    )
+    
+    if response.status_code != 200:
+        return f"API 调用失败: {response.status_code}"
+    result = response.json()
+    return result.get("candidates", [{}])[0].get("content", {}).get("parts", [{}])[0].get("text", "抱歉，我无法生成回答。")
+
+
+async def _summarize_conversation(previous_summary: Optional[str], turns: List[Dict]) -> Optional[str]:
+    """将早期对话压缩进滚动摘要"""
+    dialogue = "\n\n".join(f"用户: {t['question']}\n助手: {t['answer']}" for t in turns)
+    prompt = f"""请将下面的对话内容合并进已有摘要，输出一段不超过 300 字的新摘要。
+保留用户关注的主题、提供过的关键事实、已经得出的结论和尚未解决的问题，不要编造内容。
+
+已有摘要：{previous_summary or '（无）'}
+
+新增对话：
+{dialogue}
+
+新摘要："""
+    response = await _gemini_generate(prompt, temperature=0.2, max_output_tokens=512)
+    # 调用失败时不覆盖原摘要
+    if response.startswith(("API 调用失败", "抱歉，我无法生成回答")):
+        return None
+    return response.strip()
+
+
 @app.post("/api/landing-qa")
 async def landing_qa(request: QARequest):
     """
@@ -2340,8 +2632,6 @@ async def landing_qa(request: QARequest):
     
     使用 Gemini 进行通用问答，并存档到数据库
     """
-    import httpx
-    
     message = request.message.strip()
     session_id = request.session_id
     user_id = request.user_id
@@ -2350,17 +2640,11 @@ async def landing_qa(request: QARequest):
     if not session_id:
         session_id = create_session(user_id, message[:50] if len(message) > 50 else message)
     
-    # 获取会话历史作为上下文
-    history = get_session_history(session_id, limit=10)
-    
-    # 构建对话历史
-    conversation_context = ""
-    for item in history:
-        conversation_context += f"用户: {item['question']}\n助手: {item['answer']}\n\n"
+    # 构建对话上下文（最近几轮原文 + 早期对话摘要，按 token 预算打包）
+    conversation_context = build_conversation_context(session_id)
     
     # 调用 Gemini API 进行问答
-    gemini_api_key = os.getenv("GOOGLE_API_KEY") or os.getenv("GEMINI_API_KEY")
-    if not gemini_api_key:
+    if not _gemini_api_key():
         return JSONResponse(
             status_code=500,
             content={"error": "未配置 Gemini API Key"}
@@ -2393,29 +2677,12 @@ AgentDesk 系统包含以下智能体工作台：
 请回答："""
 
     try:
-        async with httpx.AsyncClient(timeout=60.0) as client:
-            response = await client.post(
-                f"https://generativelanguage.googleapis.com/v1beta/models/gemini-2.0-flash:generateContent?key={gemini_api_key}",
-                json={
-                    "contents": [{"parts": [{"text": full_prompt}]}],
-                    "generationConfig": {
-                        "temperature": 0.7,
-                        "maxOutputTokens": 1024
-                    }
-                },
-                headers={"Content-Type": "application/json"}
-            )
-            
-            if response.status_code == 200:
-                result = response.json()
-                answer = result.get("candidates", [{}])[0].get("content", {}).get("parts", [{}])[0].get("text", "抱歉，我无法生成回答。")
-            else:
-                answer = f"API 调用失败: {response.status_code}"
+        answer = await _gemini_generate(full_prompt, temperature=0.7, max_output_tokens=1024)
     except Exception as e:
         answer = f"问答服务暂时不可用: {str(e)}"
     
     # 保存问答记录
-    record_id = save_qa_record(
+    record_id = await save_qa_record_async(
         session_id=session_id,
         question=message,
         answer=answer,
@@ -2426,6 +2693,11 @@ AgentDesk 系统包含以下智能体工作台：
         user_id=user_id
     )
     
+    # 后台将早期对话折叠进会话摘要，不占用本次请求的响应时间
+    task = asyncio.create_task(update_session_summary(session_id, _summarize_conversation))
+    _background_tasks.add(task)
+    task.add_done_callback(_background_tasks.discard)
+    
     return {
         "success": True,
         "session_id": session_id,
@@ -2439,29 +2711,43 @@ AgentDesk 系统包含以下智能体工作台：
     }
 
 
+def _next_cursor(rows: List[Dict], limit: int, sort_key: str = "created_at") -> Optional[str]:
+    """整页返回时生成下一页游标，否则说明已到末页"""
+    return encode_cursor(rows[-1], sort_key) if rows and len(rows) >= limit else None
+
+
 @app.get("/api/qa/sessions")
-async def get_qa_sessions(user_id: str = "default", limit: int = 10):
-    """获取问答会话列表"""
-    sessions = get_recent_sessions(user_id, limit)
-    return {"sessions": sessions}
+async def get_qa_sessions(user_id: str = "default", limit: int = Query(10, ge=1, le=200), cursor: Optional[str] = None):
+    """获取问答会话列表（游标分页）"""
+    try:
+        sessions = get_recent_sessions(user_id, limit, cursor)
+    except ValueError as e:
+        return JSONResponse(status_code=400, content={"error": str(e)})
+    return {"sessions": sessions, "next_cursor": _next_cursor(sessions, limit, "updated_at")}
 
 
 @app.get("/api/qa/history/{session_id}")
-async def get_qa_history(session_id: str, limit: int = 50):
-    """获取指定会话的历史记录"""
-    history = get_session_history(session_id, limit)
-    return {"session_id": session_id, "history": history}
+async def get_qa_history(session_id: str, limit: int = Query(50, ge=1, le=200), cursor: Optional[str] = None):
+    """获取指定会话的历史记录（游标分页）"""
+    try:
+        history = get_session_history(session_id, limit, cursor)
+    except ValueError as e:
+        return JSONResponse(status_code=400, content={"error": str(e)})
+    return {"session_id": session_id, "history": history, "next_cursor": _next_cursor(history, limit)}
 
 
 @app.get("/api/qa/recent")
-async def get_recent_qa(user_id: str = "default", limit: int = 20):
-    """获取最近的问答记录"""
-    history = get_recent_qa_history(user_id, limit)
-    return {"history": history}
+async def get_recent_qa(user_id: str = "default", limit: int = Query(20, ge=1, le=200), cursor: Optional[str] = None):
+    """获取最近的问答记录（游标分页）"""
+    try:
+        history = get_recent_qa_history(user_id, limit, cursor)
+    except ValueError as e:
+        return JSONResponse(status_code=400, content={"error": str(e)})
+    return {"history": history, "next_cursor": _next_cursor(history, limit)}
 
 
 @app.get("/api/qa/search")
-async def search_qa(keyword: str, user_id: str = "default", limit: int = 20):
+async def search_qa(keyword: str, user_id: str = "default", limit: int = Query(20, ge=1, le=200)):
     """搜索问答历史"""
     results = search_qa_history(keyword, user_id, limit)
     return {"keyword": keyword, "results": results}
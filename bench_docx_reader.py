@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+"""
+Word 文档读取基准测试
+对比：旧方式（python-docx 先遍历 doc.paragraphs 再遍历 doc.tables / row.cells）与
+流式解析 word/document.xml 的 read_docx_file
+
+用法: python bench_docx_reader.py [表格行数]
+"""
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+from docx import Document
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from tools.file_tools import read_docx_file  # noqa: E402
+
+ROWS = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+REPEAT = 3
+TMP_DIR = tempfile.mkdtemp(prefix="docx_bench_")
+
+
+def make_samples():
+    """生成样例文档：纯段落、含大表格、多个表格与段落交错，返回 (名称, 路径) 列表"""
+    samples = []
+
+    doc = Document()
+    doc.add_heading("年度报告", level=1)
+    for i in range(2000):
+        doc.add_paragraph(f"第 {i} 段：这是一个用于基准测试的正文段落，包含若干中文与 English 文字。")
+    path = os.path.join(TMP_DIR, "paragraphs.docx")
+    doc.save(path)
+    samples.append(("2000 段落", path))
+
+    doc = Document()
+    doc.add_paragraph("销售明细如下：")
+    table = doc.add_table(rows=ROWS + 1, cols=6)
+    for j, title in enumerate(["编号", "城市", "产品", "数量", "单价", "金额"]):
+        table.cell(0, j).text = title
+    for i in range(1, ROWS + 1):
+        cells = table.rows[i].cells
+        for j, value in enumerate([i, f"城市{i % 30}", f"产品{i % 7}", i % 50, 9.9, i % 50 * 9.9]):
+            cells[j].text = str(value)
+    doc.add_paragraph("以上为全部数据。")
+    path = os.path.join(TMP_DIR, "big_table.docx")
+    doc.save(path)
+    samples.append((f"{ROWS} 行表格", path))
+
+    doc = Document()
+    for k in range(20):
+        doc.add_heading(f"第 {k + 1} 节", level=2)
+        doc.add_paragraph("本节说明。" * 10)
+        table = doc.add_table(rows=51, cols=4)
+        for i in range(51):
+            cells = table.rows[i].cells
+            for j in range(4):
+                cells[j].text = f"r{i}c{j}"
+    path = os.path.join(TMP_DIR, "mixed.docx")
+    doc.save(path)
+    samples.append(("20 节 × 50 行表格", path))
+    return samples
+
+
+def read_docx_legacy(file_path):
+    """旧实现：python-docx 先读全部段落，再逐表逐行读取 row.cells"""
+    doc = Document(file_path)
+    parts = [para.text for para in doc.paragraphs if para.text.strip()]
+    if doc.tables:
+        parts.append("\n=== 表格内容 ===")
+        for i, table in enumerate(doc.tables):
+            parts.append(f"\n--- 表格 {i + 1} ---")
+            for row in table.rows:
+                parts.append(" | ".join(cell.text.strip() for cell in row.cells))
+    return "\n".join(parts)
+
+
+def bench(func, path):
+    start = time.perf_counter()
+    for _ in range(REPEAT):
+        text = func(path)
+    return (time.perf_counter() - start) / REPEAT, len(text)
+
+
+if __name__ == "__main__":
+    samples = make_samples()
+
+    print("=" * 72)
+    print(f"Word 文档读取基准（每项取 {REPEAT} 次平均）")
+    print(f"临时目录: {TMP_DIR}")
+    print("=" * 72)
+    print(f"  {'样例':<20} {'旧方式':>10} {'流式解析':>10} {'加速':>8}   {'输出字符 旧/新'}")
+    for name, path in samples:
+        legacy, legacy_len = bench(read_docx_legacy, path)
+        fast, fast_len = bench(read_docx_file, path)
+        print(f"  {name:<20} {legacy:9.3f}s {fast:9.3f}s {legacy / fast:7.1f}x   {legacy_len}/{fast_len}")
+
+    print("-" * 72)
+    path = samples[1][1]
+    start = time.perf_counter()
+    head = read_docx_file(path, max_chars=2000)
+    print(f"  max_chars=2000 读取 {samples[1][0]}: {time.perf_counter() - start:.4f}s，输出 {len(head)} 字符")
+    print("-" * 72)
+    print(read_docx_file(samples[2][1], max_chars=300))
+    shutil.rmtree(TMP_DIR, ignore_errors=True)
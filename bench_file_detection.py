@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+"""
+文件类型检测基准测试
+对比：旧方式（每次调用新建 magic.Magic 并 from_file）、复用 libmagic 检测器、扩展名 + 文件头快速路径、
+以及上传场景下直接传入内存缓冲区
+
+用法: python bench_file_detection.py [每种文件的调用次数]
+"""
+import os
+import shutil
+import sys
+import tempfile
+import time
+import zipfile
+
+import magic
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from tools.file_tools import MIME_TO_TYPE, EXT_TO_TYPE, detect_file_type, _get_magic  # noqa: E402
+
+CALLS = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+TMP_DIR = tempfile.mkdtemp(prefix="detect_bench_")
+
+
+def make_samples():
+    """生成各格式的样例文件，返回路径列表"""
+    paths = []
+
+    def write(name, data):
+        path = os.path.join(TMP_DIR, name)
+        with open(path, "wb") as f:
+            f.write(data)
+        paths.append(path)
+
+    write("notes.txt", ("这是一个用于基准测试的文本段落。\n" * 500).encode("utf-8"))
+    write("readme.md", ("# 标题\n\n- 列表项\n" * 300).encode("utf-8"))
+    write("table.csv", ("id,name,value\n" + "".join(f"{i},项目{i},{i * 1.5}\n" for i in range(2000))).encode("utf-8"))
+    write("data.json", ("[" + ",".join(f'{{"id": {i}}}' for i in range(2000)) + "]").encode("utf-8"))
+    write("report.pdf", b"%PDF-1.4\n1 0 obj\n<< /Type /Catalog >>\nendobj\ntrailer\n<< /Root 1 0 R >>\n%%EOF\n")
+
+    docx_path = os.path.join(TMP_DIR, "doc.docx")
+    with zipfile.ZipFile(docx_path, "w") as zf:
+        zf.writestr("[Content_Types].xml", "<Types/>")
+        zf.writestr("word/document.xml", "<w:document/>")
+    paths.append(docx_path)
+
+    # 无扩展名文件只能走 libmagic
+    write("upload_no_ext", b"%PDF-1.4\n%%EOF\n")
+    return paths
+
+
+def detect_legacy(file_path):
+    """旧实现：每次调用都新建 magic.Magic（重新加载 magic 数据库）"""
+    file_mime = magic.Magic(mime=True).from_file(file_path)
+    file_type = MIME_TO_TYPE.get(file_mime, "unknown")
+    if file_type == "unknown":
+        file_type = EXT_TO_TYPE.get(os.path.splitext(file_path)[1].lower(), "unknown")
+    return file_type
+
+
+def detect_cached_magic(file_path):
+    """复用线程内的 libmagic 检测器，但不走快速路径"""
+    file_mime = _get_magic().from_file(file_path)
+    file_type = MIME_TO_TYPE.get(file_mime, "unknown")
+    if file_type == "unknown":
+        file_type = EXT_TO_TYPE.get(os.path.splitext(file_path)[1].lower(), "unknown")
+    return file_type
+
+
+def bench(func, paths, buffers=None):
+    start = time.perf_counter()
+    for _ in range(CALLS):
+        for path in paths:
+            if buffers is None:
+                func(path)
+            else:
+                func(path, buffers[path])
+    return time.perf_counter() - start
+
+
+def report(name, elapsed, calls):
+    print(f"  {name:<32} {elapsed:8.3f}s   {elapsed / calls * 1e6:10.1f} µs/次")
+
+
+if __name__ == "__main__":
+    paths = make_samples()
+    buffers = {}
+    for path in paths:
+        with open(path, "rb") as f:
+            buffers[path] = f.read()
+    calls = CALLS * len(paths)
+
+    print("=" * 60)
+    print(f"文件类型检测基准: {len(paths)} 种文件 × {CALLS} 次")
+    print(f"临时目录: {TMP_DIR}")
+    print("=" * 60)
+    for path in paths:
+        legacy, fast = detect_legacy(path), detect_file_type(path)
+        flag = "" if legacy == fast else "  (结果不同)"
+        print(f"  {os.path.basename(path):<16} 旧: {legacy:<8} 新: {fast}{flag}")
+    print("-" * 60)
+    report("旧方式 (每次新建 magic.Magic)", bench(detect_legacy, paths), calls)
+    report("复用 libmagic 检测器", bench(detect_cached_magic, paths), calls)
+    report("扩展名 + 文件头快速路径", bench(detect_file_type, paths), calls)
+    report("快速路径 + 上传缓冲区", bench(detect_file_type, paths, buffers), calls)
+    shutil.rmtree(TMP_DIR, ignore_errors=True)
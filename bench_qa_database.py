@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+"""
+问答历史库写入基准测试
+对比：旧方式（默认日志模式 + 每条记录单独提交）、WAL 同步写入、WAL + 异步批量写队列
+
+用法: python bench_qa_database.py [记录数] [并发数]
+"""
+import asyncio
+import os
+import shutil
+import sqlite3
+import sys
+import tempfile
+import time
+
+TMP_DIR = tempfile.mkdtemp(prefix="qa_bench_")
+os.environ["QA_DB_PATH"] = os.path.join(TMP_DIR, "qa_bench.db")
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from services import qa_database  # noqa: E402  (需在设置 QA_DB_PATH 之后导入)
+
+RECORDS = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+CONCURRENCY = int(sys.argv[2]) if len(sys.argv) > 2 else 50
+ANSWER = "这是一个用于基准测试的回答。" * 20
+
+
+def bench_legacy():
+    """旧实现：rollback 日志 + synchronous=FULL，每条记录 INSERT/UPDATE 后立即提交"""
+    path = os.path.join(TMP_DIR, "qa_legacy.db")
+    conn = sqlite3.connect(path)
+    conn.execute("PRAGMA journal_mode=DELETE")
+    conn.execute("PRAGMA synchronous=FULL")
+    conn.execute("""
+        CREATE TABLE qa_history (
+            id INTEGER PRIMARY KEY AUTOINCREMENT, session_id TEXT, user_id TEXT,
+            question TEXT, answer TEXT, created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+    conn.execute("CREATE TABLE qa_sessions (session_id TEXT UNIQUE, message_count INTEGER DEFAULT 0)")
+    conn.execute("INSERT INTO qa_sessions VALUES ('legacy', 0)")
+    conn.commit()
+
+    start = time.perf_counter()
+    for i in range(RECORDS):
+        conn.execute(
+            "INSERT INTO qa_history (session_id, user_id, question, answer) VALUES (?, ?, ?, ?)",
+            ("legacy", "bench", f"问题 {i}", ANSWER)
+        )
+        conn.execute("UPDATE qa_sessions SET message_count = message_count + 1 WHERE session_id = 'legacy'")
+        conn.commit()
+    return time.perf_counter() - start
+
+
+def bench_sync():
+    """WAL + 同步单条提交"""
+    start = time.perf_counter()
+    for i in range(RECORDS):
+        qa_database.save_qa_record("sync", f"问题 {i}", ANSWER, user_id="bench")
+    return time.perf_counter() - start
+
+
+async def bench_async():
+    """WAL + 异步写队列，CONCURRENCY 个并发请求"""
+    semaphore = asyncio.Semaphore(CONCURRENCY)
+
+    async def one(i):
+        async with semaphore:
+            await qa_database.save_qa_record_async(f"async-{i % 20}", f"问题 {i}", ANSWER, user_id="bench")
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(RECORDS)))
+    elapsed = time.perf_counter() - start
+    await qa_database.qa_write_queue.stop()
+    return elapsed
+
+
+def report(name, elapsed):
+    print(f"  {name:<28} {elapsed:8.3f}s   {RECORDS / elapsed:10.0f} 条/秒")
+
+
+if __name__ == "__main__":
+    print("=" * 60)
+    print(f"问答历史库写入基准: {RECORDS} 条记录, 并发 {CONCURRENCY}")
+    print(f"临时目录: {TMP_DIR}")
+    print("=" * 60)
+    report("旧方式 (DELETE 日志, 逐条提交)", bench_legacy())
+    report("WAL 同步写入", bench_sync())
+    report("WAL 异步批量写队列", asyncio.run(bench_async()))
+    shutil.rmtree(TMP_DIR, ignore_errors=True)
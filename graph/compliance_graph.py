@@ -3,12 +3,15 @@ LangGraph 合规营销工作流
 实现 内容创作者 <-> 合规官 的循环审批流
 """
 
+import logging
 from typing import TypedDict, Optional, List, Dict, Any
 from langgraph.graph import StateGraph, END
 from langgraph.checkpoint.memory import MemorySaver
 from langchain_core.messages import HumanMessage, AIMessage
 from agents.multi_agents import multi_agent_system
 
+logger = logging.getLogger(__name__)
+
 class ComplianceState(TypedDict):
     """合规营销状态"""
     topic: str                      # 营销主题
@@ -21,7 +24,7 @@ class ComplianceState(TypedDict):
 
 def node_draft_content(state: ComplianceState) -> ComplianceState:
     """起草/修改文案节点 (内容创作者)"""
-    print(f"\n✍️ 正在起草/修改文案... (迭代: {state['iteration_count']})")
+    logger.info("✍️ 正在起草/修改文案... (迭代: %s)", state['iteration_count'])
     
     creator = multi_agent_system.registry.get("内容创作者")
     
@@ -36,12 +39,12 @@ def node_draft_content(state: ComplianceState) -> ComplianceState:
     state['status'] = 'reviewing'
     state['iteration_count'] += 1
     
-    print(f"✅ 文案已生成 (长度: {len(response)})")
+    logger.info("✅ 文案已生成 (长度: %s)", len(response))
     return state
 
 def node_compliance_review(state: ComplianceState) -> ComplianceState:
     """合规审核节点 (合规官)"""
-    print(f"\n⚖️ 正在进行合规审核...")
+    logger.info("⚖️ 正在进行合规审核...")
     
     reviewer = multi_agent_system.registry.get("合规官")
     
@@ -59,11 +62,11 @@ def node_compliance_review(state: ComplianceState) -> ComplianceState:
     
     if "✅ 通过" in response:
         state['status'] = 'approved'
-        print("✅ 审核通过")
+        logger.info("✅ 审核通过")
     else:
         state['status'] = 'drafting'
         state['feedback'] = response
-        print("⚠️ 审核未通过，需要修改")
+        logger.warning("⚠️ 审核未通过，需要修改")
         
     return state
 
@@ -73,7 +76,7 @@ def should_continue(state: ComplianceState) -> str:
         return "end"
     
     if state['iteration_count'] >= 3:
-        print("⚠️ 达到最大迭代次数，强制结束")
+        logger.warning("⚠️ 达到最大迭代次数，强制结束")
         return "end"
         
     return "draft"
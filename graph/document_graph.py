@@ -2,20 +2,46 @@
 LangGraph 文档处理工作流
 """
 
+import bisect
+import contextvars
+import logging
+import re
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from langgraph.graph import StateGraph, END
 from langgraph.checkpoint.memory import MemorySaver
-from typing import TypedDict, Optional, Any, Dict
+from typing import TypedDict, Optional, Any, Callable, Dict, List, Tuple
 from tools.file_tools import read_file, detect_file_type, save_file
-from tools.document_tools import get_operation_prompt
+from tools.document_tools import extract_entities, get_operation_prompt, split_into_sections
 from agents.document_agent import create_document_agent
 from langchain_core.messages import HumanMessage
+from utils.rate_limiter import gemini_limiter
 import os
 import json
 from dotenv import load_dotenv
 
+logger = logging.getLogger(__name__)
+
 # 加载环境变量
 load_dotenv()
 
+# 摘要超过单次提示词可容纳的长度时，改为分段摘要（map）+ 逐层合并（reduce）
+MAP_REDUCE_THRESHOLD = 8000
+# 每个分段的最大字符数
+SECTION_MAX_CHARS = 6000
+# 分段摘要的并发数
+MAP_CONCURRENCY = int(os.getenv("DOC_SUMMARY_CONCURRENCY", "4"))
+# 每次合并的摘要数量
+REDUCE_FAN_IN = 8
+# 需要读取全文的操作（其余操作只读前2000字）
+FULL_TEXT_OPERATIONS = ("summarize", "extract_key_points")
+# 提要点时每类实体最多附带的条数
+ENTITY_HINT_LIMIT = 20
+ENTITY_LABELS = {"email": "邮箱", "date": "日期", "phone": "电话", "amount": "金额"}
+
+# 进度回调（由 process_document 设置，节点内读取；不放进可持久化的 state）
+_progress_callback: contextvars.ContextVar[Optional[Callable[[Dict[str, Any]], None]]] = \
+    contextvars.ContextVar("document_progress", default=None)
+
 
 class DocumentState(TypedDict):
     """文档处理状态"""
@@ -35,24 +61,25 @@ class DocumentState(TypedDict):
 
 def node_read_file(state: DocumentState) -> DocumentState:
     """读取文件节点"""
-    print(f"\n📄 正在读取文件: {state['original_filename']}")
+    logger.debug("📄 正在读取文件: %s", state['original_filename'])
 
     try:
         # 检测文件类型
         file_type = detect_file_type(state['file_path'])
         state['file_type'] = file_type
-        print(f"   检测到的文件类型: {file_type}")
+        logger.debug("检测到的文件类型: %s", file_type)
 
-        # 读取文件内容
-        content = read_file(state['file_path'], file_type)
+        # 读取文件内容：摘要（长文档走分段摘要）和提要点（全文实体扫描）需要全文，其他操作只用前2000字，读够即停止解析
+        max_chars = None if state['operation'] in FULL_TEXT_OPERATIONS else 2000
+        content = read_file(state['file_path'], file_type, max_chars=max_chars)
         state['content'] = content
-        state['extracted_text'] = content[:2000]  # 前2000字用于AI处理
+        state['extracted_text'] = content[:2000]
 
-        print(f"✅ 文件读取成功，共 {len(content)} 字符")
+        logger.info("✅ 文件读取成功，共 %s 字符", len(content))
 
     except Exception as e:
         state['error'] = f"读取文件失败: {str(e)}"
-        print(f"❌ {state['error']}")
+        logger.error("❌ %s", state['error'])
 
     return state
 
@@ -73,40 +100,40 @@ def node_process_with_agent(state: DocumentState) -> DocumentState:
     if state.get('error'):
         return state
 
-    print(f"\n🤖 正在调用AI智能体进行: {state['operation']}")
+    logger.info("🤖 正在调用AI智能体进行: %s", state['operation'])
 
     try:
-        # 创建提示词
-        prompt = get_operation_prompt(
-            operation=state['operation'],
-            content=state['extracted_text'][:4000],  # 限制token
-            instruction=state.get('instruction', '')
-        )
-
-        print(f"   提示词预览: {prompt[:100]}...")
-
         # 调用智能体
         agent = create_document_agent()
-        print(f"   DEBUG: Agent类型 = {type(agent)}")
-        print(f"   DEBUG: Agent有invoke属性 = {hasattr(agent, 'invoke')}")
 
-        # 调用智能体
-        result = agent.invoke({"messages": [HumanMessage(content=prompt)]})
+        if state['operation'] == 'summarize' and len(state['content']) > MAP_REDUCE_THRESHOLD:
+            ai_response = _map_reduce_summarize(agent, state['content'], state.get('instruction', ''))
+        else:
+            instruction = state.get('instruction', '')
+            if state['operation'] == 'extract_key_points':
+                instruction = _entity_hints(state['content']) + instruction
 
-        print(f"   DEBUG: Result类型 = {type(result)}")
-        print(f"   DEBUG: Result值 = {str(result)[:200]}...")
+            # 读取了全文的操作在阈值内直接用全文（提要点超长时截到阈值，全文实体由 _entity_hints 补充），其他操作只用前2000字
+            if state['operation'] in FULL_TEXT_OPERATIONS:
+                content = state['content'][:MAP_REDUCE_THRESHOLD]
+            else:
+                content = state['extracted_text'][:4000]  # 限制token
 
-        # 提取AI响应内容
-        ai_response = result.content if hasattr(result, 'content') else str(result)
+            # 创建提示词
+            prompt = get_operation_prompt(
+                operation=state['operation'],
+                content=content,
+                instruction=instruction
+            )
 
-        print(f"   DEBUG: ai_response类型 = {type(ai_response)}")
-        print(f"   DEBUG: ai_response长度 = {len(ai_response) if ai_response else 0}")
-        print(f"   DEBUG: ai_response前100字 = {str(ai_response)[:100]}...")
+            logger.debug("提示词预览: %.100s...", prompt)
+
+            ai_response = _invoke_agent(agent, prompt)
 
         # 设置结果
         state['result'] = ai_response
 
-        print(f"✅ AI处理完成，结果长度: {len(ai_response) if ai_response else 0} 字符")
+        logger.info("✅ AI处理完成，结果长度: %s 字符", len(ai_response) if ai_response else 0)
 
         # 判断是否需要审核（结果较长或需要人工确认的操作）
         needs_review_criteria = [
@@ -118,26 +145,149 @@ def node_process_with_agent(state: DocumentState) -> DocumentState:
         state['needs_review'] = any(needs_review_criteria)
 
         if state['needs_review']:
-            print("   ⚠️  结果需要人工审核")
+            logger.warning("⚠️  结果需要人工审核")
 
     except Exception as e:
-        import traceback
         state['error'] = f"AI处理失败: {str(e)}"
-        print(f"❌ {state['error']}")
-        print(f"   错误详情: {traceback.format_exc()}")
+        logger.exception("❌ %s", state['error'])
 
     return state
 
 
+@gemini_limiter
+def _invoke_agent(agent, prompt: str) -> str:
+    """调用文档智能体（受全局速率限制）并提取文本"""
+    result = agent.invoke({"messages": [HumanMessage(content=prompt)]})
+    ai_response = result.content if hasattr(result, 'content') else str(result)
+    logger.debug("智能体返回 %s: %.200s...", type(result).__name__, ai_response)
+    return ai_response
+
+
+def _entity_hints(content: str) -> str:
+    """扫描全文中的邮箱/日期/电话/金额，生成带行号的实体清单，供提要点时参考（提示词只含前2000字）"""
+    entities = extract_entities(content)
+    if not any(entities.values()):
+        return ""
+
+    newlines = [m.start() for m in re.finditer("\n", content)]
+    lines = ["全文中识别到的实体（括号内为所在行号）："]
+    for kind, found in entities.items():
+        seen = {}
+        for text, start in found:
+            if text not in seen:
+                seen[text] = bisect.bisect_right(newlines, start) + 1
+                if len(seen) >= ENTITY_HINT_LIMIT:
+                    break
+        if seen:
+            items = "、".join(f"{text}（第{line}行）" for text, line in seen.items())
+            lines.append(f"- {ENTITY_LABELS[kind]}（共 {len(found)} 处）: {items}")
+    return "\n".join(lines) + "\n"
+
+
+def _emit_progress(event: Dict[str, Any]):
+    callback = _progress_callback.get()
+    if callback is None:
+        return
+    try:
+        callback(event)
+    except Exception as e:
+        logger.warning("进度回调失败: %s", e)
+
+
+def _chunk_sections(content: str) -> List[Tuple[str, str]]:
+    """按章节切分全文，过长的章节再按段落切成不超过 SECTION_MAX_CHARS 的分段"""
+    chunks = []
+    for title, body in split_into_sections(content):
+        if len(body) <= SECTION_MAX_CHARS:
+            chunks.append((title, body))
+            continue
+
+        pieces, current = [], ""
+        for para in body.split("\n"):
+            while len(para) > SECTION_MAX_CHARS:
+                pieces.append(para[:SECTION_MAX_CHARS])
+                para = para[SECTION_MAX_CHARS:]
+            if current and len(current) + len(para) + 1 > SECTION_MAX_CHARS:
+                pieces.append(current)
+                current = ""
+            current = f"{current}\n{para}" if current else para
+        if current:
+            pieces.append(current)
+        chunks.extend((f"{title}（{i + 1}/{len(pieces)}）", piece) for i, piece in enumerate(pieces))
+    return chunks
+
+
+def _map_reduce_summarize(agent, content: str, instruction: str) -> str:
+    """
+    长文档摘要：各分段并发摘要，再逐层合并，最后按常规摘要要求输出
+
+    每完成一个分段 / 一轮合并都会通过进度回调推送事件
+    """
+    sections = _chunk_sections(content)
+    total = len(sections)
+    logger.info("长文档分段摘要: %s 字符，%s 个分段", len(content), total)
+    _emit_progress({"type": "map_start", "total": total})
+
+    def summarize_section(title: str, body: str, index: int) -> str:
+        prompt = f"""以下是一份长文档的第 {index + 1}/{total} 部分「{title}」。
+请用不超过 300 字概括这一部分的要点，保留关键数据、结论和专有名词，不要添加原文没有的信息。
+
+{body}
+"""
+        return _invoke_agent(agent, prompt)
+
+    summaries: List[Optional[str]] = [None] * total
+    with ThreadPoolExecutor(max_workers=max(1, MAP_CONCURRENCY)) as executor:
+        # copy_context 让工作线程沿用当前请求 ID 等上下文
+        futures = {
+            executor.submit(contextvars.copy_context().run, summarize_section, title, body, i): i
+            for i, (title, body) in enumerate(sections)
+        }
+        done = 0
+        for future in as_completed(futures):
+            i = futures[future]
+            done += 1
+            try:
+                summaries[i] = future.result()
+                status = "done"
+            except Exception as e:
+                logger.warning("分段 %s「%s」摘要失败: %s", i + 1, sections[i][0], e)
+                status = "failed"
+            _emit_progress({
+                "type": "section", "index": i + 1, "total": total, "completed": done,
+                "title": sections[i][0], "status": status
+            })
+
+    parts = [f"【{sections[i][0]}】\n{summary}" for i, summary in enumerate(summaries) if summary]
+    if not parts:
+        raise RuntimeError("所有分段摘要均失败")
+
+    # 逐层合并，直到剩余摘要能放进一次常规摘要提示词
+    level = 0
+    while len(parts) > 1 and sum(len(p) for p in parts) > MAP_REDUCE_THRESHOLD:
+        level += 1
+        groups = [parts[i:i + REDUCE_FAN_IN] for i in range(0, len(parts), REDUCE_FAN_IN)]
+        _emit_progress({"type": "reduce", "level": level, "groups": len(groups)})
+        with ThreadPoolExecutor(max_workers=max(1, MAP_CONCURRENCY)) as executor:
+            parts = list(executor.map(
+                lambda group: contextvars.copy_context().run(
+                    _invoke_agent, agent,
+                    "请把以下若干部分摘要合并为一份连贯的摘要（不超过 600 字），保留关键数据与结论：\n\n" + "\n\n".join(group)
+                ),
+                groups
+            ))
+
+    _emit_progress({"type": "final"})
+    return _invoke_agent(agent, get_operation_prompt("summarize", "\n\n".join(parts), instruction))
+
+
 def node_human_review(state: DocumentState) -> DocumentState:
     """人工审核节点 - 暂停等待人工决策"""
     if state.get('error'):
         return state
 
-    print(f"\n👀 等待人工审核...")
-    print(f"   操作: {state['operation']}")
-    print(f"   文件名: {state['original_filename']}")
-    print(f"   结果预览: {state['result'][:200]}...")
+    logger.info("👀 等待人工审核: %s (操作: %s)", state['original_filename'], state['operation'])
+    logger.debug("结果预览: %.200s...", state['result'])
 
     # 在实际应用中，这里会暂停并等待外部审批
     # 审批通过后会设置 state['review_approved'] = True
@@ -174,13 +324,13 @@ def node_save_result(state: DocumentState) -> DocumentState:
 
         state['metadata'] = metadata
 
-        print(f"\n✅ 处理完成！")
-        print(f"   结果已保存至: {output_path}")
-        print(f"   元数据已保存至: {metadata_path}")
+        logger.info("✅ 处理完成！")
+        logger.info("结果已保存至: %s", output_path)
+        logger.debug("元数据已保存至: %s", metadata_path)
 
     except Exception as e:
         state['error'] = f"保存结果失败: {str(e)}"
-        print(f"❌ {state['error']}")
+        logger.error("❌ %s", state['error'])
 
     return state
 
@@ -205,7 +355,7 @@ def node_error_handler(state: DocumentState) -> DocumentState:
         error_path = os.path.join('uploads', f"{os.path.splitext(state['original_filename'])[0]}_error.txt")
         save_file(error_path, error_output)
 
-        print(f"\n❌ 处理失败，错误报告已保存至: {error_path}")
+        logger.error("❌ 处理失败，错误报告已保存至: %s", error_path)
 
     return state
 
@@ -281,7 +431,8 @@ def process_document(
     file_path: str,
     operation: str = "summarize",
     instruction: str = "",
-    original_filename: str = None
+    original_filename: str = None,
+    on_progress: Optional[Callable[[Dict[str, Any]], None]] = None
 ) -> DocumentState:
     """
     处理文档的快捷函数
@@ -291,6 +442,7 @@ def process_document(
         operation: 操作类型: summarize/generate/convert/extract_table
         instruction: 用户的额外指示
         original_filename: 原始文件名
+        on_progress: 进度回调，长文档分段摘要时每完成一个分段调用一次
 
     Returns:
         处理后的状态
@@ -314,24 +466,23 @@ def process_document(
         metadata=None
     )
 
-    print("=" * 60)
-    print(f"开始处理文档: {original_filename}")
-    print(f"操作类型: {operation}")
-    print("=" * 60)
+    logger.info("开始处理文档: %s (操作: %s)", original_filename, operation)
 
     # 执行工作流
     config = {"configurable": {"thread_id": "1"}}
-    result = graph.invoke(initial_state, config=config)
+    token = _progress_callback.set(on_progress)
+    try:
+        result = graph.invoke(initial_state, config=config)
+    finally:
+        _progress_callback.reset(token)
 
-    print("=" * 60)
     if result.get('error'):
-        print(f"❌ 处理失败: {result['error']}")
+        logger.error("❌ 处理失败: %s", result['error'])
     else:
-        print("✅ 处理完成")
+        logger.info("✅ 处理完成")
         if result.get('metadata'):
             output_file = result['metadata'].get('output_file')
-            print(f"   结果文件: {output_file}")
-    print("=" * 60)
+            logger.info("结果文件: %s", output_file)
 
     return result
 
@@ -0,0 +1,446 @@
+"""
+运行指标采集与分析模块
+进程内记录智能体调用、文件上传、文档解析、向量嵌入和工具调用（耗时、token、字节数、成功与否），
+按分钟/小时环形缓冲区聚合，并定期把小时级汇总写入 SQLite，供 /api/analytics/data 使用
+"""
+
+import asyncio
+import contextvars
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from bisect import bisect_left
+from collections import deque
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from services.metrics import observe_event
+
+logger = logging.getLogger(__name__)
+
+DB_PATH = Path(os.getenv("ANALYTICS_DB_PATH") or Path(__file__).parent.parent / "analytics.db")
+
+# 事件类型
+EVENT_KINDS = ("agent", "upload", "parse", "embedding", "tool")
+
+# 耗时直方图的桶上界（毫秒），最后一个桶为 +Inf
+LATENCY_BUCKETS_MS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000, 60000, 120000)
+
+# 每分钟吞吐的内存环形缓冲区长度（小时级汇总只保存在 SQLite 中）
+MINUTE_SLOTS = 60
+
+# 汇总写入 SQLite 的间隔（秒）与保留天数
+FLUSH_INTERVAL = float(os.getenv("ANALYTICS_FLUSH_INTERVAL", "60"))
+RETENTION_DAYS = int(os.getenv("ANALYTICS_RETENTION_DAYS", "90"))
+
+# 文档类型在分布图中的显示名
+FILE_TYPE_LABELS = {
+    "pdf": "PDF",
+    "docx": "Word",
+    "xlsx": "Excel",
+    "csv": "CSV",
+    "txt": "TXT",
+    "md": "Markdown",
+    "json": "JSON"
+}
+
+
+class _Bucket:
+    """单个时间片内某一类事件的聚合值"""
+
+    __slots__ = ("count", "errors", "tokens", "bytes", "latency_sum", "histogram")
+
+    def __init__(self):
+        self.count = 0
+        self.errors = 0
+        self.tokens = 0
+        self.bytes = 0
+        self.latency_sum = 0.0
+        self.histogram = [0] * (len(LATENCY_BUCKETS_MS) + 1)
+
+    def add(self, latency_ms: float, success: bool, tokens: int, size: int):
+        self.count += 1
+        if not success:
+            self.errors += 1
+        self.tokens += tokens
+        self.bytes += size
+        self.latency_sum += latency_ms
+        self.histogram[bisect_left(LATENCY_BUCKETS_MS, latency_ms)] += 1
+
+    def merge(self, other: "_Bucket"):
+        self.count += other.count
+        self.errors += other.errors
+        self.tokens += other.tokens
+        self.bytes += other.bytes
+        self.latency_sum += other.latency_sum
+        for i, value in enumerate(other.histogram):
+            self.histogram[i] += value
+
+    @classmethod
+    def from_row(cls, row: sqlite3.Row) -> "_Bucket":
+        bucket = cls()
+        bucket.count = row["count"]
+        bucket.errors = row["errors"]
+        bucket.tokens = row["tokens"]
+        bucket.bytes = row["bytes"]
+        bucket.latency_sum = row["latency_sum_ms"]
+        histogram = json.loads(row["histogram"] or "[]")
+        if len(histogram) == len(bucket.histogram):
+            bucket.histogram = histogram
+        return bucket
+
+    def percentile(self, q: float) -> float:
+        """根据直方图估算分位数（桶内线性插值，毫秒）"""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for i, value in enumerate(self.histogram):
+            if value and seen + value >= rank:
+                lower = LATENCY_BUCKETS_MS[i - 1] if i > 0 else 0
+                upper = LATENCY_BUCKETS_MS[i] if i < len(LATENCY_BUCKETS_MS) else lower * 2
+                return lower + (upper - lower) * (rank - seen) / value
+            seen += value
+        return float(LATENCY_BUCKETS_MS[-1])
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            "count": self.count,
+            "errors": self.errors,
+            "success_rate": round((1 - self.errors / self.count) * 100, 1) if self.count else 100.0,
+            "tokens": self.tokens,
+            "bytes": self.bytes,
+            "avg_ms": round(self.latency_sum / self.count, 1) if self.count else 0.0,
+            "p50_ms": round(self.percentile(0.5), 1),
+            "p95_ms": round(self.percentile(0.95), 1),
+            "p99_ms": round(self.percentile(0.99), 1)
+        }
+
+
+class MetricSpan:
+    """一次被计时的操作，执行过程中可累加 token / 字节数或标记失败"""
+
+    __slots__ = ("kind", "name", "labels", "tokens", "bytes", "success", "parent")
+
+    def __init__(
+        self,
+        kind: str,
+        name: str,
+        size: int = 0,
+        labels: Optional[Dict[str, str]] = None,
+        parent: Optional["MetricSpan"] = None
+    ):
+        self.kind = kind
+        self.name = name
+        self.labels = labels
+        self.tokens = 0
+        self.bytes = size
+        self.success = True
+        self.parent = parent
+
+
+_current_span: contextvars.ContextVar[Optional[MetricSpan]] = contextvars.ContextVar(
+    "analytics_current_span", default=None
+)
+
+
+def current_span(kind: Optional[str] = None) -> Optional[MetricSpan]:
+    """获取当前（或最近一个指定类型的）正在计时的操作"""
+    span = _current_span.get()
+    while span is not None and kind is not None and span.kind != kind:
+        span = span.parent
+    return span
+
+
+def _minute_of(ts: float) -> int:
+    return int(ts // 60 * 60)
+
+
+def _hour_of(ts: float) -> int:
+    return int(ts // 3600 * 3600)
+
+
+class MetricsCollector:
+    """进程内指标采集器"""
+
+    def __init__(self, db_path: Path = DB_PATH):
+        self.db_path = Path(db_path)
+        self._lock = threading.Lock()
+        self._db_lock = threading.Lock()
+        self._minutes: deque = deque(maxlen=MINUTE_SLOTS)
+        # 尚未写入 SQLite 的小时级增量: (hour, kind, name) -> _Bucket
+        self._pending: Dict[Tuple[int, str, str], _Bucket] = {}
+        self._conn: Optional[sqlite3.Connection] = None
+        self._task: Optional[asyncio.Task] = None
+
+    # ---------- 采集 ----------
+
+    def record(
+        self,
+        kind: str,
+        name: str,
+        latency_ms: float,
+        success: bool = True,
+        tokens: int = 0,
+        size: int = 0,
+        labels: Optional[Dict[str, str]] = None
+    ):
+        """
+        记录一次事件
+
+        Args:
+            kind: 事件类型（agent/upload/parse/embedding/tool）
+            name: 事件名称（智能体名、文件类型、工具名等）
+            latency_ms: 耗时（毫秒）
+            success: 是否成功
+            tokens: 消耗的 token 数
+            size: 处理的字节数
+            labels: 仅用于 Prometheus 指标的附加标签（如智能体的 model）
+        """
+        now = time.time()
+        key = (kind, name)
+        with self._lock:
+            minute = _minute_of(now)
+            if not self._minutes or self._minutes[-1][0] != minute:
+                self._minutes.append((minute, {}))
+            self._minutes[-1][1].setdefault(key, _Bucket()).add(latency_ms, success, tokens, size)
+            pending_key = (_hour_of(now), kind, name)
+            self._pending.setdefault(pending_key, _Bucket()).add(latency_ms, success, tokens, size)
+        observe_event(kind, name, latency_ms / 1000, success, tokens, size, labels)
+
+    @contextmanager
+    def track(
+        self,
+        kind: str,
+        name: str,
+        size: int = 0,
+        labels: Optional[Dict[str, str]] = None
+    ) -> Iterator[MetricSpan]:
+        """
+        计时上下文，退出时记录事件；抛出异常视为失败并继续向上抛出
+
+        用法:
+            with metrics_collector.track("parse", "pdf", size=n) as span:
+                ...
+                span.tokens += used
+        """
+        span = MetricSpan(kind, name, size, labels=labels, parent=_current_span.get())
+        token = _current_span.set(span)
+        start = time.perf_counter()
+        try:
+            yield span
+        except BaseException:
+            span.success = False
+            raise
+        finally:
+            _current_span.reset(token)
+            self.record(
+                kind, name, (time.perf_counter() - start) * 1000,
+                success=span.success, tokens=span.tokens, size=span.bytes, labels=span.labels
+            )
+
+    def add_tokens(self, tokens: int, kind: str = "agent"):
+        """把 token 用量计入当前正在计时的操作（不在计时上下文中时忽略）"""
+        span = current_span(kind)
+        if span is not None:
+            span.tokens += tokens
+
+    # ---------- 持久化 ----------
+
+    def _connection(self) -> sqlite3.Connection:
+        if self._conn is None:
+            conn = sqlite3.connect(str(self.db_path), check_same_thread=False)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS metrics_hourly (
+                    hour INTEGER NOT NULL,
+                    kind TEXT NOT NULL,
+                    name TEXT NOT NULL,
+                    count INTEGER DEFAULT 0,
+                    errors INTEGER DEFAULT 0,
+                    tokens INTEGER DEFAULT 0,
+                    bytes INTEGER DEFAULT 0,
+                    latency_sum_ms REAL DEFAULT 0,
+                    histogram TEXT,
+                    PRIMARY KEY (hour, kind, name)
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_metrics_kind_hour ON metrics_hourly(kind, hour)")
+            conn.commit()
+            self._conn = conn
+        return self._conn
+
+    def flush(self) -> int:
+        """
+        把待写入的小时级增量合并进 SQLite
+
+        Returns:
+            写入的汇总行数
+        """
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        if not pending:
+            return 0
+
+        with self._db_lock:
+            conn = self._connection()
+            try:
+                for (hour, kind, name), delta in pending.items():
+                    row = conn.execute(
+                        "SELECT * FROM metrics_hourly WHERE hour = ? AND kind = ? AND name = ?",
+                        (hour, kind, name)
+                    ).fetchone()
+                    bucket = _Bucket.from_row(row) if row else _Bucket()
+                    bucket.merge(delta)
+                    conn.execute("""
+                        INSERT OR REPLACE INTO metrics_hourly (
+                            hour, kind, name, count, errors, tokens, bytes, latency_sum_ms, histogram
+                        ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+                    """, (
+                        hour, kind, name, bucket.count, bucket.errors, bucket.tokens,
+                        bucket.bytes, bucket.latency_sum, json.dumps(bucket.histogram)
+                    ))
+                conn.execute(
+                    "DELETE FROM metrics_hourly WHERE hour < ?",
+                    (_hour_of(time.time()) - RETENTION_DAYS * 86400,)
+                )
+                conn.commit()
+            except Exception as e:
+                conn.rollback()
+                # 写入失败时把增量放回，等待下次重试
+                with self._lock:
+                    for key, delta in pending.items():
+                        self._pending.setdefault(key, _Bucket()).merge(delta)
+                logger.warning("[Analytics] 指标汇总写入失败: %s", e)
+                return 0
+        return len(pending)
+
+    async def _flush_loop(self):
+        while True:
+            await asyncio.sleep(FLUSH_INTERVAL)
+            await asyncio.to_thread(self.flush)
+
+    async def start(self):
+        """启动定期写入任务（应用启动时调用）"""
+        if self._task is None:
+            self._task = asyncio.create_task(self._flush_loop())
+
+    async def stop(self):
+        """停止定期写入并写入剩余增量（应用关闭时调用）"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await asyncio.to_thread(self.flush)
+
+    # ---------- 查询 ----------
+
+    def _load_hourly(self, since_hour: int) -> List[sqlite3.Row]:
+        with self._db_lock:
+            return self._connection().execute(
+                "SELECT * FROM metrics_hourly WHERE hour >= ?", (since_hour,)
+            ).fetchall()
+
+    def _throughput(self) -> List[Dict[str, Any]]:
+        """最近一小时每分钟的事件数（无事件的分钟补 0）"""
+        current = _minute_of(time.time())
+        with self._lock:
+            slots = {
+                minute: {kind: sum(b.count for (k, _), b in buckets.items() if k == kind) for kind in EVENT_KINDS}
+                for minute, buckets in self._minutes
+            }
+        series = []
+        for minute in range(current - (MINUTE_SLOTS - 1) * 60, current + 60, 60):
+            counts = slots.get(minute, {kind: 0 for kind in EVENT_KINDS})
+            series.append({
+                "minute": datetime.fromtimestamp(minute).strftime("%H:%M"),
+                **counts
+            })
+        return series
+
+    def get_analytics(self, days: int = 7) -> Dict[str, Any]:
+        """
+        汇总分析数据
+
+        Args:
+            days: 趋势与分布统计的天数
+
+        Returns:
+            KPI、每日趋势、文档类型分布、智能体活跃度、各类事件耗时分位数及每分钟吞吐
+        """
+        self.flush()
+        now = time.time()
+        day_start = int(datetime.now().replace(hour=0, minute=0, second=0, microsecond=0).timestamp())
+        since = day_start - (days - 1) * 86400
+        rows = self._load_hourly(min(since, _hour_of(now) - 23 * 3600))
+
+        last_24h = _hour_of(now) - 23 * 3600
+        by_kind_24h: Dict[str, _Bucket] = {}
+        total_24h = _Bucket()
+        daily_calls = [0] * days
+        file_types: Dict[str, int] = {}
+        agents: Dict[str, _Bucket] = {}
+
+        for row in rows:
+            bucket = _Bucket.from_row(row)
+            kind, name, hour = row["kind"], row["name"], row["hour"]
+            if hour >= last_24h:
+                by_kind_24h.setdefault(kind, _Bucket()).merge(bucket)
+                total_24h.merge(bucket)
+            if hour < since:
+                continue
+            if kind == "agent":
+                day_index = int((hour - since) // 86400)
+                if 0 <= day_index < days:
+                    daily_calls[day_index] += bucket.count
+                agents.setdefault(name, _Bucket()).merge(bucket)
+            elif kind == "parse":
+                label = FILE_TYPE_LABELS.get(name, name.upper())
+                file_types[label] = file_types.get(label, 0) + bucket.count
+
+        agent_24h = by_kind_24h.get("agent", _Bucket())
+        top_agents = sorted(agents.items(), key=lambda item: item[1].count, reverse=True)[:5]
+
+        return {
+            "kpi": {
+                "docs": by_kind_24h.get("parse", _Bucket()).count,
+                "calls": agent_24h.count,
+                "time": round(agent_24h.latency_sum / agent_24h.count / 1000, 2) if agent_24h.count else 0,
+                "health": total_24h.summary()["success_rate"]
+            },
+            "trend": daily_calls,
+            "trend_labels": [
+                datetime.fromtimestamp(since + i * 86400).strftime("%m-%d") for i in range(days)
+            ],
+            "distribution": [
+                {"value": value, "name": name}
+                for name, value in sorted(file_types.items(), key=lambda item: item[1], reverse=True)
+            ],
+            "activity": [bucket.count for _, bucket in top_agents],
+            "activity_labels": [name for name, _ in top_agents],
+            "latency": {kind: bucket.summary() for kind, bucket in by_kind_24h.items()},
+            "agents": {name: bucket.summary() for name, bucket in agents.items()},
+            "throughput": self._throughput()
+        }
+
+
+# 全局实例
+metrics_collector = MetricsCollector()
+
+
+__all__ = [
+    "MetricsCollector",
+    "MetricSpan",
+    "metrics_collector",
+    "current_span"
+]
@@ -0,0 +1,118 @@
+"""
+首页问答对话上下文构建模块
+最近几轮对话原文 + 早期对话的滚动摘要，按 token 预算打包，长会话的 prompt 大小保持恒定
+"""
+
+import asyncio
+import logging
+from typing import Awaitable, Callable, Dict, List, Optional
+
+from services.qa_database import (
+    get_recent_session_turns, get_session_turns_between,
+    get_session_summary, save_session_summary
+)
+from tools.retrieval import estimate_tokens
+
+logger = logging.getLogger(__name__)
+
+# 以原文形式保留的最近轮数
+RECENT_TURNS = 6
+
+# 累计多少轮未摘要的早期对话后触发一次摘要更新
+SUMMARY_BATCH = 4
+
+# 单轮回答在上下文中的最大 token 数（过长的回答截断）
+MAX_ANSWER_TOKENS = 400
+
+# 摘要函数：(已有摘要, 待压缩的问答轮次) -> 新摘要
+Summarizer = Callable[[Optional[str], List[Dict]], Awaitable[str]]
+
+# 正在更新摘要的会话，避免同一会话并发重复摘要
+_summarizing = set()
+
+
+def _truncate(text: str, max_tokens: int) -> str:
+    tokens = estimate_tokens(text)
+    if tokens <= max_tokens:
+        return text
+    return text[:int(len(text) * max_tokens / tokens)] + "…"
+
+
+def build_conversation_context(session_id: str, token_budget: int = 1500) -> str:
+    """
+    构建对话上下文
+
+    包含滚动摘要，以及摘要之后的全部对话原文（从最近一轮向前装入，超出预算即停止）
+
+    Args:
+        session_id: 会话ID
+        token_budget: 上下文 token 预算
+
+    Returns:
+        对话上下文文本（无历史时为空字符串）
+    """
+    summary, upto_id = get_session_summary(session_id)
+    turns = get_recent_session_turns(session_id, RECENT_TURNS)
+    if turns:
+        # 已滑出最近窗口但还没攒够 SUMMARY_BATCH 轮、尚未并入摘要的对话，同样按预算装入，避免记忆断层
+        turns = get_session_turns_between(session_id, upto_id, turns[0]["id"]) + turns
+
+    header = f"（早期对话摘要）{summary}" if summary else ""
+    used = estimate_tokens(header) if header else 0
+
+    # 从最近一轮开始向前装入，超出预算即停止
+    parts: List[str] = []
+    for turn in reversed(turns):
+        text = f"用户: {turn['question']}\n助手: {_truncate(turn['answer'], MAX_ANSWER_TOKENS)}"
+        cost = estimate_tokens(text)
+        if parts and used + cost > token_budget:
+            break
+        parts.insert(0, text)
+        used += cost
+
+    if header:
+        parts.insert(0, header)
+    return "\n\n".join(parts)
+
+
+async def update_session_summary(session_id: str, summarize: Summarizer) -> bool:
+    """
+    将最近轮次之前、尚未摘要的对话折叠进会话的滚动摘要
+
+    Args:
+        session_id: 会话ID
+        summarize: 摘要函数
+
+    Returns:
+        是否更新了摘要
+    """
+    if session_id in _summarizing:
+        return False
+
+    _summarizing.add(session_id)
+    try:
+        summary, upto_id = get_session_summary(session_id)
+        recent = get_recent_session_turns(session_id, RECENT_TURNS)
+        if len(recent) < RECENT_TURNS:
+            return False
+
+        pending = get_session_turns_between(session_id, upto_id, recent[0]["id"])
+        if len(pending) < SUMMARY_BATCH:
+            return False
+
+        new_summary = await summarize(summary, pending)
+        if not new_summary:
+            return False
+        await asyncio.to_thread(save_session_summary, session_id, new_summary, pending[-1]["id"])
+        return True
+    except Exception as e:
+        logger.warning("[ConversationContext] 会话 %s 摘要更新失败: %s", session_id, e)
+        return False
+    finally:
+        _summarizing.discard(session_id)
+
+
+__all__ = [
+    "build_conversation_context",
+    "update_session_summary"
+]
@@ -0,0 +1,195 @@
+"""
+共享 HTTP 客户端模块
+进程内复用连接池：异步调用使用 httpx.AsyncClient（随应用启动/关闭），
+同步调用（智能体线程中的 Gemini / Kroki 请求）使用 requests.Session
+并统计各主机的请求数与新建连接数，用于观察连接复用情况
+"""
+
+import importlib.util
+import os
+import threading
+import time
+from collections import defaultdict
+from typing import Any, Dict, Optional
+from urllib.parse import urlsplit
+
+import httpx
+import requests
+from requests.adapters import HTTPAdapter
+
+from services.metrics import observe_upstream
+
+# 连接池配置
+MAX_CONNECTIONS = int(os.getenv("HTTP_MAX_CONNECTIONS", "100"))
+MAX_KEEPALIVE_CONNECTIONS = int(os.getenv("HTTP_MAX_KEEPALIVE", "20"))
+KEEPALIVE_EXPIRY = float(os.getenv("HTTP_KEEPALIVE_EXPIRY", "60"))
+DEFAULT_TIMEOUT = float(os.getenv("HTTP_TIMEOUT", "60"))
+
+
+class HTTPClientManager:
+    """共享 HTTP 客户端管理器"""
+
+    def __init__(self):
+        self._async_client: Optional[httpx.AsyncClient] = None
+        self._session: Optional[requests.Session] = None
+        self._session_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self._stats: Dict[str, Dict[str, float]] = defaultdict(
+            lambda: {"requests": 0, "new_connections": 0, "errors": 0, "total_seconds": 0.0}
+        )
+
+    # ---------- 异步客户端 ----------
+
+    @property
+    def http2_enabled(self) -> bool:
+        """是否安装了 HTTP/2 支持（h2）"""
+        return importlib.util.find_spec("h2") is not None
+
+    async def start(self):
+        """创建异步客户端（应用启动时调用）"""
+        if self._async_client is not None:
+            return
+        self._async_client = httpx.AsyncClient(
+            http2=self.http2_enabled,
+            timeout=DEFAULT_TIMEOUT,
+            limits=httpx.Limits(
+                max_connections=MAX_CONNECTIONS,
+                max_keepalive_connections=MAX_KEEPALIVE_CONNECTIONS,
+                keepalive_expiry=KEEPALIVE_EXPIRY
+            )
+        )
+
+    async def stop(self):
+        """关闭连接池（应用关闭时调用）"""
+        if self._async_client is not None:
+            await self._async_client.aclose()
+            self._async_client = None
+        if self._session is not None:
+            self._session.close()
+            self._session = None
+
+    async def request(self, method: str, url: str, **kwargs) -> httpx.Response:
+        """
+        通过共享连接池发送异步请求
+
+        未启动时（例如脚本中直接调用）会自动创建客户端
+        """
+        if self._async_client is None:
+            await self.start()
+
+        host = urlsplit(url).netloc
+        new_connection = False
+
+        async def trace(event_name: str, info: Dict[str, Any]):
+            nonlocal new_connection
+            if event_name == "connection.connect_tcp.started":
+                new_connection = True
+
+        extensions = {**kwargs.pop("extensions", {}), "trace": trace}
+        start = time.perf_counter()
+        try:
+            response = await self._async_client.request(method, url, extensions=extensions, **kwargs)
+        except Exception:
+            self._record(host, time.perf_counter() - start, new_connection, error=True)
+            raise
+        self._record(host, time.perf_counter() - start, new_connection)
+        return response
+
+    async def post(self, url: str, **kwargs) -> httpx.Response:
+        return await self.request("POST", url, **kwargs)
+
+    async def get(self, url: str, **kwargs) -> httpx.Response:
+        return await self.request("GET", url, **kwargs)
+
+    # ---------- 同步会话 ----------
+
+    @property
+    def session(self) -> requests.Session:
+        """同步请求共享的 requests.Session（线程安全地惰性创建）"""
+        if self._session is None:
+            with self._session_lock:
+                if self._session is None:
+                    session = requests.Session()
+                    adapter = HTTPAdapter(
+                        pool_connections=MAX_KEEPALIVE_CONNECTIONS,
+                        pool_maxsize=MAX_KEEPALIVE_CONNECTIONS
+                    )
+                    session.mount("https://", adapter)
+                    session.mount("http://", adapter)
+                    session.hooks["response"].append(self._on_sync_response)
+                    self._session = session
+        return self._session
+
+    def _on_sync_response(self, response: requests.Response, *args, **kwargs):
+        host = urlsplit(response.url).netloc
+        self._record(host, response.elapsed.total_seconds(), new_connection=None)
+
+    # ---------- 统计 ----------
+
+    def _record(self, host: str, seconds: float, new_connection: Optional[bool], error: bool = False):
+        observe_upstream(host, seconds, new_connection=bool(new_connection), error=error)
+        with self._stats_lock:
+            stats = self._stats[host]
+            stats["requests"] += 1
+            stats["total_seconds"] += seconds
+            if new_connection:
+                stats["new_connections"] += 1
+            if error:
+                stats["errors"] += 1
+
+    def _sync_pool_connections(self) -> Dict[str, int]:
+        """读取 requests 连接池中各主机已建立的连接数"""
+        counts: Dict[str, int] = {}
+        if self._session is None:
+            return counts
+        for adapter in set(self._session.adapters.values()):
+            pools = getattr(adapter.poolmanager, "pools", None)
+            if pools is None:
+                continue
+            for key in list(pools.keys()):
+                pool = pools.get(key)
+                if pool is None:
+                    continue
+                host = f"{pool.host}:{pool.port}" if pool.port not in (80, 443, None) else pool.host
+                counts[host] = counts.get(host, 0) + getattr(pool, "num_connections", 0)
+        return counts
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        连接复用统计
+
+        Returns:
+            每个主机的请求数、新建连接数、复用率与平均耗时
+        """
+        sync_connections = self._sync_pool_connections()
+        hosts = {}
+        with self._stats_lock:
+            for host, stats in self._stats.items():
+                new_connections = stats["new_connections"] + sync_connections.get(host, 0)
+                requests_count = stats["requests"]
+                hosts[host] = {
+                    "requests": int(requests_count),
+                    "new_connections": int(new_connections),
+                    "reuse_ratio": round(1 - new_connections / requests_count, 4) if requests_count else 0.0,
+                    "errors": int(stats["errors"]),
+                    "avg_latency_ms": round(stats["total_seconds"] / requests_count * 1000, 1) if requests_count else 0.0
+                }
+        return {
+            "http2": self.http2_enabled,
+            "async_client_active": self._async_client is not None,
+            "limits": {
+                "max_connections": MAX_CONNECTIONS,
+                "max_keepalive_connections": MAX_KEEPALIVE_CONNECTIONS,
+                "keepalive_expiry": KEEPALIVE_EXPIRY
+            },
+            "hosts": hosts
+        }
+
+
+# 全局实例
+http_clients = HTTPClientManager()
+
+
+def http_session() -> requests.Session:
+    """获取共享的同步 HTTP 会话"""
+    return http_clients.session
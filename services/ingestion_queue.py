@@ -0,0 +1,330 @@
+"""
+知识库后台入库队列模块
+上传请求只负责落盘和登记任务，解析、向量化和写入由后台 worker 完成
+任务状态持久化在 SQLite 中，进度通过订阅（SSE）实时推送
+"""
+
+import logging
+import asyncio
+import sqlite3
+import json
+import os
+import threading
+import uuid
+from datetime import datetime
+from pathlib import Path
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional, Set
+
+from services.metrics import register_queue
+
+logger = logging.getLogger(__name__)
+
+# 数据库文件路径
+DB_PATH = Path(__file__).parent.parent / "ingestion_jobs.db"
+
+# 任务状态
+JOB_STATUSES = ("queued", "running", "done", "failed")
+
+# 终止状态：订阅者收到后结束
+TERMINAL_STATUSES = ("done", "failed")
+
+
+class IngestionQueue:
+    """知识库入库任务队列"""
+
+    def __init__(self, db_path: Path = DB_PATH, workers: int = 2):
+        """
+        Args:
+            db_path: 任务表所在的 SQLite 文件
+            workers: 并发 worker 数量（决定入库吞吐）
+        """
+        self.db_path = db_path
+        self.workers = workers
+        self._handler: Optional[Callable[..., Dict[str, Any]]] = None
+        self._queue: Optional[asyncio.Queue] = None
+        self._tasks: List[asyncio.Task] = []
+        self._subscribers: Dict[str, List[asyncio.Queue]] = {}
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(db_path), check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._init_database()
+
+    def _init_database(self):
+        """初始化任务表"""
+        with self._lock:
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS ingestion_jobs (
+                    job_id TEXT PRIMARY KEY,
+                    filename TEXT NOT NULL,
+                    file_path TEXT NOT NULL,
+                    status TEXT NOT NULL DEFAULT 'queued',
+                    pages_done INTEGER DEFAULT 0,
+                    chunks_done INTEGER DEFAULT 0,
+                    doc_id TEXT,
+                    error TEXT,
+                    metadata TEXT,
+                    created_at TIMESTAMP NOT NULL,
+                    updated_at TIMESTAMP NOT NULL
+                )
+            """)
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_jobs_status ON ingestion_jobs(status)"
+            )
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_jobs_created ON ingestion_jobs(created_at)"
+            )
+            self._conn.commit()
+
+    # ---------- 生命周期 ----------
+
+    async def start(self, handler: Callable[..., Dict[str, Any]]):
+        """
+        启动 worker，并重新排队上次未完成的任务
+
+        Args:
+            handler: 同步入库函数，签名同 VectorStoreManager.add_document
+        """
+        if self._tasks:
+            return
+        self._handler = handler
+        self._loop = asyncio.get_running_loop()
+        self._queue = asyncio.Queue()
+
+        with self._lock:
+            self._conn.execute("""
+                UPDATE ingestion_jobs SET status = 'queued', updated_at = ?
+                WHERE status = 'running'
+            """, (datetime.now().isoformat(),))
+            self._conn.commit()
+            pending = self._conn.execute("""
+                SELECT job_id FROM ingestion_jobs
+                WHERE status = 'queued'
+                ORDER BY created_at ASC
+            """).fetchall()
+
+        for row in pending:
+            self._queue.put_nowait(row["job_id"])
+
+        self._tasks = [
+            asyncio.create_task(self._worker(i)) for i in range(self.workers)
+        ]
+        logger.info("✅ 知识库入库队列已启动: %s 个 worker，待处理 %s 个任务", self.workers, len(pending))
+
+    async def stop(self):
+        """停止所有 worker（未完成的任务会在下次启动时恢复）"""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    @property
+    def depth(self) -> int:
+        """当前排队中的任务数"""
+        return self._queue.qsize() if self._queue else 0
+
+    # ---------- 任务管理 ----------
+
+    async def submit(self, file_path: str, filename: str, metadata: Optional[Dict] = None) -> Dict[str, Any]:
+        """
+        提交入库任务
+
+        Args:
+            file_path: 已落盘的文件路径
+            filename: 原始文件名（作为知识库来源名）
+            metadata: 额外的元数据
+
+        Returns:
+            任务记录
+        """
+        if self._queue is None:
+            raise RuntimeError("入库队列尚未启动")
+
+        job_id = uuid.uuid4().hex[:12]
+        now = datetime.now().isoformat()
+        with self._lock:
+            self._conn.execute("""
+                INSERT INTO ingestion_jobs (
+                    job_id, filename, file_path, status, metadata, created_at, updated_at
+                )
+                VALUES (?, ?, ?, 'queued', ?, ?, ?)
+            """, (
+                job_id, filename, file_path,
+                json.dumps(metadata, ensure_ascii=False) if metadata else None,
+                now, now
+            ))
+            self._conn.commit()
+
+        await self._queue.put(job_id)
+        return self.get_job(job_id)
+
+    def get_job(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """获取任务状态"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT * FROM ingestion_jobs WHERE job_id = ?", (job_id,)
+            ).fetchone()
+        return self._row_to_dict(row) if row else None
+
+    def active_file_paths(self) -> Set[str]:
+        """排队中或执行中任务的文件路径（这些文件不能被清理）"""
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT file_path FROM ingestion_jobs WHERE status NOT IN ({', '.join('?' * len(TERMINAL_STATUSES))})",
+                TERMINAL_STATUSES
+            ).fetchall()
+        return {os.path.abspath(row["file_path"]) for row in rows}
+
+    def list_jobs(self, limit: int = 20, status: Optional[str] = None) -> List[Dict[str, Any]]:
+        """列出最近的任务"""
+        with self._lock:
+            if status:
+                rows = self._conn.execute("""
+                    SELECT * FROM ingestion_jobs WHERE status = ?
+                    ORDER BY created_at DESC LIMIT ?
+                """, (status, limit)).fetchall()
+            else:
+                rows = self._conn.execute("""
+                    SELECT * FROM ingestion_jobs
+                    ORDER BY created_at DESC LIMIT ?
+                """, (limit,)).fetchall()
+        return [self._row_to_dict(row) for row in rows]
+
+    async def subscribe(self, job_id: str) -> AsyncIterator[Dict[str, Any]]:
+        """
+        订阅任务进度事件，任务结束后自动停止
+
+        Yields:
+            进度事件（首个事件为当前状态快照）
+        """
+        job = self.get_job(job_id)
+        if not job:
+            yield {"type": "error", "job_id": job_id, "error": "任务不存在"}
+            return
+
+        if job["status"] in TERMINAL_STATUSES:
+            yield {"type": "status", **job}
+            return
+
+        # 先登记再推送快照，避免两者之间产生的事件丢失
+        queue: asyncio.Queue = asyncio.Queue()
+        self._subscribers.setdefault(job_id, []).append(queue)
+        try:
+            yield {"type": "status", **job}
+            while True:
+                event = await queue.get()
+                yield event
+                if event.get("status") in TERMINAL_STATUSES:
+                    return
+        finally:
+            subscribers = self._subscribers.get(job_id, [])
+            if queue in subscribers:
+                subscribers.remove(queue)
+            if not subscribers:
+                self._subscribers.pop(job_id, None)
+
+    # ---------- 内部实现 ----------
+
+    def _publish(self, job_id: str, event: Dict[str, Any]):
+        """向所有订阅者推送事件（需在事件循环线程中调用）"""
+        for queue in self._subscribers.get(job_id, []):
+            queue.put_nowait(event)
+
+    def _update(self, job_id: str, **fields):
+        """更新任务字段"""
+        fields["updated_at"] = datetime.now().isoformat()
+        assignments = ", ".join(f"{key} = ?" for key in fields)
+        with self._lock:
+            self._conn.execute(
+                f"UPDATE ingestion_jobs SET {assignments} WHERE job_id = ?",
+                (*fields.values(), job_id)
+            )
+            self._conn.commit()
+
+    async def _worker(self, worker_id: int):
+        """worker 主循环"""
+        while True:
+            job_id = await self._queue.get()
+            try:
+                await self._run_job(job_id)
+            except Exception as e:
+                logger.error("[IngestionQueue] worker %s 处理任务 %s 异常: %s", worker_id, job_id, e)
+            finally:
+                self._queue.task_done()
+
+    async def _run_job(self, job_id: str):
+        """执行单个入库任务"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT * FROM ingestion_jobs WHERE job_id = ?", (job_id,)
+            ).fetchone()
+        if not row or row["status"] in TERMINAL_STATUSES:
+            return
+        job = dict(row)
+        metadata = json.loads(job["metadata"]) if job["metadata"] else None
+
+        self._update(job_id, status="running")
+        self._publish(job_id, {"type": "status", "job_id": job_id, "status": "running"})
+
+        def on_progress(progress: Dict[str, int]):
+            # 在入库线程中调用：持久化进度，再切回事件循环推送
+            self._update(job_id, pages_done=progress["pages"], chunks_done=progress["chunks"])
+            self._loop.call_soon_threadsafe(
+                self._publish, job_id,
+                {"type": "progress", "job_id": job_id, "status": "running", **progress}
+            )
+
+        try:
+            result = await asyncio.to_thread(
+                self._handler,
+                job["file_path"],
+                metadata=metadata,
+                source=job["filename"],
+                progress_callback=on_progress
+            )
+        except Exception as e:
+            result = {"success": False, "error": str(e)}
+
+        # 任务进入终止状态后删除上传的文件（worker 被取消时保留，下次启动重新入库）
+        try:
+            if result.get("success"):
+                self._update(
+                    job_id, status="done", doc_id=result["doc_id"],
+                    chunks_done=result["chunks_count"]
+                )
+                self._publish(job_id, {
+                    "type": "done", "job_id": job_id, "status": "done",
+                    "doc_id": result["doc_id"], "chunks_count": result["chunks_count"],
+                    "duplicate": result.get("duplicate", False)
+                })
+            else:
+                self._update(job_id, status="failed", error=result.get("error"))
+                self._publish(job_id, {
+                    "type": "error", "job_id": job_id, "status": "failed",
+                    "error": result.get("error")
+                })
+        finally:
+            self._remove_file(job["file_path"])
+
+    @staticmethod
+    def _remove_file(file_path: str):
+        try:
+            os.remove(file_path)
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            logger.warning("[IngestionQueue] 删除上传文件失败 %s: %s", file_path, e)
+
+    @staticmethod
+    def _row_to_dict(row: sqlite3.Row) -> Dict[str, Any]:
+        """转换为 API 返回格式（不暴露服务器文件路径）"""
+        record = dict(row)
+        record["metadata"] = json.loads(record["metadata"]) if record.get("metadata") else {}
+        record.pop("file_path", None)
+        return record
+
+
+# 全局实例
+ingestion_queue = IngestionQueue(workers=int(os.getenv("KNOWLEDGE_INGEST_WORKERS", "2")))
+register_queue("knowledge_ingestion", lambda: ingestion_queue.depth)
@@ -1,13 +1,20 @@
+import logging
 import asyncio
 import os
+import time
 import json
 from typing import List, Dict, Any, Optional
-from urllib.parse import urlencode
+from urllib.parse import urlencode, urlsplit
 from mcp import ClientSession, StdioServerParameters
 from mcp.client.stdio import stdio_client
 from mcp.client.streamable_http import streamablehttp_client
 from langchain_core.tools import Tool
 
+from services.analytics import metrics_collector
+from services.metrics import observe_upstream
+
+logger = logging.getLogger(__name__)
+
 class MCPClientManager:
     """
     管理 MCP (Model Context Protocol) 连接
@@ -22,7 +29,7 @@ class MCPClientManager:
         """
         连接到基于 Stdio 的 MCP Server
         """
-        print(f"[MCP] Connecting to stdio server: {command} {' '.join(args)}")
+        logger.info("[MCP] Connecting to stdio server: %s %s", command, ' '.join(args))
         
         server_params = StdioServerParameters(
             command=command,
@@ -50,7 +57,7 @@ class MCPClientManager:
             pass 
 
         except Exception as e:
-            print(f"[MCP] Connection failed: {e}")
+            logger.warning("[MCP] Connection failed: %s", e)
             raise e
 
     async def list_tools(self, command: str, args: List[str]) -> List[Dict]:
@@ -99,14 +106,27 @@ class MCPClientManager:
         """
         连接 Server 并调用工具 (临时连接)
         """
+        with metrics_collector.track("tool", tool_name) as span:
+            result = await self._call_tool(command, args, tool_name, tool_args)
+            if getattr(result, "isError", False):
+                span.success = False
+            return result
+
+    async def _call_tool(self, command: str, args: List[str], tool_name: str, tool_args: Dict) -> Any:
         # 优先尝试 HTTP (streamable) 方式
         http_url = self._build_http_url(command, args)
         if http_url:
-            async with streamablehttp_client(http_url) as (read, write, _):
-                async with ClientSession(read, write) as session:
-                    await session.initialize()
-                    result = await session.call_tool(tool_name, arguments=tool_args)
-                    return result
+            start = time.perf_counter()
+            error = True
+            try:
+                async with streamablehttp_client(http_url) as (read, write, _):
+                    async with ClientSession(read, write) as session:
+                        await session.initialize()
+                        result = await session.call_tool(tool_name, arguments=tool_args)
+                        error = False
+                        return result
+            finally:
+                observe_upstream(urlsplit(http_url).netloc, time.perf_counter() - start, error=error)
 
         # 回退到 stdio 方式
         server_params = StdioServerParameters(
@@ -0,0 +1,321 @@
+"""
+Prometheus 指标模块
+轻量的计数器/直方图/仪表盘实现，由 /metrics 以 Prometheus 文本格式（0.0.4）输出，
+覆盖智能体调用、上游 HTTP、文档解析、队列深度、缓存命中与速率限制等待
+"""
+
+import math
+import threading
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+# 默认耗时桶（秒）
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+LabelValues = Tuple[str, ...]
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Iterable[str], values: Iterable[str], extra: str = "") -> str:
+    parts = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class _Metric:
+    """带标签的指标基类"""
+
+    type = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> LabelValues:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} 需要标签 {self.labelnames}，实际为 {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def _samples(self) -> List[str]:
+        raise NotImplementedError
+
+    def render(self) -> str:
+        lines = [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} {self.type}"
+        ]
+        lines.extend(self._samples())
+        return "\n".join(lines)
+
+
+class Counter(_Metric):
+    """单调递增计数器"""
+
+    type = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[LabelValues, float] = {}
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            items = list(self._values.items())
+        return [
+            f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}"
+            for key, value in items
+        ]
+
+
+class Histogram(_Metric):
+    """累积直方图"""
+
+    type = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Tuple[str, ...] = (),
+        buckets: Tuple[float, ...] = DEFAULT_BUCKETS
+    ):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # 每组标签: [各桶计数..., +Inf 计数, 总和]
+        self._values: Dict[LabelValues, List[float]] = {}
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [0] * (len(self.buckets) + 1) + [0.0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[i] += 1
+            state[len(self.buckets)] += 1
+            state[-1] += value
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            items = [(key, list(state)) for key, state in self._values.items()]
+        lines = []
+        for key, state in items:
+            count = state[len(self.buckets)]
+            bounds = [_format_value(bound) for bound in self.buckets] + ["+Inf"]
+            for bound, bucket_count in zip(bounds, state[:len(self.buckets)] + [count]):
+                le = f'le="{bound}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, le)} {bucket_count}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {_format_value(state[-1])}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {count}")
+        return lines
+
+
+class Gauge(_Metric):
+    """仪表盘：抓取时通过回调读取当前值"""
+
+    type = "gauge"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Tuple[str, ...] = (),
+        callback: Optional[Callable[[], Dict[LabelValues, float]]] = None
+    ):
+        super().__init__(name, documentation, labelnames)
+        self._callbacks: List[Callable[[], Dict[LabelValues, float]]] = [callback] if callback else []
+
+    def add_callback(self, callback: Callable[[], Dict[LabelValues, float]]):
+        """注册取值回调，返回 {标签值元组: 数值}"""
+        with self._lock:
+            self._callbacks.append(callback)
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            callbacks = list(self._callbacks)
+        lines = []
+        for callback in callbacks:
+            try:
+                values = callback()
+            except Exception:
+                continue
+            for key, value in values.items():
+                lines.append(f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}")
+        return lines
+
+
+class MetricsRegistry:
+    """指标注册表"""
+
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._lock = threading.Lock()
+
+    def _register(self, metric: _Metric) -> _Metric:
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f"指标已注册: {metric.name}")
+            self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Tuple[str, ...] = ()) -> Counter:
+        return self._register(Counter(name, documentation, labelnames))
+
+    def histogram(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Tuple[str, ...] = (),
+        buckets: Tuple[float, ...] = DEFAULT_BUCKETS
+    ) -> Histogram:
+        return self._register(Histogram(name, documentation, labelnames, buckets))
+
+    def gauge(self, name: str, documentation: str, labelnames: Tuple[str, ...] = ()) -> Gauge:
+        return self._register(Gauge(name, documentation, labelnames))
+
+    def render(self) -> str:
+        """输出 Prometheus 文本格式"""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        return "\n".join(metric.render() for metric in metrics) + "\n"
+
+
+# 全局注册表
+registry = MetricsRegistry()
+
+
+# ---------- 业务事件（由 services.analytics.MetricsCollector 转发） ----------
+
+AGENT_INVOKE_SECONDS = registry.histogram(
+    "agentdesk_agent_invoke_duration_seconds", "Agent.invoke 耗时", ("agent", "model")
+)
+AGENT_TOKENS = registry.counter(
+    "agentdesk_agent_tokens_total", "智能体调用消耗的 token 数", ("agent", "model")
+)
+UPLOAD_SECONDS = registry.histogram(
+    "agentdesk_upload_duration_seconds", "上传文件落盘耗时", ("file_type",)
+)
+UPLOAD_BYTES = registry.counter(
+    "agentdesk_upload_bytes_total", "上传文件字节数", ("file_type",)
+)
+PARSE_SECONDS = registry.histogram(
+    "agentdesk_parse_duration_seconds", "文档解析耗时", ("file_type",)
+)
+EMBEDDING_SECONDS = registry.histogram(
+    "agentdesk_embedding_duration_seconds", "向量嵌入耗时", ("operation",)
+)
+TOOL_CALL_SECONDS = registry.histogram(
+    "agentdesk_tool_call_duration_seconds", "MCP 工具调用耗时", ("tool",)
+)
+EVENT_FAILURES = registry.counter(
+    "agentdesk_event_failures_total", "失败的事件数", ("kind", "name")
+)
+
+# 事件类型 -> (耗时直方图, 名称对应的标签)
+_EVENT_HISTOGRAMS = {
+    "agent": (AGENT_INVOKE_SECONDS, "agent"),
+    "upload": (UPLOAD_SECONDS, "file_type"),
+    "parse": (PARSE_SECONDS, "file_type"),
+    "embedding": (EMBEDDING_SECONDS, "operation"),
+    "tool": (TOOL_CALL_SECONDS, "tool")
+}
+
+# ---------- 上游调用 ----------
+
+UPSTREAM_HTTP_SECONDS = registry.histogram(
+    "agentdesk_upstream_http_duration_seconds", "出站 HTTP 请求耗时", ("host",)
+)
+UPSTREAM_HTTP_ERRORS = registry.counter(
+    "agentdesk_upstream_http_errors_total", "出站 HTTP 请求失败数", ("host",)
+)
+UPSTREAM_HTTP_NEW_CONNECTIONS = registry.counter(
+    "agentdesk_upstream_http_new_connections_total", "出站 HTTP 新建连接数（异步客户端）", ("host",)
+)
+LLM_REQUEST_SECONDS = registry.histogram(
+    "agentdesk_llm_request_duration_seconds", "LLM 接口调用耗时", ("provider", "model")
+)
+
+# ---------- 队列、缓存与限流 ----------
+
+QUEUE_DEPTH = registry.gauge(
+    "agentdesk_queue_depth", "后台队列中等待处理的项目数", ("queue",)
+)
+CACHE_REQUESTS = registry.counter(
+    "agentdesk_cache_requests_total", "缓存查询次数（按命中/未命中）", ("cache", "result")
+)
+RATE_LIMIT_WAITS = registry.counter(
+    "agentdesk_rate_limiter_waits_total", "触发速率限制而等待的次数", ("limiter",)
+)
+RATE_LIMIT_WAIT_SECONDS = registry.histogram(
+    "agentdesk_rate_limiter_wait_seconds", "速率限制等待时长", ("limiter",)
+)
+
+
+def observe_event(kind: str, name: str, seconds: float, success: bool, tokens: int, size: int, labels: Optional[Dict[str, str]] = None):
+    """记录业务事件（见 services.analytics.MetricsCollector.record）"""
+    histogram, label = _EVENT_HISTOGRAMS.get(kind, (None, None))
+    if histogram is None:
+        return
+    values = {label: name}
+    for extra in histogram.labelnames:
+        if extra != label:
+            values[extra] = (labels or {}).get(extra, "")
+    histogram.observe(seconds, **values)
+    if kind == "agent" and tokens:
+        AGENT_TOKENS.inc(tokens, **values)
+    if kind == "upload" and size:
+        UPLOAD_BYTES.inc(size, file_type=name)
+    if not success:
+        EVENT_FAILURES.inc(kind=kind, name=name)
+
+
+def observe_upstream(host: str, seconds: float, new_connection: bool = False, error: bool = False):
+    """记录一次出站 HTTP 请求"""
+    UPSTREAM_HTTP_SECONDS.observe(seconds, host=host)
+    if new_connection:
+        UPSTREAM_HTTP_NEW_CONNECTIONS.inc(host=host)
+    if error:
+        UPSTREAM_HTTP_ERRORS.inc(host=host)
+
+
+def record_cache(cache: str, hit: bool):
+    """记录一次缓存查询"""
+    CACHE_REQUESTS.inc(cache=cache, result="hit" if hit else "miss")
+
+
+def register_queue(name: str, depth: Callable[[], int]):
+    """注册队列深度回调"""
+    QUEUE_DEPTH.add_callback(lambda: {(name,): depth()})
+
+
+__all__ = [
+    "registry",
+    "CONTENT_TYPE",
+    "observe_event",
+    "observe_upstream",
+    "record_cache",
+    "register_queue",
+    "LLM_REQUEST_SECONDS",
+    "RATE_LIMIT_WAITS",
+    "RATE_LIMIT_WAIT_SECONDS"
+]
@@ -3,70 +3,247 @@
 使用 SQLite 存储问答历史记录
 """
 
+import logging
+import asyncio
+import base64
+import os
 import sqlite3
 import json
 from datetime import datetime
-from typing import List, Dict, Optional, Any
+from typing import List, Dict, Optional, Any, Tuple
 from pathlib import Path
 import threading
 
-# 数据库文件路径
-DB_PATH = Path(__file__).parent.parent / "qa_history.db"
+from services.metrics import register_queue
 
-# 线程本地存储，确保每个线程使用独立的连接
+logger = logging.getLogger(__name__)
+
+# 数据库文件路径（可通过 QA_DB_PATH 覆盖，便于基准测试/多实例部署）
+DB_PATH = Path(os.getenv("QA_DB_PATH") or Path(__file__).parent.parent / "qa_history.db")
+
+# 连接级 PRAGMA：WAL 模式下 synchronous=NORMAL 仍保证一致性，且提交时不必每次 fsync
+_CONNECTION_PRAGMAS = (
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA busy_timeout=5000",
+    "PRAGMA cache_size=-16000",
+    "PRAGMA temp_store=MEMORY",
+)
+
+# 线程本地存储：每个线程一个只读连接（WAL 下读不阻塞写）
 _local = threading.local()
 
+# 全文索引是否可用（需要 SQLite >= 3.34 的 FTS5 trigram 分词器）
+_fts_enabled = False
+
+# trigram 分词器只能匹配长度 >= 3 的词，更短的关键词回退到 LIKE
+FTS_MIN_TERM_LENGTH = 3
+
+# 唯一的写连接，所有写操作串行经过它，避免写者之间争抢数据库锁
+_write_connection: Optional[sqlite3.Connection] = None
+_write_lock = threading.Lock()
+
+
+def _open_connection() -> sqlite3.Connection:
+    conn = sqlite3.connect(str(DB_PATH), check_same_thread=False)
+    conn.row_factory = sqlite3.Row
+    for pragma in _CONNECTION_PRAGMAS:
+        conn.execute(pragma)
+    return conn
+
 
 def get_connection() -> sqlite3.Connection:
-    """获取线程安全的数据库连接"""
+    """获取当前线程的只读数据库连接"""
     if not hasattr(_local, 'connection') or _local.connection is None:
-        _local.connection = sqlite3.connect(str(DB_PATH), check_same_thread=False)
-        _local.connection.row_factory = sqlite3.Row
+        _local.connection = _open_connection()
+        _local.connection.execute("PRAGMA query_only=ON")
     return _local.connection
 
 
+def get_write_connection() -> sqlite3.Connection:
+    """获取写连接（调用方需持有 _write_lock）"""
+    global _write_connection
+    if _write_connection is None:
+        _write_connection = _open_connection()
+    return _write_connection
+
+
 def init_database():
     """初始化数据库表结构"""
-    conn = get_connection()
+    with _write_lock:
+        conn = get_write_connection()
+        conn.execute("PRAGMA journal_mode=WAL")
+        cursor = conn.cursor()
+        
+        # 创建问答历史表
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS qa_history (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                session_id TEXT NOT NULL,
+                user_id TEXT DEFAULT 'default',
+                question TEXT NOT NULL,
+                answer TEXT NOT NULL,
+                agent_name TEXT,
+                agent_role TEXT,
+                intent_type TEXT DEFAULT 'qa',
+                confidence REAL DEFAULT 0.0,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                metadata TEXT
+            )
+        """)
+        
+        # 创建会话表
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS qa_sessions (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                session_id TEXT UNIQUE NOT NULL,
+                user_id TEXT DEFAULT 'default',
+                title TEXT,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                message_count INTEGER DEFAULT 0
+            )
+        """)
+        
+        # 会话滚动摘要（早期对话压缩后存档，summary_upto_id 之前的记录已包含在摘要中）
+        session_columns = {row["name"] for row in cursor.execute("PRAGMA table_info(qa_sessions)")}
+        if "summary" not in session_columns:
+            cursor.execute("ALTER TABLE qa_sessions ADD COLUMN summary TEXT")
+        if "summary_upto_id" not in session_columns:
+            cursor.execute("ALTER TABLE qa_sessions ADD COLUMN summary_upto_id INTEGER DEFAULT 0")
+        
+        # 创建索引（复合索引同时覆盖过滤与排序，支持键集分页）
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_qa_session_created ON qa_history(session_id, created_at, id)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_qa_user_created ON qa_history(user_id, created_at, id)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_qa_created ON qa_history(created_at)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_sessions_user_updated ON qa_sessions(user_id, updated_at, id)")
+        
+        # 单列索引已被复合索引的前缀覆盖
+        cursor.execute("DROP INDEX IF EXISTS idx_qa_session")
+        cursor.execute("DROP INDEX IF EXISTS idx_qa_user")
+        
+        conn.commit()
+        _init_fts(conn)
+        _init_stats(conn)
+    logger.info("✅ 问答数据库初始化完成: %s", DB_PATH)
+
+
+def _init_fts(conn: sqlite3.Connection):
+    """创建问答全文索引（trigram 分词，适用于中文），由触发器与 qa_history 保持同步"""
+    global _fts_enabled
     cursor = conn.cursor()
+    exists = cursor.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'qa_history_fts'"
+    ).fetchone()
     
-    # 创建问答历史表
-    cursor.execute("""
-        CREATE TABLE IF NOT EXISTS qa_history (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            session_id TEXT NOT NULL,
-            user_id TEXT DEFAULT 'default',
-            question TEXT NOT NULL,
-            answer TEXT NOT NULL,
-            agent_name TEXT,
-            agent_role TEXT,
-            intent_type TEXT DEFAULT 'qa',
-            confidence REAL DEFAULT 0.0,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            metadata TEXT
-        )
+    try:
+        cursor.execute("""
+            CREATE VIRTUAL TABLE IF NOT EXISTS qa_history_fts USING fts5(
+                question, answer,
+                content='qa_history', content_rowid='id',
+                tokenize='trigram'
+            )
+        """)
+    except sqlite3.OperationalError as e:
+        logger.warning("⚠️ 当前 SQLite 不支持 FTS5 trigram，问答搜索将使用 LIKE: %s", e)
+        _fts_enabled = False
+        return
+    
+    cursor.executescript("""
+        CREATE TRIGGER IF NOT EXISTS qa_history_fts_ai AFTER INSERT ON qa_history BEGIN
+            INSERT INTO qa_history_fts(rowid, question, answer)
+            VALUES (new.id, new.question, new.answer);
+        END;
+        CREATE TRIGGER IF NOT EXISTS qa_history_fts_ad AFTER DELETE ON qa_history BEGIN
+            INSERT INTO qa_history_fts(qa_history_fts, rowid, question, answer)
+            VALUES ('delete', old.id, old.question, old.answer);
+        END;
+        CREATE TRIGGER IF NOT EXISTS qa_history_fts_au AFTER UPDATE ON qa_history BEGIN
+            INSERT INTO qa_history_fts(qa_history_fts, rowid, question, answer)
+            VALUES ('delete', old.id, old.question, old.answer);
+            INSERT INTO qa_history_fts(rowid, question, answer)
+            VALUES (new.id, new.question, new.answer);
+        END;
     """)
     
-    # 创建会话表
-    cursor.execute("""
-        CREATE TABLE IF NOT EXISTS qa_sessions (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            session_id TEXT UNIQUE NOT NULL,
-            user_id TEXT DEFAULT 'default',
-            title TEXT,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            message_count INTEGER DEFAULT 0
-        )
+    # 首次创建时为已有记录建立索引
+    if not exists:
+        cursor.execute("INSERT INTO qa_history_fts(qa_history_fts) VALUES ('rebuild')")
+    
+    conn.commit()
+    _fts_enabled = True
+
+
+def _init_stats(conn: sqlite3.Connection):
+    """
+    创建统计汇总表（按用户总数、按用户每日计数、按用户智能体计数），
+    由触发器在写入/删除记录和会话的同一事务中增量维护
+    """
+    cursor = conn.cursor()
+    exists = cursor.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'qa_stats_user'"
+    ).fetchone()
+    
+    cursor.executescript("""
+        CREATE TABLE IF NOT EXISTS qa_stats_user (
+            user_id TEXT PRIMARY KEY,
+            total_qa INTEGER DEFAULT 0,
+            total_sessions INTEGER DEFAULT 0
+        );
+        CREATE TABLE IF NOT EXISTS qa_stats_daily (
+            user_id TEXT NOT NULL,
+            day TEXT NOT NULL,
+            qa_count INTEGER DEFAULT 0,
+            PRIMARY KEY (user_id, day)
+        );
+        CREATE TABLE IF NOT EXISTS qa_stats_agent (
+            user_id TEXT NOT NULL,
+            agent_name TEXT NOT NULL,
+            qa_count INTEGER DEFAULT 0,
+            PRIMARY KEY (user_id, agent_name)
+        );
+        
+        CREATE TRIGGER IF NOT EXISTS qa_stats_history_ai AFTER INSERT ON qa_history BEGIN
+            INSERT INTO qa_stats_user (user_id, total_qa) VALUES (new.user_id, 1)
+                ON CONFLICT(user_id) DO UPDATE SET total_qa = total_qa + 1;
+            INSERT INTO qa_stats_daily (user_id, day, qa_count) VALUES (new.user_id, DATE(new.created_at), 1)
+                ON CONFLICT(user_id, day) DO UPDATE SET qa_count = qa_count + 1;
+            INSERT INTO qa_stats_agent (user_id, agent_name, qa_count)
+                SELECT new.user_id, new.agent_name, 1 WHERE new.agent_name IS NOT NULL
+                ON CONFLICT(user_id, agent_name) DO UPDATE SET qa_count = qa_count + 1;
+        END;
+        CREATE TRIGGER IF NOT EXISTS qa_stats_history_ad AFTER DELETE ON qa_history BEGIN
+            UPDATE qa_stats_user SET total_qa = total_qa - 1 WHERE user_id = old.user_id;
+            UPDATE qa_stats_daily SET qa_count = qa_count - 1
+                WHERE user_id = old.user_id AND day = DATE(old.created_at);
+            UPDATE qa_stats_agent SET qa_count = qa_count - 1
+                WHERE user_id = old.user_id AND agent_name = old.agent_name;
+        END;
+        CREATE TRIGGER IF NOT EXISTS qa_stats_sessions_ai AFTER INSERT ON qa_sessions BEGIN
+            INSERT INTO qa_stats_user (user_id, total_sessions) VALUES (new.user_id, 1)
+                ON CONFLICT(user_id) DO UPDATE SET total_sessions = total_sessions + 1;
+        END;
+        CREATE TRIGGER IF NOT EXISTS qa_stats_sessions_ad AFTER DELETE ON qa_sessions BEGIN
+            UPDATE qa_stats_user SET total_sessions = total_sessions - 1 WHERE user_id = old.user_id;
+        END;
     """)
     
-    # 创建索引
-    cursor.execute("CREATE INDEX IF NOT EXISTS idx_qa_session ON qa_history(session_id)")
-    cursor.execute("CREATE INDEX IF NOT EXISTS idx_qa_user ON qa_history(user_id)")
-    cursor.execute("CREATE INDEX IF NOT EXISTS idx_qa_created ON qa_history(created_at)")
+    # 首次创建时根据已有数据回填
+    if not exists:
+        cursor.executescript("""
+            INSERT INTO qa_stats_user (user_id, total_qa)
+                SELECT user_id, COUNT(*) FROM qa_history WHERE true GROUP BY user_id
+                ON CONFLICT(user_id) DO UPDATE SET total_qa = excluded.total_qa;
+            INSERT INTO qa_stats_user (user_id, total_sessions)
+                SELECT user_id, COUNT(*) FROM qa_sessions WHERE true GROUP BY user_id
+                ON CONFLICT(user_id) DO UPDATE SET total_sessions = excluded.total_sessions;
+            INSERT OR REPLACE INTO qa_stats_daily (user_id, day, qa_count)
+                SELECT user_id, DATE(created_at), COUNT(*) FROM qa_history GROUP BY user_id, DATE(created_at);
+            INSERT OR REPLACE INTO qa_stats_agent (user_id, agent_name, qa_count)
+                SELECT user_id, agent_name, COUNT(*) FROM qa_history
+                WHERE agent_name IS NOT NULL GROUP BY user_id, agent_name;
+        """)
     
     conn.commit()
-    print(f"✅ 问答数据库初始化完成: {DB_PATH}")
 
 
 def create_session(user_id: str = "default", title: str = None) -> str:
@@ -74,33 +251,18 @@ def create_session(user_id: str = "default", title: str = None) -> str:
     import uuid
     session_id = str(uuid.uuid4())[:8]
     
-    conn = get_connection()
-    cursor = conn.cursor()
-    
-    cursor.execute("""
-        INSERT INTO qa_sessions (session_id, user_id, title)
-        VALUES (?, ?, ?)
-    """, (session_id, user_id, title or f"会话 {datetime.now().strftime('%Y-%m-%d %H:%M')}"))
-    
-    conn.commit()
+    with _write_lock:
+        conn = get_write_connection()
+        conn.execute("""
+            INSERT INTO qa_sessions (session_id, user_id, title)
+            VALUES (?, ?, ?)
+        """, (session_id, user_id, title or f"会话 {datetime.now().strftime('%Y-%m-%d %H:%M')}"))
+        conn.commit()
     return session_id
 
 
-def save_qa_record(
-    session_id: str,
-    question: str,
-    answer: str,
-    agent_name: str = None,
-    agent_role: str = None,
-    intent_type: str = "qa",
-    confidence: float = 0.0,
-    user_id: str = "default",
-    metadata: Dict = None
-) -> int:
-    """保存问答记录"""
-    conn = get_connection()
-    cursor = conn.cursor()
-    
+def _insert_qa_record(cursor: sqlite3.Cursor, record: Dict[str, Any]) -> int:
+    """在当前事务中写入一条问答记录并更新会话（不提交）"""
     # 插入问答记录
     cursor.execute("""
         INSERT INTO qa_history (
@@ -109,9 +271,9 @@ def save_qa_record(
         )
         VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
     """, (
-        session_id, user_id, question, answer,
-        agent_name, agent_role, intent_type, confidence,
-        json.dumps(metadata, ensure_ascii=False) if metadata else None
+        record["session_id"], record["user_id"], record["question"], record["answer"],
+        record["agent_name"], record["agent_role"], record["intent_type"], record["confidence"],
+        json.dumps(record["metadata"], ensure_ascii=False) if record["metadata"] else None
     ))
     
     record_id = cursor.lastrowid
@@ -122,93 +284,392 @@ def save_qa_record(
         SET updated_at = CURRENT_TIMESTAMP,
             message_count = message_count + 1
         WHERE session_id = ?
-    """, (session_id,))
+    """, (record["session_id"],))
     
     # 如果会话不存在，创建一个
     if cursor.rowcount == 0:
+        question = record["question"]
         cursor.execute("""
             INSERT INTO qa_sessions (session_id, user_id, title, message_count)
             VALUES (?, ?, ?, 1)
-        """, (session_id, user_id, question[:50] if len(question) > 50 else question))
+        """, (record["session_id"], record["user_id"], question[:50] if len(question) > 50 else question))
     
-    conn.commit()
     return record_id
 
 
-def get_session_history(session_id: str, limit: int = 50) -> List[Dict]:
-    """获取会话历史"""
+def _write_records(records: List[Dict[str, Any]]) -> List[Any]:
+    """
+    在一个事务中批量写入问答记录
+    
+    Returns:
+        与 records 一一对应的记录ID；整批失败时逐条重试，失败项为对应的异常对象
+    """
+    with _write_lock:
+        conn = get_write_connection()
+        cursor = conn.cursor()
+        try:
+            ids = [_insert_qa_record(cursor, record) for record in records]
+            conn.commit()
+            return ids
+        except Exception:
+            conn.rollback()
+        
+        # 隔离出错的记录，不影响同批的其他记录
+        results: List[Any] = []
+        for record in records:
+            try:
+                results.append(_insert_qa_record(cursor, record))
+                conn.commit()
+            except Exception as e:
+                conn.rollback()
+                results.append(e)
+        return results
+
+
+def _build_record(
+    session_id: str,
+    question: str,
+    answer: str,
+    agent_name: str = None,
+    agent_role: str = None,
+    intent_type: str = "qa",
+    confidence: float = 0.0,
+    user_id: str = "default",
+    metadata: Dict = None
+) -> Dict[str, Any]:
+    return {
+        "session_id": session_id,
+        "question": question,
+        "answer": answer,
+        "agent_name": agent_name,
+        "agent_role": agent_role,
+        "intent_type": intent_type,
+        "confidence": confidence,
+        "user_id": user_id,
+        "metadata": metadata
+    }
+
+
+def save_qa_record(
+    session_id: str,
+    question: str,
+    answer: str,
+    agent_name: str = None,
+    agent_role: str = None,
+    intent_type: str = "qa",
+    confidence: float = 0.0,
+    user_id: str = "default",
+    metadata: Dict = None
+) -> int:
+    """保存问答记录（同步，单条提交）"""
+    record = _build_record(
+        session_id, question, answer, agent_name, agent_role,
+        intent_type, confidence, user_id, metadata
+    )
+    result = _write_records([record])[0]
+    if isinstance(result, Exception):
+        raise result
+    return result
+
+
+class QAWriteQueue:
+    """
+    问答记录异步写队列（group commit）
+    
+    单个写任务从队列中取出当前积压的所有记录，在一个事务中写入，
+    低负载时每条记录立即提交，高并发时自动合并为批量事务。
+    """
+    
+    def __init__(self, max_batch: int = 200):
+        self.max_batch = max_batch
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+    
+    def start(self):
+        """在当前事件循环中启动写任务"""
+        if self._task is not None and not self._task.done():
+            return
+        self._queue = asyncio.Queue()
+        self._task = asyncio.create_task(self._run())
+    
+    async def stop(self):
+        """写完积压记录后停止"""
+        if self._task is None:
+            return
+        await self._queue.join()
+        self._task.cancel()
+        await asyncio.gather(self._task, return_exceptions=True)
+        self._task = None
+    
+    @property
+    def depth(self) -> int:
+        """当前积压的记录数"""
+        return self._queue.qsize() if self._queue else 0
+    
+    async def submit(self, record: Dict[str, Any]) -> int:
+        """提交一条记录，等待写入完成后返回记录ID"""
+        self.start()
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((record, future))
+        return await future
+    
+    async def _run(self):
+        while True:
+            batch = [await self._queue.get()]
+            while len(batch) < self.max_batch and not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+            
+            try:
+                results = await asyncio.to_thread(_write_records, [record for record, _ in batch])
+            except Exception as e:
+                results = [e] * len(batch)
+            
+            for (_, future), result in zip(batch, results):
+                if future.done():
+                    continue
+                if isinstance(result, Exception):
+                    future.set_exception(result)
+                else:
+                    future.set_result(result)
+            
+            for _ in batch:
+                self._queue.task_done()
+
+
+# 全局写队列
+qa_write_queue = QAWriteQueue()
+register_queue("qa_write", lambda: qa_write_queue.depth)
+
+
+async def save_qa_record_async(
+    session_id: str,
+    question: str,
+    answer: str,
+    agent_name: str = None,
+    agent_role: str = None,
+    intent_type: str = "qa",
+    confidence: float = 0.0,
+    user_id: str = "default",
+    metadata: Dict = None
+) -> int:
+    """保存问答记录（异步，经写队列批量提交，不阻塞事件循环）"""
+    record = _build_record(
+        session_id, question, answer, agent_name, agent_role,
+        intent_type, confidence, user_id, metadata
+    )
+    return await qa_write_queue.submit(record)
+
+
+def encode_cursor(row: Dict, sort_key: str = "created_at") -> str:
+    """根据一页的最后一行生成分页游标（排序键 + id）"""
+    raw = json.dumps([row[sort_key], row["id"]], ensure_ascii=False)
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii")
+
+
+def decode_cursor(cursor: str) -> Tuple[str, int]:
+    """解析分页游标，格式错误时抛出 ValueError"""
+    try:
+        sort_value, row_id = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+        return str(sort_value), int(row_id)
+    except Exception:
+        raise ValueError(f"无效的分页游标: {cursor}")
+
+
+def get_session_history(session_id: str, limit: int = 50, cursor: Optional[str] = None) -> List[Dict]:
+    """
+    获取会话历史（按时间正序）
+    
+    Args:
+        session_id: 会话ID
+        limit: 每页数量
+        cursor: 上一页最后一条记录的游标，返回其之后的记录
+    """
     conn = get_connection()
-    cursor = conn.cursor()
+    db_cursor = conn.cursor()
     
-    cursor.execute("""
+    keyset, params = "", []
+    if cursor:
+        keyset = "AND (created_at, id) > (?, ?)"
+        params = list(decode_cursor(cursor))
+    
+    db_cursor.execute(f"""
         SELECT id, question, answer, agent_name, agent_role, 
                intent_type, confidence, created_at, metadata
         FROM qa_history
+        WHERE session_id = ? {keyset}
+        ORDER BY created_at ASC, id ASC
+        LIMIT ?
+    """, (session_id, *params, limit))
+    
+    rows = db_cursor.fetchall()
+    return [dict(row) for row in rows]
+
+
+def get_recent_session_turns(session_id: str, limit: int = 6) -> List[Dict]:
+    """获取会话最近的 limit 轮问答（按时间正序返回）"""
+    conn = get_connection()
+    cursor = conn.cursor()
+    
+    cursor.execute("""
+        SELECT id, question, answer, created_at
+        FROM qa_history
         WHERE session_id = ?
-        ORDER BY created_at ASC
+        ORDER BY created_at DESC, id DESC
         LIMIT ?
     """, (session_id, limit))
     
     rows = cursor.fetchall()
-    return [dict(row) for row in rows]
+    return [dict(row) for row in reversed(rows)]
 
 
-def get_recent_sessions(user_id: str = "default", limit: int = 10) -> List[Dict]:
-    """获取最近的会话列表"""
+def get_session_turns_between(session_id: str, after_id: int, before_id: int) -> List[Dict]:
+    """获取会话中 id 位于 (after_id, before_id) 之间的问答（按时间正序）"""
     conn = get_connection()
     cursor = conn.cursor()
     
     cursor.execute("""
-        SELECT session_id, title, message_count, created_at, updated_at
+        SELECT id, question, answer, created_at
+        FROM qa_history
+        WHERE session_id = ? AND id > ? AND id < ?
+        ORDER BY created_at ASC, id ASC
+    """, (session_id, after_id, before_id))
+    
+    rows = cursor.fetchall()
+    return [dict(row) for row in rows]
+
+
+def get_session_summary(session_id: str) -> Tuple[Optional[str], int]:
+    """获取会话滚动摘要及其覆盖到的最后一条记录ID"""
+    conn = get_connection()
+    row = conn.execute("""
+        SELECT summary, summary_upto_id FROM qa_sessions WHERE session_id = ?
+    """, (session_id,)).fetchone()
+    if not row:
+        return None, 0
+    return row["summary"], row["summary_upto_id"] or 0
+
+
+def save_session_summary(session_id: str, summary: str, upto_id: int):
+    """保存会话滚动摘要"""
+    with _write_lock:
+        conn = get_write_connection()
+        conn.execute("""
+            UPDATE qa_sessions SET summary = ?, summary_upto_id = ?
+            WHERE session_id = ?
+        """, (summary, upto_id, session_id))
+        conn.commit()
+
+
+def get_recent_sessions(user_id: str = "default", limit: int = 10, cursor: Optional[str] = None) -> List[Dict]:
+    """
+    获取最近的会话列表（按更新时间倒序）
+    
+    Args:
+        user_id: 用户ID
+        limit: 每页数量
+        cursor: 上一页最后一个会话的游标，返回比它更早更新的会话
+    """
+    conn = get_connection()
+    db_cursor = conn.cursor()
+    
+    keyset, params = "", []
+    if cursor:
+        keyset = "AND (updated_at, id) < (?, ?)"
+        params = list(decode_cursor(cursor))
+    
+    db_cursor.execute(f"""
+        SELECT id, session_id, title, message_count, created_at, updated_at
         FROM qa_sessions
-        WHERE user_id = ?
-        ORDER BY updated_at DESC
+        WHERE user_id = ? {keyset}
+        ORDER BY updated_at DESC, id DESC
         LIMIT ?
-    """, (user_id, limit))
+    """, (user_id, *params, limit))
     
-    rows = cursor.fetchall()
+    rows = db_cursor.fetchall()
     return [dict(row) for row in rows]
 
 
-def get_recent_qa_history(user_id: str = "default", limit: int = 20) -> List[Dict]:
-    """获取最近的问答历史（跨会话）"""
+def get_recent_qa_history(user_id: str = "default", limit: int = 20, cursor: Optional[str] = None) -> List[Dict]:
+    """
+    获取最近的问答历史（跨会话，按时间倒序）
+    
+    Args:
+        user_id: 用户ID
+        limit: 每页数量
+        cursor: 上一页最后一条记录的游标，返回比它更早的记录
+    """
     conn = get_connection()
-    cursor = conn.cursor()
+    db_cursor = conn.cursor()
     
-    cursor.execute("""
+    keyset, params = "", []
+    if cursor:
+        keyset = "AND (h.created_at, h.id) < (?, ?)"
+        params = list(decode_cursor(cursor))
+    
+    db_cursor.execute(f"""
         SELECT h.id, h.session_id, h.question, h.answer, h.agent_name, 
                h.agent_role, h.intent_type, h.created_at,
                s.title as session_title
         FROM qa_history h
         LEFT JOIN qa_sessions s ON h.session_id = s.session_id
-        WHERE h.user_id = ?
-        ORDER BY h.created_at DESC
+        WHERE h.user_id = ? {keyset}
+        ORDER BY h.created_at DESC, h.id DESC
         LIMIT ?
-    """, (user_id, limit))
+    """, (user_id, *params, limit))
     
-    rows = cursor.fetchall()
+    rows = db_cursor.fetchall()
     return [dict(row) for row in rows]
 
 
+def _build_fts_query(keyword: str) -> Optional[str]:
+    """将关键词转换为 FTS5 查询（空格分隔的词按短语 AND 组合），不适用时返回 None"""
+    terms = keyword.split()
+    if not terms or any(len(term) < FTS_MIN_TERM_LENGTH for term in terms):
+        return None
+    return " AND ".join('"' + term.replace('"', '""') + '"' for term in terms)
+
+
 def search_qa_history(
     keyword: str,
     user_id: str = "default",
     limit: int = 20
 ) -> List[Dict]:
-    """搜索问答历史"""
+    """
+    搜索问答历史
+    
+    优先使用 FTS5 全文索引按 BM25 相关度排序并返回高亮片段；
+    全文索引不可用或关键词过短（少于 3 个字符）时回退到 LIKE 扫描。
+    """
     conn = get_connection()
     cursor = conn.cursor()
     
-    cursor.execute("""
-        SELECT h.id, h.session_id, h.question, h.answer, h.agent_name,
-               h.created_at, s.title as session_title
-        FROM qa_history h
-        LEFT JOIN qa_sessions s ON h.session_id = s.session_id
-        WHERE h.user_id = ?
-          AND (h.question LIKE ? OR h.answer LIKE ?)
-        ORDER BY h.created_at DESC
-        LIMIT ?
-    """, (user_id, f"%{keyword}%", f"%{keyword}%", limit))
+    fts_query = _build_fts_query(keyword) if _fts_enabled else None
+    if fts_query:
+        cursor.execute("""
+            SELECT h.id, h.session_id, h.question, h.answer, h.agent_name,
+                   h.created_at, s.title as session_title,
+                   snippet(qa_history_fts, 0, '<mark>', '</mark>', '…', 16) as question_snippet,
+                   snippet(qa_history_fts, 1, '<mark>', '</mark>', '…', 32) as answer_snippet,
+                   bm25(qa_history_fts) as score
+            FROM qa_history_fts
+            JOIN qa_history h ON h.id = qa_history_fts.rowid
+            LEFT JOIN qa_sessions s ON h.session_id = s.session_id
+            WHERE qa_history_fts MATCH ?
+              AND h.user_id = ?
+            ORDER BY score
+            LIMIT ?
+        """, (fts_query, user_id, limit))
+    else:
+        cursor.execute("""
+            SELECT h.id, h.session_id, h.question, h.answer, h.agent_name,
+                   h.created_at, s.title as session_title
+            FROM qa_history h
+            LEFT JOIN qa_sessions s ON h.session_id = s.session_id
+            WHERE h.user_id = ?
+              AND (h.question LIKE ? OR h.answer LIKE ?)
+            ORDER BY h.created_at DESC
+            LIMIT ?
+        """, (user_id, f"%{keyword}%", f"%{keyword}%", limit))
     
     rows = cursor.fetchall()
     return [dict(row) for row in rows]
@@ -216,47 +677,44 @@ def search_qa_history(
 
 def delete_session(session_id: str) -> bool:
     """删除会话及其所有记录"""
-    conn = get_connection()
-    cursor = conn.cursor()
-    
-    cursor.execute("DELETE FROM qa_history WHERE session_id = ?", (session_id,))
-    cursor.execute("DELETE FROM qa_sessions WHERE session_id = ?", (session_id,))
-    
-    conn.commit()
-    return cursor.rowcount > 0
+    with _write_lock:
+        conn = get_write_connection()
+        cursor = conn.cursor()
+        
+        cursor.execute("DELETE FROM qa_history WHERE session_id = ?", (session_id,))
+        cursor.execute("DELETE FROM qa_sessions WHERE session_id = ?", (session_id,))
+        
+        conn.commit()
+        return cursor.rowcount > 0
 
 
 def get_statistics(user_id: str = "default") -> Dict:
-    """获取统计信息"""
+    """获取统计信息（读取触发器维护的汇总表，与历史记录规模无关）"""
     conn = get_connection()
     cursor = conn.cursor()
     
-    # 总问答数
+    # 总问答数与会话数
     cursor.execute("""
-        SELECT COUNT(*) as total FROM qa_history WHERE user_id = ?
+        SELECT total_qa, total_sessions FROM qa_stats_user WHERE user_id = ?
     """, (user_id,))
-    total = cursor.fetchone()['total']
+    row = cursor.fetchone()
+    total = row['total_qa'] if row else 0
+    sessions = row['total_sessions'] if row else 0
     
     # 今日问答数
     cursor.execute("""
-        SELECT COUNT(*) as today FROM qa_history 
-        WHERE user_id = ? AND DATE(created_at) = DATE('now')
-    """, (user_id,))
-    today = cursor.fetchone()['today']
-    
-    # 会话数
-    cursor.execute("""
-        SELECT COUNT(*) as sessions FROM qa_sessions WHERE user_id = ?
+        SELECT qa_count FROM qa_stats_daily
+        WHERE user_id = ? AND day = DATE('now')
     """, (user_id,))
-    sessions = cursor.fetchone()['sessions']
+    row = cursor.fetchone()
+    today = row['qa_count'] if row else 0
     
     # 最常使用的智能体
     cursor.execute("""
-        SELECT agent_name, COUNT(*) as count 
-        FROM qa_history 
-        WHERE user_id = ? AND agent_name IS NOT NULL
-        GROUP BY agent_name
-        ORDER BY count DESC
+        SELECT agent_name, qa_count as count
+        FROM qa_stats_agent
+        WHERE user_id = ? AND qa_count > 0
+        ORDER BY qa_count DESC
         LIMIT 5
     """, (user_id,))
     top_agents = [dict(row) for row in cursor.fetchall()]
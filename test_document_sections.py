@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+"""
+文档章节切分单元测试 - 不依赖服务运行
+测试标题识别、章节树与按标题切分的边界情况
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from tools.document_tools import parse_sections, split_into_sections
+
+
+def _body(n):
+    return "正文内容。" * n
+
+
+def test_heading_detection():
+    """编号标题被识别，以数字开头的正文不被当成标题"""
+    print("\n1. 测试标题识别...")
+    headings = ["# 概述", "第一章 总则", "一、背景", "（二）范围", "1. 目标", "1.2 背景", "2.3.1 Scope", "联系方式："]
+    body_lines = [
+        "2.5 million yuan was raised in the first round.",
+        "2.5 million yuan was raised",
+        "3.14 也不是标题，而是正文。",
+        "3.14也不是",
+        "1. 本条款自签署之日起生效，双方应共同遵守。",
+        "100 个用户参与了测试",
+    ]
+    text = "\n".join(headings + body_lines)
+    found = [node.title for node in parse_sections(text).walk()]
+    expected = ["概述", "第一章 总则", "一、背景", "（二）范围", "1. 目标", "1.2 背景", "2.3.1 Scope", "联系方式"]
+    if found != expected:
+        print(f"   ❌ 识别结果: {found}")
+        return False
+    print(f"   ✅ 识别 {len(found)} 个标题，{len(body_lines)} 行正文未误判")
+    return True
+
+
+def test_section_tree():
+    """章节树层级与偏移查找"""
+    print("\n2. 测试章节树...")
+    text = f"第一章 总则\n{_body(5)}\n1.1 目的\n{_body(5)}\n1.2 范围\n{_body(5)}\n第二章 细则\n{_body(5)}"
+    root = parse_sections(text)
+    chapters = [node.title for node in root.children]
+    if chapters != ["第一章 总则", "第二章 细则"] or len(root.children[0].children) != 2:
+        print(f"   ❌ 层级错误: {root.children}")
+        return False
+    node = root.find(text.index("1.2 范围") + 8)
+    if node.path() != ["第一章 总则", "1.2 范围"]:
+        print(f"   ❌ 偏移查找错误: {node.path()}")
+        return False
+    if root.find(len(text) - 1).path() != ["第二章 细则"]:
+        print(f"   ❌ 末尾偏移查找错误: {root.find(len(text) - 1).path()}")
+        return False
+    print("   ✅ 层级与偏移查找正确")
+    return True
+
+
+def test_split_without_preface():
+    """没有前言时第一个标题就是第一部分，不产生空的“引言”"""
+    print("\n3. 测试无前言切分...")
+    text = f"# 第一部分\n{_body(30)}\n# 第二部分\n{_body(30)}"
+    sections = split_into_sections(text, min_length=100)
+    titles = [title for title, _ in sections]
+    if titles != ["第一部分", "第二部分"]:
+        print(f"   ❌ 切分结果: {titles}")
+        return False
+    print(f"   ✅ {titles}")
+    return True
+
+
+def test_split_with_preface():
+    """标题之前的内容作为“引言”"""
+    print("\n4. 测试有前言切分...")
+    text = f"{_body(30)}\n# 第一部分\n{_body(30)}"
+    titles = [title for title, _ in split_into_sections(text, min_length=100)]
+    if titles != ["引言", "第一部分"]:
+        print(f"   ❌ 切分结果: {titles}")
+        return False
+    print(f"   ✅ {titles}")
+    return True
+
+
+def test_split_merges_short_sections():
+    """过短的部分并入后续部分，末尾过短的部分并入上一部分"""
+    print("\n5. 测试短部分合并...")
+    text = f"# 甲\n{_body(2)}\n# 乙\n{_body(30)}\n# 丙\n{_body(30)}\n# 丁\n{_body(2)}"
+    sections = split_into_sections(text, min_length=100)
+    titles = [title for title, _ in sections]
+    if titles != ["甲", "丙"]:
+        print(f"   ❌ 切分结果: {titles}")
+        return False
+    if "# 乙" not in sections[0][1] or "# 丁" not in sections[1][1]:
+        print("   ❌ 短部分内容丢失")
+        return False
+    if sum(content.count("正文内容。") for _, content in sections) != 64:
+        print("   ❌ 合并后正文不完整")
+        return False
+    print(f"   ✅ {titles}")
+    return True
+
+
+def test_split_edge_cases():
+    """空文本、纯空白、无标题文本"""
+    print("\n6. 测试边界情况...")
+    if split_into_sections("") != [] or split_into_sections(" \n\n ") != []:
+        print("   ❌ 空文本应返回空列表")
+        return False
+    text = _body(10)
+    if split_into_sections(text) != [("引言", text)]:
+        print(f"   ❌ 无标题文本切分错误: {split_into_sections(text)}")
+        return False
+    if split_into_sections("# 只有标题") != []:
+        print(f"   ❌ 只有标题时应返回空列表: {split_into_sections('# 只有标题')}")
+        return False
+    print("   ✅ 边界情况正确")
+    return True
+
+
+def main():
+    print("=" * 60)
+    print("文档章节切分单元测试")
+    print("=" * 60)
+    results = [
+        test_heading_detection(),
+        test_section_tree(),
+        test_split_without_preface(),
+        test_split_with_preface(),
+        test_split_merges_short_sections(),
+        test_split_edge_cases(),
+    ]
+    print("\n" + "=" * 60)
+    print(f"通过 {sum(results)}/{len(results)}")
+    return all(results)
+
+
+if __name__ == "__main__":
+    sys.exit(0 if main() else 1)
@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+"""
+表格查询工具单元测试 - 不依赖服务运行
+只读 SQL 沙箱：拒绝非 SELECT 语句与文件访问，正常查询返回结果
+"""
+import os
+import shutil
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+# 缓存写到临时目录，需在导入 table_tools 之前设置
+TMP_DIR = tempfile.mkdtemp(prefix="table_query_test_")
+os.environ["TABLE_CACHE_DIR"] = os.path.join(TMP_DIR, "cache")
+
+import pandas as pd
+
+from tools.table_query import TableQueryEngine, duckdb
+from tools.table_tools import open_table
+
+
+_engine = None
+
+
+def _make_engine():
+    """注册示例表，返回 (查询引擎, 不应被读取的外部文件路径)"""
+    global _engine
+    secret = os.path.join(TMP_DIR, "secret.csv")
+    if _engine is not None:
+        return _engine, secret
+    path = os.path.join(TMP_DIR, "sales.csv")
+    pd.DataFrame({
+        "城市": ["北京", "上海", "北京", "深圳"],
+        "金额": [100, 200, 300, 400],
+    }).to_csv(path, index=False)
+    pd.DataFrame({"token": ["should-not-leak"]}).to_csv(secret, index=False)
+
+    handle = open_table(path, "csv")
+    _engine = TableQueryEngine([handle.digest])
+    return _engine, secret
+
+
+def test_select_allowed():
+    """SELECT / WITH 查询正常返回"""
+    print("\n1. 测试只读查询...")
+    engine, _ = _make_engine()
+    name = next(iter(engine.tables))
+    queries = [
+        f'SELECT "城市", SUM("金额") AS total FROM "{name}" GROUP BY 1 ORDER BY total DESC',
+        f'WITH t AS (SELECT * FROM "{name}") SELECT COUNT(*) AS n FROM t;',
+    ]
+    for sql in queries:
+        result = engine.execute("sql_query", {"sql": sql})
+        if result.startswith("❌"):
+            print(f"   ❌ 查询被拒绝: {sql}\n   {result}")
+            return False
+    print("   ✅ SELECT / WITH 查询可执行")
+    return True
+
+
+def test_non_select_rejected():
+    """写操作、多语句、配置修改均被拒绝"""
+    print("\n2. 测试拒绝非 SELECT 语句...")
+    engine, _ = _make_engine()
+    name = next(iter(engine.tables))
+    statements = [
+        f'DELETE FROM "{name}"',
+        f'DROP TABLE "{name}"',
+        "CREATE TABLE t AS SELECT 1",
+        "SET enable_external_access = true",
+        "INSTALL httpfs",
+        f'SELECT 1; DROP TABLE "{name}"',
+        "COPY (SELECT 1) TO 'out.csv'",
+    ]
+    for sql in statements:
+        result = engine.execute("sql_query", {"sql": sql})
+        if not result.startswith("❌"):
+            print(f"   ❌ 未被拒绝: {sql}\n   {result}")
+            return False
+    print(f"   ✅ {len(statements)} 条语句均被拒绝")
+    return True
+
+
+def test_external_access_rejected():
+    """SELECT 中读取本地文件的表函数被禁止"""
+    print("\n3. 测试禁止访问外部文件...")
+    engine, secret = _make_engine()
+    statements = [
+        f"SELECT * FROM read_csv_auto('{secret}')",
+        f"SELECT * FROM '{secret}'",
+        f"WITH t AS (SELECT * FROM read_csv('{secret}')) SELECT * FROM t",
+    ]
+    for sql in statements:
+        result = engine.execute("sql_query", {"sql": sql})
+        if not result.startswith("❌") or "should-not-leak" in result:
+            print(f"   ❌ 读取到了外部文件: {sql}\n   {result}")
+            return False
+    print(f"   ✅ {len(statements)} 条文件访问均被拒绝")
+    return True
+
+
+def main():
+    print("=" * 60)
+    print("表格查询 SQL 沙箱单元测试")
+    print("=" * 60)
+    if duckdb is None:
+        print("⚠️  未安装 duckdb，跳过测试")
+        return True
+
+    try:
+        results = [
+            test_select_allowed(),
+            test_non_select_rejected(),
+            test_external_access_rejected(),
+        ]
+        if _engine is not None:
+            _engine.close()
+    finally:
+        shutil.rmtree(TMP_DIR, ignore_errors=True)
+
+    print("\n" + "=" * 60)
+    print(f"通过 {sum(results)}/{len(results)}")
+    return all(results)
+
+
+if __name__ == "__main__":
+    sys.exit(0 if main() else 1)
@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+"""
+表格流式统计单元测试 - 不依赖服务运行
+分块合并得到的概要应与一次性读取的结果一致
+"""
+import os
+import shutil
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import numpy as np
+import pandas as pd
+
+from tools.table_tools import SAMPLE_ROWS, TableProfile, iter_csv_chunks
+
+
+def _profile(file_path, chunk_rows):
+    profile = TableProfile("test")
+    for chunk in iter_csv_chunks(file_path, chunk_rows=chunk_rows):
+        profile.update(chunk)
+    return profile
+
+
+def _write_sample_csv(tmp_path):
+    """数值列带空值、整数列后段出现小数、文本列前段全空"""
+    rng = np.random.default_rng(0)
+    rows = 1000
+    amount = rng.normal(100, 20, rows).round(2)
+    amount[::37] = np.nan
+    qty = rng.integers(0, 50, rows).astype(object)
+    qty[900:] = [f"{v}.5" for v in qty[900:]]
+    city = [None] * 40 + [f"城市{i % 13}" for i in range(rows - 40)]
+    df = pd.DataFrame({
+        "编号": range(rows),
+        "金额": amount,
+        "数量": qty,
+        "城市": city,
+        "日期": pd.date_range("2024-01-01", periods=rows, freq="D").strftime("%Y-%m-%d"),
+    })
+    path = os.path.join(tmp_path, "sample.csv")
+    df.to_csv(path, index=False)
+    return path
+
+
+def test_merged_profile_matches_single_pass(tmp_path):
+    """小块合并与单块读取的行数、空值、统计值、唯一值与 SQL 类型一致"""
+    print("\n1. 测试分块合并与单次读取一致...")
+    path = _write_sample_csv(tmp_path)
+    merged = _profile(path, chunk_rows=64)
+    single = _profile(path, chunk_rows=100000)
+
+    if merged.rows != single.rows or list(merged.columns) != list(single.columns):
+        print(f"   ❌ 行数或列不一致: {merged.rows}/{single.rows}")
+        return False
+    for name, expected in single.columns.items():
+        actual = merged.columns[name]
+        checks = {
+            "count": (actual.count, expected.count),
+            "nulls": (actual.nulls, expected.nulls),
+            "sql_type": (actual.sql_type, expected.sql_type),
+            "kind": (actual.kind, expected.kind),
+            "summary": (actual.summary(), expected.summary()),
+        }
+        for key, (got, want) in checks.items():
+            if got != want:
+                print(f"   ❌ 列 {name} 的 {key} 不一致: {got!r} != {want!r}")
+                return False
+    print(f"   ✅ {merged.rows} 行 × {len(merged.columns)} 列一致")
+    print(f"   SQL 类型: {merged.schema()}")
+    return True
+
+
+def test_short_table_sample_rows(tmp_path):
+    """行数少于首尾样本之和时，尾部样本不重复首部的行"""
+    print("\n2. 测试短表首尾样本不重复...")
+    path = os.path.join(tmp_path, "short.csv")
+    pd.DataFrame({"a": range(SAMPLE_ROWS + 2)}).to_csv(path, index=False)
+    text = _profile(path, chunk_rows=3).to_text()
+    if "后 2 行" not in text:
+        print(f"   ❌ 尾部样本行数错误:\n{text}")
+        return False
+
+    path = os.path.join(tmp_path, "tiny.csv")
+    pd.DataFrame({"a": range(3)}).to_csv(path, index=False)
+    text = _profile(path, chunk_rows=2).to_text()
+    if "后 " in text:
+        print(f"   ❌ 不足 {SAMPLE_ROWS} 行的表不应显示尾部样本:\n{text}")
+        return False
+    print("   ✅ 尾部样本只包含首部之后的行")
+    return True
+
+
+def test_gbk_csv(tmp_path):
+    """GBK 编码的 CSV 能正确解码"""
+    print("\n3. 测试 GBK 编码 CSV...")
+    path = os.path.join(tmp_path, "gbk.csv")
+    pd.DataFrame({"城市": ["北京", "上海", "深圳"], "人口": [2189, 2487, 1768]}).to_csv(
+        path, index=False, encoding="gbk"
+    )
+    profile = _profile(path, chunk_rows=2)
+    if list(profile.columns) != ["城市", "人口"] or "北京" not in profile.to_text():
+        print(f"   ❌ 解码错误: {list(profile.columns)}")
+        return False
+    print("   ✅ 列名与内容解码正确")
+    return True
+
+
+def main():
+    print("=" * 60)
+    print("表格流式统计单元测试")
+    print("=" * 60)
+    tmp_path = tempfile.mkdtemp(prefix="table_tools_test_")
+    try:
+        results = [
+            test_merged_profile_matches_single_pass(tmp_path),
+            test_short_table_sample_rows(tmp_path),
+            test_gbk_csv(tmp_path),
+        ]
+    finally:
+        shutil.rmtree(tmp_path, ignore_errors=True)
+
+    print("\n" + "=" * 60)
+    print(f"通过 {sum(results)}/{len(results)}")
+    return all(results)
+
+
+if __name__ == "__main__":
+    sys.exit(0 if main() else 1)
@@ -0,0 +1,294 @@
+"""
+知识库文档目录 - 基于 SQLite 的文档级元数据索引
+在添加/删除文档时同步维护，使列表、分页和存在性检查无需扫描整个向量集合
+"""
+
+import os
+import socket
+import sqlite3
+import json
+import threading
+from datetime import datetime, timedelta
+from typing import List, Dict, Optional, Any, Iterable
+
+# pending 记录超过该时长未更新（入库过程中每写入一批分块更新一次）即视为遗留，可被回收
+PENDING_CLAIM_TIMEOUT = int(os.getenv("KB_PENDING_CLAIM_TIMEOUT", "1800"))
+
+# 占位记录的所有者（主机名:进程号），用于判断占用的进程是否还在运行
+_OWNER = f"{socket.gethostname()}:{os.getpid()}"
+
+
+def _owner_alive(owner: Optional[str]) -> bool:
+    """占用者是否仍在运行（其它主机上的进程无法判断，视为在运行，只按超时回收）"""
+    host, _, pid = (owner or "").rpartition(":")
+    if host != socket.gethostname() or not pid.isdigit():
+        return True
+    try:
+        os.kill(int(pid), 0)
+    except ProcessLookupError:
+        return False
+    except OSError:
+        pass
+    return True
+
+
+class DocumentCatalog:
+    """
+    文档目录（每个文档一行，而不是每个分块一行）
+
+    入库开始时写入 status='pending' 的占位记录，完成后置为 'ready'；列表、计数和存在性检查只看 ready
+    """
+
+    def __init__(self, db_path: str):
+        """
+        初始化文档目录
+
+        Args:
+            db_path: SQLite 数据库文件路径
+        """
+        self.db_path = db_path
+        os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._init_schema()
+
+    def _init_schema(self):
+        """初始化表结构"""
+        with self._lock:
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS documents (
+                    doc_id TEXT PRIMARY KEY,
+                    source TEXT NOT NULL,
+                    chunk_count INTEGER DEFAULT 0,
+                    size_bytes INTEGER DEFAULT 0,
+                    content_hash TEXT,
+                    created_at TIMESTAMP NOT NULL,
+                    updated_at TIMESTAMP NOT NULL,
+                    metadata TEXT,
+                    status TEXT NOT NULL DEFAULT 'ready',
+                    owner TEXT
+                )
+            """)
+            columns = {row["name"] for row in self._conn.execute("PRAGMA table_info(documents)")}
+            if "status" not in columns:
+                self._conn.execute("ALTER TABLE documents ADD COLUMN status TEXT NOT NULL DEFAULT 'ready'")
+            if "owner" not in columns:
+                self._conn.execute("ALTER TABLE documents ADD COLUMN owner TEXT")
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_catalog_created ON documents(created_at)"
+            )
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_catalog_hash ON documents(content_hash)"
+            )
+            self._conn.commit()
+
+    def upsert(
+        self,
+        doc_id: str,
+        source: str,
+        chunk_count: int,
+        size_bytes: int = 0,
+        content_hash: Optional[str] = None,
+        metadata: Optional[Dict] = None
+    ):
+        """
+        新增或更新文档记录
+
+        Args:
+            doc_id: 文档ID
+            source: 来源文件名
+            chunk_count: 分块数量
+            size_bytes: 原始文件大小（字节）
+            content_hash: 内容哈希
+            metadata: 额外的元数据
+        """
+        now = datetime.now().isoformat()
+        with self._lock:
+            self._conn.execute("""
+                INSERT INTO documents (
+                    doc_id, source, chunk_count, size_bytes, content_hash,
+                    created_at, updated_at, metadata
+                )
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT(doc_id) DO UPDATE SET
+                    status = 'ready',
+                    owner = NULL,
+                    source = excluded.source,
+                    chunk_count = excluded.chunk_count,
+                    size_bytes = excluded.size_bytes,
+                    content_hash = excluded.content_hash,
+                    updated_at = excluded.updated_at,
+                    metadata = excluded.metadata
+            """, (
+                doc_id, source, chunk_count, size_bytes, content_hash, now, now,
+                json.dumps(metadata, ensure_ascii=False) if metadata else None
+            ))
+            self._conn.commit()
+
+    def claim(self, doc_id: str, source: str, size_bytes: int = 0) -> bool:
+        """
+        原子地占用文档ID（写入 pending 记录），用于入库前去重
+
+        相同内容并发入库时只有一个调用方占用成功，其余调用方看到已存在的记录
+
+        Returns:
+            是否占用成功
+        """
+        now = datetime.now().isoformat()
+        with self._lock:
+            cursor = self._conn.execute("""
+                INSERT INTO documents (
+                    doc_id, source, chunk_count, size_bytes, content_hash,
+                    created_at, updated_at, metadata, status, owner
+                )
+                VALUES (?, ?, 0, ?, ?, ?, ?, NULL, 'pending', ?)
+                ON CONFLICT(doc_id) DO NOTHING
+            """, (doc_id, source, size_bytes, doc_id, now, now, _OWNER))
+            self._conn.commit()
+            return cursor.rowcount > 0
+
+    def release(self, doc_id: str):
+        """入库失败时释放占用（只删除 pending 记录）"""
+        with self._lock:
+            self._conn.execute("DELETE FROM documents WHERE doc_id = ? AND status = 'pending'", (doc_id,))
+            self._conn.commit()
+
+    def touch(self, doc_id: str):
+        """入库进行中更新 pending 记录的时间，表明占用仍然有效"""
+        with self._lock:
+            self._conn.execute(
+                "UPDATE documents SET updated_at = ? WHERE doc_id = ? AND status = 'pending'",
+                (datetime.now().isoformat(), doc_id)
+            )
+            self._conn.commit()
+
+    def clear_stale_pending(self, timeout: int = PENDING_CLAIM_TIMEOUT) -> List[str]:
+        """
+        回收遗留的 pending 记录（占用进程已退出，或超过 timeout 秒未更新），返回其文档ID
+
+        其它进程正在入库的记录不受影响
+        """
+        deadline = (datetime.now() - timedelta(seconds=timeout)).isoformat()
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT doc_id, owner, updated_at FROM documents WHERE status = 'pending'"
+            ).fetchall()
+            stale = []
+            for row in rows:
+                if row["updated_at"] >= deadline and _owner_alive(row["owner"]):
+                    continue
+                # 以 updated_at 作为条件，避免删除刚被占用方更新过的记录
+                cursor = self._conn.execute(
+                    "DELETE FROM documents WHERE doc_id = ? AND status = 'pending' AND updated_at = ?",
+                    (row["doc_id"], row["updated_at"])
+                )
+                if cursor.rowcount:
+                    stale.append(row["doc_id"])
+            self._conn.commit()
+        return stale
+
+    def delete(self, doc_id: str) -> bool:
+        """删除文档记录，返回是否存在该记录"""
+        with self._lock:
+            cursor = self._conn.execute("DELETE FROM documents WHERE doc_id = ?", (doc_id,))
+            self._conn.commit()
+            return cursor.rowcount > 0
+
+    def exists(self, doc_id: str) -> bool:
+        """检查文档是否已入库"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT 1 FROM documents WHERE doc_id = ? AND status = 'ready'", (doc_id,)
+            ).fetchone()
+        return row is not None
+
+    def get(self, doc_id: str) -> Optional[Dict[str, Any]]:
+        """获取单个文档记录"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT * FROM documents WHERE doc_id = ?", (doc_id,)
+            ).fetchone()
+        return self._row_to_dict(row) if row else None
+
+    def list(self, limit: int = 50, offset: int = 0) -> List[Dict[str, Any]]:
+        """
+        按入库时间倒序分页列出文档
+
+        Args:
+            limit: 每页数量
+            offset: 偏移量
+
+        Returns:
+            文档记录列表
+        """
+        with self._lock:
+            rows = self._conn.execute("""
+                SELECT * FROM documents
+                WHERE status = 'ready'
+                ORDER BY created_at DESC
+                LIMIT ? OFFSET ?
+            """, (limit, offset)).fetchall()
+        return [self._row_to_dict(row) for row in rows]
+
+    def clear(self):
+        """清空目录"""
+        with self._lock:
+            self._conn.execute("DELETE FROM documents")
+            self._conn.commit()
+
+    def count(self) -> int:
+        """文档总数"""
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM documents WHERE status = 'ready'").fetchone()[0]
+
+    def rebuild(self, chunk_metadatas: Iterable[Dict]) -> int:
+        """
+        根据向量集合中的分块元数据重建目录（用于首次迁移已有数据或快照恢复，已有记录保持不变）
+
+        Args:
+            chunk_metadatas: 分块元数据迭代器
+
+        Returns:
+            重建的文档数量
+        """
+        docs: Dict[str, Dict[str, Any]] = {}
+        for metadata in chunk_metadatas:
+            doc_id = (metadata or {}).get('doc_id')
+            if not doc_id:
+                continue
+            entry = docs.setdefault(doc_id, {
+                "source": metadata.get('source', 'unknown'),
+                "chunk_count": 0,
+                "upload_time": metadata.get('upload_time')
+            })
+            entry["chunk_count"] += 1
+
+        now = datetime.now().isoformat()
+        with self._lock:
+            self._conn.executemany("""
+                INSERT OR IGNORE INTO documents (
+                    doc_id, source, chunk_count, size_bytes, content_hash,
+                    created_at, updated_at, metadata
+                )
+                VALUES (?, ?, ?, 0, ?, ?, ?, NULL)
+            """, [
+                (doc_id, d["source"], d["chunk_count"], doc_id, d["upload_time"] or now, now)
+                for doc_id, d in docs.items()
+            ])
+            self._conn.commit()
+        return len(docs)
+
+    @staticmethod
+    def _row_to_dict(row: sqlite3.Row) -> Dict[str, Any]:
+        """转换为 API 返回格式（保留 total_chunks 字段以兼容旧接口）"""
+        record = dict(row)
+        record["total_chunks"] = record["chunk_count"]
+        record["metadata"] = json.loads(record["metadata"]) if record.get("metadata") else {}
+        return record
+
+
+__all__ = [
+    "DocumentCatalog"
+]
@@ -3,9 +3,10 @@
 用于各种文档操作的工具函数
 """
 
+import bisect
 import os
 import re
-from typing import Dict, List, Tuple, Optional
+from typing import Dict, Iterator, List, Tuple, Optional
 import json
 from docx import Document
 from docx.shared import Pt
@@ -133,6 +134,57 @@ def get_operation_prompt(operation: str, content: str, instruction: str = "") ->
     return prompts[operation]
 
 
+# 实体正则（模块加载时编译一次）
+_EMAIL_PATTERN = r'\b[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Z|a-z]{2,}\b'
+# 匹配常见格式的电话号码
+_PHONE_PATTERN = r'\b(?:\+?\d{1,3}[-.\s]?)?(?:\(?\d{3}\)?[-.\s]?)?\d{3}[-.\s]?\d{4}\b'
+# 匹配多种日期格式
+_DATE_PATTERNS = [
+    r'\b\d{4}[-/]\d{1,2}[-/]\d{1,2}\b',  # YYYY-MM-DD, YYYY/MM/DD
+    r'\b\d{1,2}[-/]\d{1,2}[-/]\d{2,4}\b',  # MM/DD/YY, DD/MM/YYYY
+    r'\b(?:Jan|Feb|Mar|Apr|May|Jun|Jul|Aug|Sep|Oct|Nov|Dec)[a-z]*\s+\d{1,2},?\s+\d{4}\b',  # Month DD, YYYY
+    r'\b\d{1,2}\s+(?:Jan|Feb|Mar|Apr|May|Jun|Jul|Aug|Sep|Oct|Nov|Dec)[a-z]*\s+\d{4}\b'  # DD Month YYYY
+]
+# 匹配货币格式
+_AMOUNT_PATTERN = r'[$€£¥]?\s*\d+(?:[,\.]\d{3})*(?:[,\.]\d{2})?\s*(?:USD|EUR|GBP|CNY|美元|欧元|英镑|人民币|元)?'
+# 单次扫描用的金额必须带币种符号或单位，否则任何数字都会被当成金额
+_CURRENCY_AMOUNT_PATTERN = (
+    r'[$€£¥]\s*\d+(?:[,\.]\d{3})*(?:[,\.]\d{2})?(?:\s*(?:USD|EUR|GBP|CNY|美元|欧元|英镑|人民币|元))?'
+    r'|\d+(?:[,\.]\d{3})*(?:[,\.]\d{2})?\s*(?:USD|EUR|GBP|CNY|美元|欧元|英镑|人民币|元)'
+)
+
+_EMAIL_RE = re.compile(_EMAIL_PATTERN)
+_PHONE_RE = re.compile(_PHONE_PATTERN)
+_DATE_RE = re.compile('|'.join(_DATE_PATTERNS), re.IGNORECASE)
+_AMOUNT_RE = re.compile(_AMOUNT_PATTERN)
+
+# 所有实体类型合并成一个带命名分组的正则，一次扫描全文；
+# 同一位置按 email > date > phone > amount 的顺序取第一个匹配，实体之间不重叠
+ENTITY_TYPES = ("email", "date", "phone", "amount")
+_ENTITY_RE = re.compile(
+    f"(?P<email>{_EMAIL_PATTERN})"
+    f"|(?P<date>(?i:{'|'.join(_DATE_PATTERNS)}))"
+    f"|(?P<phone>{_PHONE_PATTERN})"
+    f"|(?P<amount>{_CURRENCY_AMOUNT_PATTERN})"
+)
+
+
+def extract_entities(text: str) -> Dict[str, List[Tuple[str, int]]]:
+    """
+    单次扫描提取邮箱、日期、电话和金额
+
+    Args:
+        text: 输入文本
+
+    Returns:
+        {实体类型: [(实体文本, 起始位置), ...]}，各类型按出现顺序排列
+    """
+    entities: Dict[str, List[Tuple[str, int]]] = {kind: [] for kind in ENTITY_TYPES}
+    for match in _ENTITY_RE.finditer(text):
+        entities[match.lastgroup].append((match.group().strip(), match.start()))
+    return entities
+
+
 def extract_email_addresses(text: str) -> List[str]:
     """
     从文本中提取邮箱地址
@@ -143,8 +195,7 @@ def extract_email_addresses(text: str) -> List[str]:
     Returns:
         邮箱地址列表
     """
-    email_pattern = r'\b[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Z|a-z]{2,}\b'
-    return re.findall(email_pattern, text)
+    return _EMAIL_RE.findall(text)
 
 
 def extract_phone_numbers(text: str) -> List[str]:
@@ -157,9 +208,7 @@ def extract_phone_numbers(text: str) -> List[str]:
     Returns:
         电话号码列表
     """
-    # 匹配常见格式的电话号码
-    phone_pattern = r'\b(?:\+?\d{1,3}[-.\s]?)?(?:\(?\d{3}\)?[-.\s]?)?\d{3}[-.\s]?\d{4}\b'
-    return re.findall(phone_pattern, text)
+    return _PHONE_RE.findall(text)
 
 
 def extract_dates(text: str) -> List[str]:
@@ -172,19 +221,7 @@ def extract_dates(text: str) -> List[str]:
     Returns:
         日期列表
     """
-    # 匹配多种日期格式
-    date_patterns = [
-        r'\b\d{4}[-/]\d{1,2}[-/]\d{1,2}\b',  # YYYY-MM-DD, YYYY/MM/DD
-        r'\b\d{1,2}[-/]\d{1,2}[-/]\d{2,4}\b',  # MM/DD/YY, DD/MM/YYYY
-        r'\b(?:Jan|Feb|Mar|Apr|May|Jun|Jul|Aug|Sep|Oct|Nov|Dec)[a-z]*\s+\d{1,2},?\s+\d{4}\b',  # Month DD, YYYY
-        r'\b\d{1,2}\s+(?:Jan|Feb|Mar|Apr|May|Jun|Jul|Aug|Sep|Oct|Nov|Dec)[a-z]*\s+\d{4}\b'  # DD Month YYYY
-    ]
-
-    dates = []
-    for pattern in date_patterns:
-        dates.extend(re.findall(pattern, text, re.IGNORECASE))
-
-    return list(set(dates))  # 去重
+    return list(set(_DATE_RE.findall(text)))  # 去重
 
 
 def extract_amounts(text: str) -> List[str]:
@@ -197,15 +234,120 @@ def extract_amounts(text: str) -> List[str]:
     Returns:
         金额列表
     """
-    # 匹配货币格式
-    amount_pattern = r'[$€£¥]?\s*\d+(?:[,\.]\d{3})*(?:[,\.]\d{2})?\s*(?:USD|EUR|GBP|CNY|美元|欧元|英镑|人民币|元)?'
-    return re.findall(amount_pattern, text)
+    return _AMOUNT_RE.findall(text)
+
+
+# 标题行：Markdown / 中文章节 / 中文序号 / 数字编号 / 以冒号结尾的短行，合并为一个正则一次扫描全文；
+# 数字编号后须有空白（"1、"除外），标题不超过 30 字、不含句内标点、不以句末标点结尾，避免把 "2.5 million ..." 这类正文当成标题
+_HEADING_RE = re.compile(r"""
+    ^[ \t]*(?:
+        (?P<md>\#{1,6})[ \t]+(?P<md_title>[^\n]+?)[ \t\#]*
+      | 第[一二三四五六七八九十百零〇\d]+(?P<unit>章|篇|部分|节)[^\n]{0,50}?
+      | (?P<cn>[一二三四五六七八九十]+、|[（(][一二三四五六七八九十]+[)）])[^\n]{1,50}?
+      | (?P<num>\d{1,3}(?:\.\d{1,3})+\.?[ \t]+|\d{1,3}\.[ \t]+|\d{1,3}、[ \t]*)
+        [^\d\s.a-z。！？；，][^\n。！？；，]{0,29}?(?<![.!?;,:：\s])
+      | (?P<colon>[^\n:：]{1,30})[:：]
+    )[ \t]*\r?$
+""", re.MULTILINE | re.VERBOSE)
+
+
+class Section:
+    """
+    章节树节点
+
+    只记录在原文中的偏移，不复制文本：start 为标题行起点，body_start 为标题行之后，
+    end 为下一个同级或更高级标题的起点（包含全部子章节）
+    """
+
+    __slots__ = ("title", "level", "start", "body_start", "end", "parent", "children")
+
+    def __init__(self, title: str, level: int, start: int, body_start: int, end: int,
+                 parent: Optional["Section"] = None):
+        self.title = title
+        self.level = level
+        self.start = start
+        self.body_start = body_start
+        self.end = end
+        self.parent = parent
+        self.children: List["Section"] = []
+
+    def text(self, source: str) -> str:
+        """章节全文（含子章节，不含标题行）"""
+        return source[self.body_start:self.end]
+
+    def path(self) -> List[str]:
+        """从顶层到本节的标题路径"""
+        titles = []
+        node = self
+        while node.parent is not None:
+            titles.append(node.title)
+            node = node.parent
+        return titles[::-1]
+
+    def walk(self) -> Iterator["Section"]:
+        """按原文顺序遍历所有子孙章节（不含自身）"""
+        for child in self.children:
+            yield child
+            yield from child.walk()
+
+    def find(self, offset: int) -> "Section":
+        """返回包含该偏移的最深一级章节"""
+        node = self
+        while node.children:
+            i = bisect.bisect_right(node.children, offset, key=lambda child: child.start) - 1
+            if i < 0 or offset >= node.children[i].end:
+                break
+            node = node.children[i]
+        return node
+
+    def __repr__(self) -> str:
+        return f"Section({self.title!r}, level={self.level}, {self.start}-{self.end}, children={len(self.children)})"
+
+
+def _heading_level(match: re.Match) -> Tuple[int, str]:
+    """根据命中的分组确定标题级别和标题文本"""
+    if match.group("md"):
+        return len(match.group("md")), match.group("md_title").strip()
+    title = match.group().strip()
+    if match.group("unit"):
+        return (2 if match.group("unit") == "节" else 1), title
+    if match.group("cn"):
+        return (2 if match.group("cn").endswith("、") else 3), title
+    if match.group("num"):
+        return match.group("num").rstrip(" \t.、").count(".") + 1, title
+    return 6, title.rstrip(":：").strip()
+
+
+def parse_sections(text: str) -> Section:
+    """
+    单次扫描识别标题并构建章节树
+
+    Args:
+        text: 输入文本
+
+    Returns:
+        根节点（level 0，覆盖全文），各级标题为其子孙节点
+    """
+    root = Section("", 0, 0, 0, len(text))
+    stack = [root]
+    for match in _HEADING_RE.finditer(text):
+        level, title = _heading_level(match)
+        while stack[-1].level >= level:
+            stack.pop().end = match.start()
+        parent = stack[-1]
+        node = Section(title, level, match.start(), min(match.end() + 1, len(text)), len(text), parent)
+        parent.children.append(node)
+        stack.append(node)
+    return root
 
 
 def split_into_sections(text: str, min_length: int = 500) -> List[Tuple[str, str]]:
     """
     将长文本分割成多个部分
 
+    按原文顺序切在标题处；不足 min_length 的部分会并入后续标题的内容，
+    末尾过短的部分并入上一部分
+
     Args:
         text: 输入文本
         min_length: 每个部分的最小长度
@@ -213,56 +355,21 @@ def split_into_sections(text: str, min_length: int = 500) -> List[Tuple[str, str
     Returns:
         (部分标题, 部分内容) 的元组列表
     """
-    sections = []
-
-    # 按章节标题分割（中文和英文）
-    # 匹配常见的标题格式
-    heading_patterns = [
-        r'^.+?:\s*$',  # 中文标题格式
-        r'^#+\s+.+$',  # Markdown 标题
-        r'^\d+\.\s+.+$',  # 编号标题
-        r'^第[一二三四五六七八九十]+章\s+.+$',  # 中文章节
-        r'^第\d+章\s+.+$'
-    ]
-
-    lines = text.split('\n')
-    current_section = []
-    current_title = "引言"
-
-    for i, line in enumerate(lines):
-        line = line.strip()
-
-        # 检查是否是标题行
-        is_heading = False
-        for pattern in heading_patterns:
-            if re.match(pattern, line, re.MULTILINE):
-                is_heading = True
-                break
-
-        # 如果是标题，保存当前部分并新建
-        if is_heading and current_section:
-            section_text = '\n'.join(current_section)
-            if len(section_text) >= min_length:
-                sections.append((current_title, section_text))
-                current_section = []
-                current_title = line
-            else:
-                current_section.append(line)
-        else:
-            current_section.append(line)
-
-        # 如果已经有很多部分，剩余内容合并到最后
-        if len(sections) >= 10 and i > len(lines) * 0.7:
-            current_section.extend(lines[i + 1:])
-            break
+    bounds: List[Tuple[str, int, int]] = []
+    title, body_start = None, 0
+    for node in parse_sections(text).walk():
+        if title is None and not text[:node.start].strip():
+            # 没有前言，直接从第一个标题开始
+            title, body_start = node.title, node.body_start
+        elif node.start - body_start >= min_length:
+            bounds.append((title or "引言", body_start, node.start))
+            title, body_start = node.title, node.body_start
 
-    # 添加最后一个部分
-    if current_section:
-        section_text = '\n'.join(current_section)
-        if len(section_text) >= min_length or not sections:
-            sections.append((current_title, section_text))
+    if bounds and len(text) - body_start < min_length:
+        title, body_start, _ = bounds.pop()
+    bounds.append((title or "引言", body_start, len(text)))
 
-    return sections
+    return [(title, text[start:end].strip()) for title, start, end in bounds if text[start:end].strip()]
 
 
 def calculate_statistics(text: str) -> Dict[str, any]:
@@ -275,15 +382,17 @@ def calculate_statistics(text: str) -> Dict[str, any]:
     Returns:
         统计信息字典
     """
+    entities = extract_entities(text)
     stats = {
         "total_chars": len(text),
         "total_words": len(text.split()),
-        "total_lines": len(text.split('\n')),
-        "paragraph_count": len([p for p in text.split('\n\n') if p.strip()]),
-        "email_count": len(extract_email_addresses(text)),
-        "phone_count": len(extract_phone_numbers(text)),
-        "date_count": len(extract_dates(text)),
-        "table_count": len(re.findall(r'\|', text)) // 2,  # 估算表格数量
+        "total_lines": text.count('\n') + 1,
+        "paragraph_count": sum(1 for p in text.split('\n\n') if p.strip()),
+        "email_count": len(entities["email"]),
+        "phone_count": len(entities["phone"]),
+        "date_count": len({date for date, _ in entities["date"]}),
+        "amount_count": len(entities["amount"]),
+        "table_count": text.count('|') // 2,  # 估算表格数量
     }
 
     return stats
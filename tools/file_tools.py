@@ -3,220 +3,521 @@
 支持多种文档格式的读取和写入
 """
 
+import logging
+import multiprocessing
 import os
+import re
+import threading
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 import magic
 import PyPDF2
-from docx import Document
-from docx.document import Document as DocType
-import openpyxl
-import pandas as pd
-from typing import Optional, Tuple, List
+from lxml import etree
+from typing import Dict, Iterator, Optional, Set, Tuple, List
 import json
 
+from services.analytics import metrics_collector
+from tools.table_tools import summarize_table_file
+
+logger = logging.getLogger(__name__)
+
+
+# 文件头嗅探读取的字节数
+SNIFF_BYTES = 8192
+
+# MIME 类型 -> 文件类型
+MIME_TO_TYPE = {
+    "text/plain": "txt",
+    "text/x-python": "txt",  # Python文件也当文本处理
+    "application/pdf": "pdf",
+    "application/vnd.openxmlformats-officedocument.wordprocessingml.document": "docx",
+    "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet": "xlsx",
+    "application/vnd.ms-excel": "xlsx",
+    "text/markdown": "md",
+    "application/json": "json",
+    "text/csv": "csv",
+    "application/vnd.apache.parquet": "parquet",
+    "application/x-parquet": "parquet"
+}
+
+# 扩展名 -> 文件类型（同时作为 libmagic 无法识别时的备用检测）
+EXT_TO_TYPE = {
+    ".txt": "txt",
+    ".md": "md",
+    ".py": "txt",
+    ".pdf": "pdf",
+    ".docx": "docx",
+    ".xlsx": "xlsx",
+    ".csv": "csv",
+    ".json": "json",
+    ".parquet": "parquet"
+}
+
+
+# PDF 并行解析：worker 进程数、启用并行的最少页数、每个分片的最少页数
+PDF_PARSE_WORKERS = int(os.getenv("PDF_PARSE_WORKERS", str(min(4, os.cpu_count() or 1))))
+PDF_PARALLEL_MIN_PAGES = int(os.getenv("PDF_PARALLEL_MIN_PAGES", "40"))
+PDF_MIN_SHARD_PAGES = 10
+
+_pdf_executor: Optional[ProcessPoolExecutor] = None
+
+# Word 文档 XML 命名空间及流式解析关心的元素
+_W = "{http://schemas.openxmlformats.org/wordprocessingml/2006/main}"
+_MC_FALLBACK = "{http://schemas.openxmlformats.org/markup-compatibility/2006}Fallback"
+_W_BODY, _W_P, _W_R, _W_T, _W_TAB, _W_BR, _W_CR = (f"{_W}{name}" for name in ("body", "p", "r", "t", "tab", "br", "cr"))
+_W_TBL, _W_TR, _W_TC = (f"{_W}{name}" for name in ("tbl", "tr", "tc"))
+
+# libmagic 句柄不是线程安全的，每个线程各持有一个（加载 magic 数据库只发生一次）
+_magic_local = threading.local()
+
+
+def _get_magic() -> magic.Magic:
+    """获取当前线程复用的 libmagic 检测器"""
+    detector = getattr(_magic_local, "detector", None)
+    if detector is None:
+        detector = magic.Magic(mime=True)
+        _magic_local.detector = detector
+    return detector
+
+
+def _sniff_file_type(head: bytes, ext: str) -> Optional[str]:
+    """
+    根据扩展名 + 文件头魔数快速判断类型
+
+    扩展名与文件头一致时直接返回；无法确认时返回 None，交给 libmagic 检测
+    """
+    file_type = EXT_TO_TYPE.get(ext)
+    if file_type is None:
+        return None
+
+    if file_type == "pdf":
+        return "pdf" if head.lstrip()[:5] == b"%PDF-" else None
+
+    if file_type in ("docx", "xlsx"):
+        # OOXML 是 zip 容器，文件头为 PK\x03\x04
+        return file_type if head[:4] == b"PK\x03\x04" else None
+
+    if file_type == "parquet":
+        return "parquet" if head[:4] == b"PAR1" else None
+
+    # 文本类：不含 NUL 字节且能按 UTF-8 解码（允许末尾被截断的多字节字符）
+    if b"\x00" in head:
+        return None
+    try:
+        head.decode("utf-8")
+    except UnicodeDecodeError as e:
+        if e.start < len(head) - 3:
+            return None
+    return file_type
+
 
-def detect_file_type(file_path: str) -> str:
+def detect_file_type(file_path: str, data: Optional[bytes] = None) -> str:
     """
     检测文件类型
 
+    先用扩展名 + 文件头魔数走快速路径，只有扩展名缺失或与内容不符时才调用 libmagic
+
     Args:
         file_path: 文件路径
+        data: 已在内存中的文件内容或其开头部分（如上传缓冲区），传入后不再读盘
 
     Returns:
-        文件类型字符串: txt/pdf/docx/xlsx/md/json/csv/unknown
+        文件类型字符串: txt/pdf/docx/xlsx/md/json/csv/parquet/unknown
     """
     try:
+        ext = os.path.splitext(file_path)[1].lower()
+        if data is None:
+            with open(file_path, "rb") as f:
+                head = f.read(SNIFF_BYTES)
+        else:
+            head = data[:SNIFF_BYTES]
+
+        file_type = _sniff_file_type(head, ext)
+        if file_type is not None:
+            return file_type
+
         # 使用 python-magic 检测文件类型
-        mime = magic.Magic(mime=True)
-        file_mime = mime.from_file(file_path)
-
-        # 根据 MIME 类型映射文件类型
-        mime_to_type = {
-            "text/plain": "txt",
-            "text/x-python": "txt",  # Python文件也当文本处理
-            "application/pdf": "pdf",
-            "application/vnd.openxmlformats-officedocument.wordprocessingml.document": "docx",
-            "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet": "xlsx",
-            "application/vnd.ms-excel": "xlsx",
-            "text/markdown": "md",
-            "application/json": "json",
-            "text/csv": "csv"
-        }
-
-        file_type = mime_to_type.get(file_mime, "unknown")
+        if data is None:
+            file_mime = _get_magic().from_file(file_path)
+        else:
+            file_mime = _get_magic().from_buffer(data)
+        file_type = MIME_TO_TYPE.get(file_mime, "unknown")
 
         # 备用检测：通过文件扩展名
         if file_type == "unknown":
-            _, ext = os.path.splitext(file_path)
-            ext = ext.lower()
-            ext_to_type = {
-                ".txt": "txt",
-                ".md": "md",
-                ".py": "txt",
-                ".pdf": "pdf",
-                ".docx": "docx",
-                ".xlsx": "xlsx",
-                ".csv": "csv",
-                ".json": "json"
-            }
-            file_type = ext_to_type.get(ext, "unknown")
+            file_type = EXT_TO_TYPE.get(ext, "unknown")
 
         return file_type
 
     except Exception as e:
-        print(f"检测文件类型失败: {e}")
+        logger.warning("检测文件类型失败: %s", e)
         return "unknown"
 
 
-def read_text_file(file_path: str, encoding: str = "utf-8") -> str:
+def _join_within_budget(chunks: Iterator[str], max_chars: Optional[int] = None, sep: str = "\n") -> str:
+    """
+    用 sep 拼接文本块；设置了 max_chars 时，累计长度够用后立即停止消费迭代器
+
+    各读取函数的文本块来自生成器，停止消费即停止后续解析（PDF 页、Word 段落、Excel 行）
+    """
+    if max_chars is None:
+        return sep.join(chunks)
+
+    parts = []
+    total = 0
+    try:
+        for chunk in chunks:
+            parts.append(chunk)
+            total += len(chunk) + len(sep)
+            if total >= max_chars:
+                break
+    finally:
+        if hasattr(chunks, "close"):
+            chunks.close()
+    return sep.join(parts)[:max_chars]
+
+
+def read_text_file(file_path: str, encoding: str = "utf-8", max_chars: Optional[int] = None) -> str:
     """
     读取文本文件
 
     Args:
         file_path: 文件路径
         encoding: 文件编码
+        max_chars: 最多读取的字符数，None 表示读取全部
 
     Returns:
         文件内容
     """
     with open(file_path, "r", encoding=encoding, errors="ignore") as f:
-        return f.read()
+        return f.read(-1 if max_chars is None else max_chars)
+
+
+def _iter_pdf_pages(file_path: str, start: int, end: int) -> Iterator[Tuple[int, str, Optional[str]]]:
+    """逐页提取 [start, end) 范围内的文本，产出 (页码索引, 文本, 错误信息)"""
+    with open(file_path, "rb") as f:
+        reader = PyPDF2.PdfReader(f)
+        for i in range(start, end):
+            try:
+                yield i, reader.pages[i].extract_text() or "", None
+            except Exception as e:
+                yield i, "", str(e)
+
+
+def _extract_pdf_pages(file_path: str, start: int, end: int) -> List[Tuple[int, str, Optional[str]]]:
+    """
+    提取 [start, end) 范围内各页文本（在 worker 进程中运行，独立打开文件）
+
+    Returns:
+        (页码索引, 文本, 错误信息) 列表；子进程中的日志无法写出，错误随结果返回由主进程记录
+    """
+    return list(_iter_pdf_pages(file_path, start, end))
+
+
+def _format_pdf_pages(pages: Iterator[Tuple[int, str, Optional[str]]]) -> Iterator[str]:
+    """把页面提取结果转换为带页码标题的文本块，并记录提取失败的页"""
+    for i, text, error in pages:
+        if error:
+            logger.warning("第 %s 页提取失败: %s", i + 1, error)
+        elif text:
+            yield f"=== 第 {i + 1} 页 ===\n{text}\n"
+
+
+def _get_pdf_executor() -> ProcessPoolExecutor:
+    """
+    懒加载 PDF 解析进程池
 
+    服务进程里有日志队列、HTTP 客户端、Chroma 等后台线程，直接 fork 可能把它们持有的锁带进子进程导致死锁，
+    因此用 forkserver（不支持的平台用 spawn）启动 worker
+    """
+    global _pdf_executor
+    if _pdf_executor is None:
+        method = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+        _pdf_executor = ProcessPoolExecutor(
+            max_workers=PDF_PARSE_WORKERS,
+            mp_context=multiprocessing.get_context(method)
+        )
+    return _pdf_executor
+
+
+def _extract_pdf_parallel(file_path: str, start: int, end: int) -> List[Tuple[int, str, Optional[str]]]:
+    """把页码区间切成连续分片交给进程池，按页码顺序拼回结果"""
+    global _pdf_executor
+    total = end - start
+    shard_size = max(PDF_MIN_SHARD_PAGES, -(-total // (PDF_PARSE_WORKERS * 2)))
+    shards = [(s, min(s + shard_size, end)) for s in range(start, end, shard_size)]
 
-def read_pdf_file(file_path: str) -> str:
+    try:
+        executor = _get_pdf_executor()
+        futures = [executor.submit(_extract_pdf_pages, file_path, s, e) for s, e in shards]
+        results = []
+        for future in futures:
+            results.extend(future.result())
+        return results
+    except BrokenProcessPool as e:
+        logger.warning("PDF 解析进程池异常，改为单进程解析: %s", e)
+        _pdf_executor = None
+        return _extract_pdf_pages(file_path, start, end)
+
+
+def read_pdf_file(
+    file_path: str,
+    max_pages: Optional[int] = None,
+    page_range: Optional[Tuple[int, int]] = None,
+    max_chars: Optional[int] = None
+) -> str:
     """
     读取 PDF 文件
 
+    页数较多时按页码区间分片，由多个进程并行提取后按顺序拼接（会阻塞等待结果，异步代码中请经 asyncio.to_thread 调用）；
+    设置了 max_chars 时改为逐页提取，字符数够用即停止
+
     Args:
         file_path: PDF文件路径
+        max_pages: 最多读取的页数（从起始页算起），None 表示不限
+        page_range: 读取的页码区间 (起始页, 结束页)，从 1 开始且包含两端，None 表示全部
+        max_chars: 最多返回的字符数，None 表示不限
 
     Returns:
         提取的文本内容
     """
     try:
         with open(file_path, "rb") as f:
-            reader = PyPDF2.PdfReader(f)
-            text_content = []
+            page_count = len(PyPDF2.PdfReader(f).pages)
 
-            print(f"   正在读取 PDF，共 {len(reader.pages)} 页...")
+        start, end = 0, page_count
+        if page_range:
+            start = max(page_range[0] - 1, 0)
+            end = min(page_range[1], page_count)
+        if max_pages is not None:
+            end = min(end, start + max_pages)
+        if start >= end:
+            return ""
 
-            for i, page in enumerate(reader.pages):
-                try:
-                    text = page.extract_text()
-                    if text:
-                        text_content.append(f"=== 第 {i + 1} 页 ===\n{text}\n")
-                except Exception as e:
-                    print(f"   警告: 第 {i + 1} 页提取失败: {e}")
+        logger.debug("正在读取 PDF，共 %s 页，读取第 %s-%s 页...", page_count, start + 1, end)
 
-            return "\n".join(text_content)
+        if max_chars is not None:
+            pages = _iter_pdf_pages(file_path, start, end)
+        elif PDF_PARSE_WORKERS > 1 and end - start >= PDF_PARALLEL_MIN_PAGES:
+            pages = _extract_pdf_parallel(file_path, start, end)
+        else:
+            pages = _extract_pdf_pages(file_path, start, end)
+
+        return _join_within_budget(_format_pdf_pages(pages), max_chars)
 
     except Exception as e:
-        print(f"   读取 PDF 失败: {e}")
+        logger.warning("读取 PDF 失败: %s", e)
         return ""
 
 
-def read_docx_file(file_path: str) -> str:
+def _docx_styles(zf: zipfile.ZipFile) -> Tuple[Dict[str, int], Set[str]]:
+    """
+    从 styles.xml 读取 样式ID -> 标题级别 映射，以及自带编号的列表样式ID
+
+    本地化文档的样式ID可能是 "1"、"a1" 等，标题需按样式名判断
+    """
+    levels: Dict[str, int] = {}
+    list_styles: Set[str] = set()
+    if "word/styles.xml" not in zf.namelist():
+        return levels, list_styles
+    with zf.open("word/styles.xml") as f:
+        root = etree.parse(f).getroot()
+    for style in root.iter(f"{_W}style"):
+        style_id = style.get(f"{_W}styleId")
+        name = style.find(f"{_W}name")
+        name = (name.get(f"{_W}val") or "").lower() if name is not None else ""
+        match = re.fullmatch(r"heading (\d)", name)
+        if match:
+            levels[style_id] = int(match.group(1))
+        elif name == "title":
+            levels[style_id] = 1
+        elif style.find(f"{_W}pPr/{_W}numPr") is not None:
+            list_styles.add(style_id)
+    return levels, list_styles
+
+
+def _markdown_row(cells: List[str]) -> str:
+    return "| " + " | ".join(cell.replace("|", "\\|") for cell in cells) + " |"
+
+
+def _docx_paragraph_text(p) -> str:
+    """拼接段落内 run 的文本（w:t / 制表符 / 换行），与 python-docx 的 paragraph.text 一致"""
+    parts = []
+    for node in p.iter(_W_T, _W_TAB, _W_BR, _W_CR):
+        if node.tag == _W_T:
+            if node.text:
+                parts.append(node.text)
+        elif node.tag != _W_TAB:
+            parts.append("\n")
+        elif node.getparent().tag == _W_R:
+            # w:tab 也出现在 w:tabs（制表位定义）中，只处理 run 内的
+            parts.append("\t")
+    return "".join(parts).strip()
+
+
+def _docx_table_rows(tbl) -> Iterator[List[str]]:
+    """逐行产出表格单元格文本；单元格内的多段与嵌套表格压平为一行"""
+    for tr in tbl.iterchildren(_W_TR):
+        row = []
+        for tc in tr.iterchildren(_W_TC):
+            texts = []
+            for child in tc.iterchildren(_W_P, _W_TBL):
+                if child.tag == _W_P:
+                    texts.append(_docx_paragraph_text(child))
+                else:
+                    texts.extend(cell for nested in _docx_table_rows(child) for cell in nested)
+            row.append(" ".join(" ".join(texts).split()))
+            span = tc.find(f"{_W}tcPr/{_W}gridSpan")
+            if span is not None:
+                # 横向合并的单元格补空列，保持各行列数一致
+                row.extend([""] * (int(span.get(f"{_W}val", "1")) - 1))
+        yield row
+
+
+def _iter_docx_blocks(file_path: str) -> Iterator[str]:
+    """
+    流式解析 word/document.xml，按正文顺序产出段落与表格行（Markdown 格式）
+
+    只在正文顶层的段落/表格结束时处理其子树（lxml 的 C 层遍历），处理完立即释放，
+    不构建 python-docx 对象，也不为每行重建合并单元格网格
+    """
+    with zipfile.ZipFile(file_path) as zf:
+        heading_levels, list_styles = _docx_styles(zf)
+        with zf.open("word/document.xml") as xml:
+            for _, elem in etree.iterparse(xml, events=("end",), tag=(_W_P, _W_TBL)):
+                parent = elem.getparent()
+                if parent is None or parent.tag != _W_BODY:
+                    continue
+
+                # 兼容内容的备用版本（如文本框）与 mc:Choice 重复
+                for fallback in list(elem.iter(_MC_FALLBACK)):
+                    fallback.getparent().remove(fallback)
+
+                if elem.tag == _W_P:
+                    text = _docx_paragraph_text(elem)
+                    if text:
+                        style = elem.find(f"{_W}pPr/{_W}pStyle")
+                        style = style.get(f"{_W}val") if style is not None else None
+                        level = heading_levels.get(style)
+                        if level:
+                            yield "#" * level + " " + text
+                        elif style in list_styles or elem.find(f"{_W}pPr/{_W}numPr") is not None:
+                            yield "- " + text
+                        else:
+                            yield text
+                else:
+                    for i, row in enumerate(_docx_table_rows(elem)):
+                        if i == 0:
+                            yield ""
+                            yield _markdown_row(row)
+                            yield _markdown_row(["---"] * len(row))
+                        else:
+                            yield _markdown_row(row)
+                    yield ""
+
+                # 释放已处理的正文元素，避免整棵树驻留内存
+                elem.clear()
+                while elem.getprevious() is not None:
+                    del parent[0]
+
+
+def read_docx_file(file_path: str, max_chars: Optional[int] = None) -> str:
     """
     读取 Word 文档 (docx)
 
+    按正文顺序输出：标题转为 Markdown 标题，列表项加 "- "，表格转为 Markdown 表格
+
     Args:
         file_path: Word文档路径
+        max_chars: 最多返回的字符数，None 表示不限
 
     Returns:
         提取的文本内容
     """
     try:
-        doc = Document(file_path)
-        text_content = []
-
-        print(f"   正在读取 Word 文档...")
-
-        # 读取段落
-        for para in doc.paragraphs:
-            if para.text.strip():
-                text_content.append(para.text)
-
-        # 读取表格
-        if doc.tables:
-            text_content.append("\n=== 表格内容 ===")
-            for i, table in enumerate(doc.tables):
-                text_content.append(f"\n--- 表格 {i + 1} ---")
-                for row in table.rows:
-                    row_text = []
-                    for cell in row.cells:
-                        row_text.append(cell.text.strip())
-                    text_content.append(" | ".join(row_text))
+        logger.debug("正在读取 Word 文档...")
 
-        return "\n".join(text_content)
+        return _join_within_budget(_iter_docx_blocks(file_path), max_chars)
 
     except Exception as e:
-        print(f"   读取 Word 文档失败: {e}")
+        logger.warning("读取 Word 文档失败: %s", e)
         return ""
 
 
-def read_excel_file(file_path: str) -> str:
+def read_excel_file(file_path: str, max_chars: Optional[int] = None) -> str:
     """
     读取 Excel 文件
 
+    分块流式读取每个工作表，输出列结构、统计概要与首尾样本，而不是截取前若干行
+
     Args:
         file_path: Excel文件路径
+        max_chars: 最多返回的字符数，None 表示不限
 
     Returns:
-        提取的文本内容（表格形式）
+        提取的文本内容（表格摘要）
     """
     try:
-        workbook = openpyxl.load_workbook(file_path, read_only=True)
-        text_content = []
+        logger.debug("正在读取 Excel: %s", file_path)
+        return summarize_table_file(file_path, "xlsx")[:max_chars]
+
+    except Exception as e:
+        logger.warning("读取 Excel 失败: %s", e)
+        return ""
 
-        print(f"   正在读取 Excel，共 {len(workbook.sheetnames)} 个工作表...")
 
-        for sheet_name in workbook.sheetnames:
-            text_content.append(f"\n=== 工作表: {sheet_name} ===")
-            sheet = workbook[sheet_name]
+def read_csv_file(file_path: str, max_chars: Optional[int] = None) -> str:
+    """
+    读取 CSV 文件
 
-            # 读取前100行
-            for i, row in enumerate(sheet.iter_rows(values_only=True)):
-                if i >= 100:  # 限制行数
-                    text_content.append("... (剩余行数省略)")
-                    break
+    分块流式读取全表，输出列结构、统计概要与首尾样本
 
-                # 过滤空行
-                row_data = [str(cell) if cell is not None else "" for cell in row]
-                if any(cell.strip() for cell in row_data):
-                    text_content.append(" | ".join(row_data))
+    Args:
+        file_path: CSV文件路径
+        max_chars: 最多返回的字符数，None 表示不限
 
-        return "\n".join(text_content)
+    Returns:
+        提取的文本内容（表格摘要）
+    """
+    try:
+        logger.debug("正在读取 CSV: %s", file_path)
+        return summarize_table_file(file_path, "csv")[:max_chars]
 
     except Exception as e:
-        print(f"   读取 Excel 失败: {e}")
+        logger.warning("读取 CSV 失败: %s", e)
         return ""
 
 
-def read_csv_file(file_path: str) -> str:
+def read_parquet_file(file_path: str, max_chars: Optional[int] = None) -> str:
     """
-    读取 CSV 文件
+    读取 Parquet 文件
+
+    按行组分批读取，输出列结构、统计概要与首尾样本
 
     Args:
-        file_path: CSV文件路径
+        file_path: Parquet文件路径
+        max_chars: 最多返回的字符数，None 表示不限
 
     Returns:
-        提取的文本内容
+        提取的文本内容（表格摘要）
     """
     try:
-        df = pd.read_csv(file_path, nrows=100)  # 限制行数
-        print(f"   正在读取 CSV，共 {len(df)} 行 x {len(df.columns)} 列...")
-        return df.to_string(index=False)
+        logger.debug("正在读取 Parquet: %s", file_path)
+        return summarize_table_file(file_path, "parquet")[:max_chars]
 
     except Exception as e:
-        print(f"   读取 CSV 失败: {e}")
+        logger.warning("读取 Parquet 失败: %s", e)
         return ""
 
 
-def read_json_file(file_path: str) -> str:
+def read_json_file(file_path: str, max_chars: Optional[int] = None) -> str:
     """
     读取 JSON 文件
 
     Args:
         file_path: JSON文件路径
+        max_chars: 最多返回的字符数，None 表示不限
 
     Returns:
         格式化后的 JSON 字符串
@@ -232,24 +533,28 @@ def read_json_file(file_path: str) -> str:
                 "length": len(data),
                 "preview": data[:10]
             }
-            return json.dumps(preview, ensure_ascii=False, indent=2)
+            return json.dumps(preview, ensure_ascii=False, indent=2)[:max_chars]
 
         # 如果是字典，直接格式化
-        return json.dumps(data, ensure_ascii=False, indent=2)
+        return json.dumps(data, ensure_ascii=False, indent=2)[:max_chars]
 
     except Exception as e:
-        print(f"   读取 JSON 失败: {e}")
+        logger.warning("读取 JSON 失败: %s", e)
         # 作为文本文件读取
-        return read_text_file(file_path)
+        return read_text_file(file_path, max_chars=max_chars)
 
 
-def read_file(file_path: str, file_type: Optional[str] = None) -> str:
+def read_file(file_path: str, file_type: Optional[str] = None, max_chars: Optional[int] = None) -> str:
     """
     通用文件读取函数，自动检测类型并读取
 
+    调用方只需要开头部分时传入 max_chars，PDF/Word/Excel 读取到足够字符后即停止解析；
+    不传则返回全文
+
     Args:
         file_path: 文件路径
         file_type: 文件类型（如果已知）
+        max_chars: 字符预算，None 表示读取全文
 
     Returns:
         文件内容字符串
@@ -257,7 +562,7 @@ def read_file(file_path: str, file_type: Optional[str] = None) -> str:
     if file_type is None:
         file_type = detect_file_type(file_path)
 
-    print(f"   使用 {file_type} 格式读取...")
+    logger.debug("使用 %s 格式读取...", file_type)
 
     # 根据文件类型调用相应函数
     readers = {
@@ -267,11 +572,17 @@ def read_file(file_path: str, file_type: Optional[str] = None) -> str:
         "xlsx": read_excel_file,
         "md": read_text_file,
         "json": read_json_file,
-        "csv": read_csv_file
+        "csv": read_csv_file,
+        "parquet": read_parquet_file
     }
 
     reader = readers.get(file_type, read_text_file)
-    return reader(file_path)
+    with metrics_collector.track("parse", file_type, size=os.path.getsize(file_path)) as span:
+        content = reader(file_path, max_chars=max_chars)
+        # 各读取函数失败时返回空字符串而不抛出异常
+        if not content:
+            span.success = False
+        return content
 
 
 def save_file(file_path: str, content: str) -> bool:
@@ -291,11 +602,11 @@ def save_file(file_path: str, content: str) -> bool:
         with open(file_path, "w", encoding="utf-8") as f:
             f.write(content)
 
-        print(f"✅ 文件保存成功: {file_path}")
+        logger.info("✅ 文件保存成功: %s", file_path)
         return True
 
     except Exception as e:
-        print(f"❌ 文件保存失败: {e}")
+        logger.error("❌ 文件保存失败: %s", e)
         return False
 
 
@@ -339,6 +650,7 @@ def list_supported_formats() -> List[str]:
         ".docx - Word文档",
         ".xlsx - Excel表格",
         ".csv - CSV数据文件",
+        ".parquet - Parquet数据文件",
         ".json - JSON数据文件",
         ".py - Python代码（当文本处理）"
     ]
@@ -353,6 +665,7 @@ __all__ = [
     "read_docx_file",
     "read_excel_file",
     "read_csv_file",
+    "read_parquet_file",
     "read_json_file",
     "save_file",
     "get_file_info",
@@ -0,0 +1,154 @@
+"""
+知识库快照工具 - 导出/恢复 Chroma 向量集合
+快照为 numpy .npz 列式文件（向量矩阵 + 文本 + JSON 元数据），恢复时直接写入已有向量，无需重新调用嵌入接口
+
+用法:
+    python -m tools.kb_snapshot export snapshots/kb.npz [--dtype float16]
+    python -m tools.kb_snapshot restore snapshots/kb.npz [--replace]
+"""
+
+import argparse
+import json
+import os
+import time
+from datetime import datetime
+from typing import Any, Dict
+
+import numpy as np
+
+COLLECTION_NAME = "agentdesk_documents"
+SNAPSHOT_VERSION = 1
+
+# 分页读取/批量写入的大小
+BATCH_SIZE = 1000
+
+
+def export_collection(collection: Any, path: str, dtype: str = "float32") -> Dict[str, Any]:
+    """
+    导出向量集合到快照文件
+
+    Args:
+        collection: chromadb Collection
+        path: 快照文件路径（.npz）
+        dtype: 向量存储精度（float16 体积减半，float32 无损）
+
+    Returns:
+        快照清单
+    """
+    if dtype not in ("float16", "float32"):
+        raise ValueError(f"不支持的向量精度: {dtype}")
+
+    ids, documents, metadatas, embeddings = [], [], [], []
+    offset = 0
+    while True:
+        batch = collection.get(
+            limit=BATCH_SIZE,
+            offset=offset,
+            include=["embeddings", "documents", "metadatas"]
+        )
+        if not batch["ids"]:
+            break
+        ids.extend(batch["ids"])
+        documents.extend(doc or "" for doc in batch["documents"])
+        metadatas.extend(json.dumps(meta or {}, ensure_ascii=False) for meta in batch["metadatas"])
+        embeddings.append(np.asarray(batch["embeddings"], dtype=dtype))
+        offset += len(batch["ids"])
+
+    matrix = np.concatenate(embeddings) if embeddings else np.zeros((0, 0), dtype=dtype)
+    manifest = {
+        "version": SNAPSHOT_VERSION,
+        "collection": collection.name,
+        "count": len(ids),
+        "dimension": int(matrix.shape[1]) if matrix.ndim == 2 and len(ids) else 0,
+        "dtype": dtype,
+        "created_at": datetime.now().isoformat()
+    }
+
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    np.savez_compressed(
+        path,
+        manifest=np.array(json.dumps(manifest, ensure_ascii=False)),
+        ids=np.array(ids, dtype=str),
+        documents=np.array(documents, dtype=str),
+        metadatas=np.array(metadatas, dtype=str),
+        embeddings=matrix
+    )
+    return manifest
+
+
+def restore_collection(collection: Any, path: str) -> Dict[str, Any]:
+    """
+    从快照文件批量写入向量集合（按 id upsert，重复恢复是幂等的）
+
+    Args:
+        collection: chromadb Collection
+        path: 快照文件路径
+
+    Returns:
+        快照清单
+    """
+    with np.load(path, allow_pickle=False) as snapshot:
+        manifest = json.loads(str(snapshot["manifest"]))
+        if manifest.get("version") != SNAPSHOT_VERSION:
+            raise ValueError(f"不支持的快照版本: {manifest.get('version')}")
+
+        ids = snapshot["ids"]
+        documents = snapshot["documents"]
+        metadatas = snapshot["metadatas"]
+        embeddings = snapshot["embeddings"]
+
+        for start in range(0, len(ids), BATCH_SIZE):
+            end = start + BATCH_SIZE
+            collection.upsert(
+                ids=ids[start:end].tolist(),
+                embeddings=embeddings[start:end].astype(np.float32).tolist(),
+                documents=documents[start:end].tolist(),
+                metadatas=[json.loads(m) for m in metadatas[start:end]]
+            )
+
+    return manifest
+
+
+def iter_snapshot_metadatas(path: str):
+    """逐条读取快照中的分块元数据（用于重建文档目录）"""
+    with np.load(path, allow_pickle=False) as snapshot:
+        for meta in snapshot["metadatas"]:
+            yield json.loads(meta)
+
+
+def main():
+    import chromadb
+    from tools.document_catalog import DocumentCatalog
+
+    parser = argparse.ArgumentParser(description="知识库快照导出/恢复")
+    parser.add_argument("action", choices=["export", "restore"])
+    parser.add_argument("path", help="快照文件路径（.npz）")
+    parser.add_argument("--persist-dir", default="./chroma_db", help="Chroma 持久化目录")
+    parser.add_argument("--dtype", default="float32", choices=["float16", "float32"], help="导出的向量精度")
+    parser.add_argument("--replace", action="store_true", help="恢复前清空现有集合")
+    args = parser.parse_args()
+
+    client = chromadb.PersistentClient(path=args.persist_dir)
+    catalog = DocumentCatalog(os.path.join(args.persist_dir, "document_catalog.db"))
+    start = time.time()
+
+    if args.action == "export":
+        collection = client.get_or_create_collection(COLLECTION_NAME)
+        manifest = export_collection(collection, args.path, dtype=args.dtype)
+        size_mb = os.path.getsize(args.path) / 1024 / 1024
+        print(f"✅ 已导出 {manifest['count']} 个分块 → {args.path} ({size_mb:.1f} MB, {time.time() - start:.1f}s)")
+    else:
+        if args.replace:
+            try:
+                client.delete_collection(COLLECTION_NAME)
+            except Exception:
+                pass
+            catalog.clear()
+        collection = client.get_or_create_collection(COLLECTION_NAME)
+        manifest = restore_collection(collection, args.path)
+        documents = catalog.rebuild(iter_snapshot_metadatas(args.path))
+        print(f"✅ 已恢复 {manifest['count']} 个分块 / {documents} 个文档 ({time.time() - start:.1f}s)")
+
+
+if __name__ == "__main__":
+    main()
@@ -2,13 +2,16 @@
 PPT 生成工具
 基于 Gemini API 生成 PPT 大纲和幻灯片图片
 """
+import logging
 import os
 import json
 import base64
 import re
-import requests
 from typing import Dict, List, Optional, Any
 from datetime import datetime
+from services.http_client import http_session
+
+logger = logging.getLogger(__name__)
 
 
 def generate_presentation_outline(
@@ -113,13 +116,12 @@ JSON 格式：
         payload["tools"] = [{"googleSearch": {}}]
     
     try:
-        print(f"[PPTGen] 生成演示文稿大纲...")
-        print(f"  主题: {topic[:50]}...")
-        print(f"  幻灯片数量: {slide_count}")
-        print(f"  复杂度: {complexity_level}")
-        print(f"  风格: {visual_style}")
+        logger.debug(
+            "[PPTGen] 生成演示文稿大纲: 主题=%.50s 数量=%s 复杂度=%s 风格=%s",
+            topic, slide_count, complexity_level, visual_style
+        )
         
-        resp = requests.post(
+        resp = http_session().post(
             api_url,
             headers={
                 "Content-Type": "application/json",
@@ -174,7 +176,7 @@ JSON 格式：
                 # 尝试直接解析整个文本
                 outline = json.loads(text)
         except Exception as e:
-            print(f"[PPTGen] JSON 解析失败: {e}")
+            logger.warning("[PPTGen] JSON 解析失败: %s", e)
             # 返回错误
             return {
                 "success": False,
@@ -182,7 +184,7 @@ JSON 格式：
                 "raw_text": text[:500]
             }
         
-        print(f"[PPTGen] ✅ 成功生成 {len(outline)} 张幻灯片大纲")
+        logger.info("[PPTGen] ✅ 成功生成 %s 张幻灯片大纲", len(outline))
         
         return {
             "success": True,
@@ -191,9 +193,7 @@ JSON 格式：
         }
         
     except Exception as e:
-        print(f"[PPTGen] ❌ 生成失败: {e}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("[PPTGen] ❌ 生成失败: %s", e)
         return {
             "success": False,
             "error": str(e)
@@ -253,9 +253,9 @@ def generate_slide_image(
     }
     
     try:
-        print(f"[PPTGen] 生成幻灯片图片: {slide_outline.get('title', '')[:30]}...")
+        logger.debug("[PPTGen] 生成幻灯片图片: %.30s...", slide_outline.get('title', ''))
         
-        resp = requests.post(
+        resp = http_session().post(
             api_url,
             headers={
                 "Content-Type": "application/json",
@@ -282,7 +282,7 @@ def generate_slide_image(
             for part in parts_list:
                 inline_data = part.get("inlineData") or part.get("inline_data")
                 if inline_data and inline_data.get("data"):
-                    print(f"[PPTGen] ✅ 成功生成幻灯片图片")
+                    logger.info("[PPTGen] ✅ 成功生成幻灯片图片")
                     return {
                         "success": True,
                         "image_base64": inline_data["data"],
@@ -296,9 +296,7 @@ def generate_slide_image(
         }
         
     except Exception as e:
-        print(f"[PPTGen] ❌ 生成图片失败: {e}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("[PPTGen] ❌ 生成图片失败: %s", e)
         return {
             "success": False,
             "error": str(e)
@@ -368,7 +366,7 @@ def create_pdf_from_slides(
                     pdf.drawImage(ImageReader(img_buffer), x, y, width=draw_width, height=draw_height)
                     
                 except Exception as img_err:
-                    print(f"[PPTGen] 添加图片失败: {img_err}")
+                    logger.warning("[PPTGen] 添加图片失败: %s", img_err)
                     # 如果图片加载失败，至少显示文本
                     pdf.setFont("Helvetica-Bold", 24)
                     pdf.drawString(50, page_height - 100, slide_data.get("title", f"幻灯片 {idx + 1}"))
@@ -386,7 +384,7 @@ def create_pdf_from_slides(
                 pdf.showPage()
         
         pdf.save()
-        print(f"[PPTGen] ✅ PDF 文件已保存: {output_path}")
+        logger.info("[PPTGen] ✅ PDF 文件已保存: %s", output_path)
         
         return {
             "success": True,
@@ -402,9 +400,7 @@ def create_pdf_from_slides(
             "hint": "生成 PDF 需要: pip install reportlab pillow"
         }
     except Exception as e:
-        print(f"[PPTGen] ❌ 创建 PDF 失败: {e}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("[PPTGen] ❌ 创建 PDF 失败: %s", e)
         return {
             "success": False,
             "error": str(e)
@@ -473,10 +469,10 @@ def create_pptx_from_slides(
                     height = Inches(7.5)
                     slide.shapes.add_picture(img_stream, left, top, width, height)
                 except Exception as img_err:
-                    print(f"[PPTGen] 添加图片失败: {img_err}")
+                    logger.warning("[PPTGen] 添加图片失败: %s", img_err)
         
         prs.save(output_path)
-        print(f"[PPTGen] ✅ PPTX 文件已保存: {output_path}")
+        logger.info("[PPTGen] ✅ PPTX 文件已保存: %s", output_path)
         
         return {
             "success": True,
@@ -491,9 +487,7 @@ def create_pptx_from_slides(
             "hint": "可以使用其他方式生成 PPT，或返回图片列表"
         }
     except Exception as e:
-        print(f"[PPTGen] ❌ 创建 PPTX 失败: {e}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("[PPTGen] ❌ 创建 PPTX 失败: %s", e)
         return {
             "success": False,
             "error": str(e)
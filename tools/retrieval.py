@@ -0,0 +1,142 @@
+"""
+检索后处理工具 - MMR 重排、近重复去除与按 token 预算打包上下文
+为知识管理专家的 RAG 流程提供支持
+"""
+
+import re
+from typing import List, Dict, Any, Sequence
+
+import numpy as np
+
+
+# 中日韩字符（大致按 1 字符 ≈ 1 token 估算）
+_CJK_PATTERN = re.compile(r'[\u3000-\u303f\u3400-\u4dbf\u4e00-\u9fff\uff00-\uffef]')
+
+
+def estimate_tokens(text: str) -> int:
+    """粗略估算文本 token 数（中文按字计，其他按 4 字符 1 token 计）"""
+    cjk = len(_CJK_PATTERN.findall(text))
+    return cjk + (len(text) - cjk) // 4 + 1
+
+
+def _normalize(matrix: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(matrix, axis=-1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+def mmr_select(
+    query_embedding: Sequence[float],
+    embeddings: Sequence[Sequence[float]],
+    k: int = 8,
+    lambda_mult: float = 0.6,
+    duplicate_threshold: float = 0.95
+) -> List[int]:
+    """
+    最大边际相关性（MMR）选择，并剔除近重复分块
+
+    Args:
+        query_embedding: 查询向量
+        embeddings: 候选分块向量
+        k: 最多选择的数量
+        lambda_mult: 相关性与多样性的权衡（1 为只看相关性）
+        duplicate_threshold: 与已选分块余弦相似度超过该值即视为重复
+
+    Returns:
+        按选择顺序排列的候选下标
+    """
+    if len(embeddings) == 0:
+        return []
+
+    query = _normalize(np.asarray(query_embedding, dtype=np.float32)[None, :])[0]
+    candidates = _normalize(np.asarray(embeddings, dtype=np.float32))
+    relevance = candidates @ query
+    pairwise = candidates @ candidates.T
+
+    selected: List[int] = []
+    remaining = set(range(len(candidates)))
+    while remaining and len(selected) < k:
+        best_idx, best_score = -1, -np.inf
+        for idx in remaining:
+            redundancy = max((pairwise[idx, s] for s in selected), default=0.0)
+            score = lambda_mult * relevance[idx] - (1 - lambda_mult) * redundancy
+            if score > best_score:
+                best_idx, best_score = idx, score
+        remaining.discard(best_idx)
+
+        if selected and max(pairwise[best_idx, s] for s in selected) >= duplicate_threshold:
+            continue
+        selected.append(best_idx)
+
+    return selected
+
+
+def _merge_overlap(left: str, right: str, max_overlap: int = 400) -> str:
+    """合并相邻分块，去掉分块之间的重叠部分"""
+    limit = min(len(left), len(right), max_overlap)
+    for size in range(limit, 0, -1):
+        if left.endswith(right[:size]):
+            return left + right[size:]
+    return left + "\n" + right
+
+
+def pack_context(chunks: List[Dict[str, Any]], token_budget: int = 3000) -> List[Dict[str, Any]]:
+    """
+    按 token 预算打包检索结果，并合并同一文档中 chunk_index 相邻的分块
+
+    Args:
+        chunks: 已按相关性排序的分块（含 content / metadata / score）
+        token_budget: 上下文 token 预算
+
+    Returns:
+        段落列表，每个段落包含 source、doc_id、chunk_indices、pages、content、score
+    """
+    kept: List[Dict[str, Any]] = []
+    used = 0
+    for chunk in chunks:
+        cost = estimate_tokens(chunk["content"])
+        if kept and used + cost > token_budget:
+            continue
+        kept.append(chunk)
+        used += cost
+
+    # 记录每个文档首次出现的相关性排名，保证段落按相关性输出
+    rank = {}
+    for i, chunk in enumerate(kept):
+        rank.setdefault(chunk["metadata"].get("doc_id"), i)
+
+    kept.sort(key=lambda c: (rank[c["metadata"].get("doc_id")], c["metadata"].get("chunk_index", 0)))
+
+    passages: List[Dict[str, Any]] = []
+    for chunk in kept:
+        metadata = chunk["metadata"]
+        doc_id = metadata.get("doc_id")
+        index = metadata.get("chunk_index", 0)
+        page = metadata.get("page")
+        last = passages[-1] if passages else None
+
+        if last and last["doc_id"] == doc_id and last["chunk_indices"][-1] + 1 == index:
+            last["content"] = _merge_overlap(last["content"], chunk["content"])
+            last["chunk_indices"].append(index)
+            if page is not None and page not in last["pages"]:
+                last["pages"].append(page)
+            last["score"] = max(last["score"], chunk["score"])
+            continue
+
+        passages.append({
+            "source": metadata.get("source", "unknown"),
+            "doc_id": doc_id,
+            "chunk_indices": [index],
+            "pages": [page] if page is not None else [],
+            "content": chunk["content"],
+            "score": chunk["score"]
+        })
+
+    return passages
+
+
+__all__ = [
+    "estimate_tokens",
+    "mmr_select",
+    "pack_context"
+]
@@ -0,0 +1,232 @@
+"""
+表格查询工具
+把上传的 CSV/XLSX/Parquet 注册为表，供数据类智能体通过 JSON 工具调用执行 SQL 或聚合，
+只把小结果集交给 LLM，而不是把整张表塞进提示词
+"""
+
+import json
+import logging
+import os
+import re
+from typing import Any, Dict, List, Optional, Tuple
+
+import pandas as pd
+
+from tools.table_tools import TableHandle, get_table, sql_type
+
+try:
+    import duckdb
+except ImportError:
+    duckdb = None
+
+logger = logging.getLogger(__name__)
+
+# 返回给智能体的最大结果行数
+TABLE_QUERY_MAX_ROWS = int(os.getenv("TABLE_QUERY_MAX_ROWS", "50"))
+# 结果中单元格的最大显示宽度
+MAX_CELL_WIDTH = 60
+
+_AGG_FUNCS = {"sum", "mean", "count", "min", "max", "median", "nunique", "std"}
+_FILTER_OPS = {"==", "!=", ">", ">=", "<", "<=", "in", "not in", "contains"}
+
+
+class TableQueryEngine:
+    """
+    一次对话中可查询的表集合
+
+    有 duckdb 时支持只读 SELECT（禁止访问文件系统与加载扩展）；
+    aggregate 工具基于 pandas，始终可用
+    """
+
+    def __init__(self, table_refs: List[str]):
+        self.tables: Dict[str, Tuple[TableHandle, str]] = {}
+        self._conn = None
+        for ref in table_refs:
+            handle = get_table(ref)
+            if handle is None:
+                logger.warning("表格已失效（缓存被清理）: %s", ref)
+                continue
+            for sheet in handle.sheets:
+                if handle.rows.get(sheet):
+                    self.tables[self._unique_name(sheet)] = (handle, sheet)
+
+    def _unique_name(self, sheet: str) -> str:
+        name = re.sub(r"[^\w]+", "_", sheet).strip("_") or "table"
+        candidate, n = name, 2
+        while candidate in self.tables:
+            candidate, n = f"{name}_{n}", n + 1
+        return candidate
+
+    def frame(self, name: str) -> pd.DataFrame:
+        if name not in self.tables:
+            raise KeyError(f"表不存在: {name}，可用的表: {', '.join(self.tables)}")
+        handle, sheet = self.tables[name]
+        return handle.frame(sheet)
+
+    def describe(self) -> str:
+        """生成可用表及列结构说明（放入系统提示词），结构取自解析时的统计概要，不加载数据"""
+        lines = []
+        for name, (handle, sheet) in self.tables.items():
+            schema = handle.schema.get(sheet)
+            if schema is None:
+                df = self.frame(name)
+                schema = [(str(col), sql_type(df[col])) for col in df.columns]
+            columns = ", ".join(f'"{col}" {dtype}' for col, dtype in schema)
+            lines.append(f'- "{name}"（来自 {handle.source}，{handle.rows.get(sheet, 0)} 行）: {columns}')
+        return "\n".join(lines)
+
+    def execute(self, tool_name: str, args: Dict[str, Any]) -> str:
+        """执行一次工具调用，错误以文本形式返回给智能体以便修正后重试"""
+        try:
+            if tool_name == "sql_query":
+                return self.sql(args.get("sql", ""))
+            if tool_name == "aggregate":
+                return self.aggregate(args)
+            return f"❌ 未知工具: {tool_name}，可用工具: sql_query, aggregate"
+        except Exception as e:
+            logger.warning("表格查询失败 (%s): %s", tool_name, e)
+            return f"❌ 查询失败: {e}"
+
+    def sql(self, sql: str) -> str:
+        """执行只读 SQL"""
+        if duckdb is None:
+            return "❌ 当前环境未安装 duckdb，请改用 aggregate 工具"
+        statement = sql.strip().rstrip(";").strip()
+        if not re.match(r"(?is)^(select|with)\b", statement) or ";" in statement:
+            return "❌ 只允许单条 SELECT / WITH 查询"
+
+        result = self._connection().execute(statement).df()
+        return _format_result(result)
+
+    def _connection(self):
+        if self._conn is None:
+            conn = duckdb.connect(":memory:")
+            for name in self.tables:
+                conn.register(name, self.frame(name))
+            # 注册完成后禁止读写文件、加载扩展，并锁定配置
+            conn.execute("SET enable_external_access = false")
+            conn.execute("SET lock_configuration = true")
+            self._conn = conn
+        return self._conn
+
+    def aggregate(self, args: Dict[str, Any]) -> str:
+        """
+        pandas 聚合：{"table", "where": [[列, 运算符, 值], ...], "group_by": [列],
+        "agg": {列: 函数或函数列表}, "columns": [列], "order_by": 列, "desc": bool, "limit": int}
+        """
+        df = self.frame(args.get("table") or next(iter(self.tables), ""))
+
+        for condition in args.get("where") or []:
+            column, op, value = condition
+            if op not in _FILTER_OPS:
+                raise ValueError(f"不支持的运算符: {op}")
+            series = df[column]
+            if op == "==":
+                mask = series == value
+            elif op == "!=":
+                mask = series != value
+            elif op == ">":
+                mask = series > value
+            elif op == ">=":
+                mask = series >= value
+            elif op == "<":
+                mask = series < value
+            elif op == "<=":
+                mask = series <= value
+            elif op == "in":
+                mask = series.isin(value)
+            elif op == "not in":
+                mask = ~series.isin(value)
+            else:
+                mask = series.astype(str).str.contains(str(value), regex=False, na=False)
+            df = df[mask]
+
+        group_by = args.get("group_by") or []
+        if isinstance(group_by, str):
+            group_by = [group_by]
+        agg = args.get("agg") or {}
+        for funcs in agg.values():
+            for func in funcs if isinstance(funcs, list) else [funcs]:
+                if func not in _AGG_FUNCS:
+                    raise ValueError(f"不支持的聚合函数: {func}，可用: {', '.join(sorted(_AGG_FUNCS))}")
+
+        if agg and group_by:
+            result = df.groupby(group_by, dropna=False).agg(agg)
+            result.columns = ["_".join(col) if isinstance(col, tuple) else col for col in result.columns]
+            result = result.reset_index()
+        elif agg:
+            result = df.agg(agg)
+            result = result.T.reset_index(names="列") if isinstance(result, pd.DataFrame) else result.to_frame("值").T
+        elif group_by:
+            result = df.groupby(group_by, dropna=False).size().reset_index(name="count")
+        else:
+            result = df[args["columns"]] if args.get("columns") else df
+
+        if args.get("order_by"):
+            result = result.sort_values(args["order_by"], ascending=not args.get("desc", False))
+        if args.get("limit"):
+            result = result.head(int(args["limit"]))
+        return _format_result(result)
+
+    def close(self):
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+
+def _format_result(result: pd.DataFrame) -> str:
+    """把结果集格式化为文本，超过 TABLE_QUERY_MAX_ROWS 行时截断并注明总行数"""
+    total = len(result)
+    if total == 0:
+        return "（查询结果为空）"
+    text = result.head(TABLE_QUERY_MAX_ROWS).to_string(index=False, max_colwidth=MAX_CELL_WIDTH)
+    if total > TABLE_QUERY_MAX_ROWS:
+        text += f"\n...（共 {total} 行，仅显示前 {TABLE_QUERY_MAX_ROWS} 行，请用聚合或 LIMIT 缩小结果）"
+    return text
+
+
+def build_tool_prompt(engine: TableQueryEngine) -> str:
+    """生成注入系统提示词的工具说明"""
+    sql_line = (
+        '- sql_query(sql): 执行只读 SQL（DuckDB 语法），表名和中文列名用双引号，例如 SELECT "城市", SUM("金额") FROM "销售" GROUP BY 1'
+        if duckdb is not None else ""
+    )
+    return f"""
+[可用数据表]
+{engine.describe()}
+
+[可用工具]
+{sql_line}
+- aggregate(table, where, group_by, agg, columns, order_by, desc, limit): 过滤与分组聚合
+  where 为条件列表 [[列, 运算符, 值]]，运算符: {", ".join(sorted(_FILTER_OPS))}
+  agg 为 {{列: 函数}}，函数: {", ".join(sorted(_AGG_FUNCS))}
+
+需要计算数据时，只输出一个工具调用（不要输出其他内容），格式:
+```json
+{{"tool": "工具名称", "args": {{"参数名": "参数值"}}}}
+```
+收到查询结果后再继续分析；数字以查询结果为准，不要自行估算。得到足够信息后直接给出最终回答。
+"""
+
+
+def parse_tool_call(content: str) -> Optional[Dict[str, Any]]:
+    """从模型输出中解析 {"tool": ..., "args": ...} 工具调用"""
+    match = re.search(r"```json\s*(\{.*?\})\s*```", content, re.DOTALL)
+    if not match:
+        match = re.search(r'(\{.*"tool".*\})', content, re.DOTALL)
+    if not match:
+        return None
+    try:
+        call = json.loads(match.group(1))
+    except ValueError:
+        return None
+    if not isinstance(call, dict) or not call.get("tool"):
+        return None
+    return call
+
+
+__all__ = [
+    "TableQueryEngine",
+    "build_tool_prompt",
+    "parse_tool_call"
+]
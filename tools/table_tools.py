@@ -0,0 +1,648 @@
+"""
+表格数据工具函数
+流式读取大型 Excel/CSV，按列计算统计概要，输出“结构 + 统计 + 首尾样本”的紧凑摘要
+"""
+
+import codecs
+import hashlib
+import json
+import logging
+import os
+import re
+import shutil
+import threading
+from collections import Counter, OrderedDict, deque
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+import openpyxl
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+    pq = None
+
+from services.metrics import record_cache
+
+logger = logging.getLogger(__name__)
+
+# 每次处理的行数
+CHUNK_ROWS = int(os.getenv("TABLE_CHUNK_ROWS", "50000"))
+# 分位数计算使用的均匀抽样上限（每列）
+QUANTILE_SAMPLE_SIZE = 20000
+# 每列保留的高频值候选数量（跨块合并时按计数截断，结果为近似值）
+TOP_VALUE_CANDIDATES = 200
+# 精确统计唯一值个数的上限，超过后显示为 “≥上限”
+DISTINCT_LIMIT = 10000
+# 首尾样本行数
+SAMPLE_ROWS = 5
+
+# 解析结果的 Parquet 缓存目录与保留份数
+TABLE_CACHE_DIR = os.getenv("TABLE_CACHE_DIR", "table_cache")
+TABLE_CACHE_MAX_ENTRIES = int(os.getenv("TABLE_CACHE_MAX_ENTRIES", "200"))
+# 进程内保留的表格句柄数量（句柄会持有已加载的 DataFrame）
+TABLE_HANDLE_LIMIT = 8
+
+_digest_memo: Dict[tuple, str] = {}
+_handles: "OrderedDict[str, TableHandle]" = OrderedDict()
+_handles_lock = threading.Lock()
+
+_DATE_PATTERN = re.compile(r"^\d{4}[-/.年]\d{1,2}[-/.月]\d{1,2}")
+
+_rng = np.random.default_rng()
+
+
+class ColumnProfile:
+    """单列的流式统计，逐块 update，最后 summary"""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.count = 0
+        self.nulls = 0
+        self.kinds: set = set()
+        # 数值列
+        self.numeric_count = 0
+        self.min: Optional[float] = None
+        self.max: Optional[float] = None
+        self.total = 0.0
+        self.sample = np.empty(0)
+        # 日期列
+        self.dt_min = None
+        self.dt_max = None
+        # 合并各数据块后的 SQL 类型（与读回的 DataFrame 一致，用于描述表结构）
+        self.sql_type: Optional[str] = None
+        # 文本/类别列
+        self.top: Counter = Counter()
+        self.distinct: set = set()
+        self.distinct_overflow = False
+
+    def update(self, series: pd.Series):
+        """合并一个数据块中该列的统计（向量化计算）"""
+        self.count += len(series)
+        values = series.dropna()
+        self.nulls += len(series) - len(values)
+        chunk_type = sql_type(series)
+        # 全空的 object 块不代表列类型（数值列的全空块是 float，读回合并后同样是 DOUBLE）
+        if not (values.empty and chunk_type == "VARCHAR"):
+            self.sql_type = _merge_sql_types(self.sql_type, chunk_type)
+        if values.empty:
+            return
+
+        if pd.api.types.is_bool_dtype(values):
+            self.kinds.add("布尔")
+            self._update_categories(values.astype(str))
+        elif pd.api.types.is_numeric_dtype(values):
+            self.kinds.add("数值")
+            self._update_numeric(values.to_numpy(dtype=float))
+        elif pd.api.types.is_datetime64_any_dtype(values):
+            self.kinds.add("日期")
+            lo, hi = values.min(), values.max()
+            self.dt_min = lo if self.dt_min is None else min(self.dt_min, lo)
+            self.dt_max = hi if self.dt_max is None else max(self.dt_max, hi)
+        else:
+            self.kinds.add("文本")
+            self._update_categories(values.astype(str))
+
+    def _update_numeric(self, arr: np.ndarray):
+        arr = arr[np.isfinite(arr)]
+        if arr.size == 0:
+            return
+        lo, hi = float(arr.min()), float(arr.max())
+        self.min = lo if self.min is None else min(self.min, lo)
+        self.max = hi if self.max is None else max(self.max, hi)
+        self.total += float(arr.sum())
+
+        # 合并两个均匀样本：从旧样本取的个数服从超几何分布，合并后仍是全部已见数据的均匀样本
+        seen, incoming = self.numeric_count, arr.size
+        self.numeric_count += incoming
+        if self.sample.size + incoming <= QUANTILE_SAMPLE_SIZE:
+            self.sample = np.concatenate([self.sample, arr])
+            return
+        keep_old = int(_rng.hypergeometric(seen, incoming, QUANTILE_SAMPLE_SIZE))
+        old = _rng.choice(self.sample, size=min(keep_old, self.sample.size), replace=False)
+        new = _rng.choice(arr, size=QUANTILE_SAMPLE_SIZE - old.size, replace=False)
+        self.sample = np.concatenate([old, new])
+
+    def _update_categories(self, values: pd.Series):
+        counts = values.value_counts()
+        self.top.update(counts.head(TOP_VALUE_CANDIDATES).to_dict())
+        if len(self.top) > TOP_VALUE_CANDIDATES * 2:
+            self.top = Counter(dict(self.top.most_common(TOP_VALUE_CANDIDATES)))
+        if not self.distinct_overflow:
+            self.distinct.update(counts.index)
+            if len(self.distinct) > DISTINCT_LIMIT:
+                self.distinct_overflow = True
+                self.distinct = set()
+
+    @property
+    def kind(self) -> str:
+        if not self.kinds:
+            return "空"
+        return "/".join(sorted(self.kinds))
+
+    def summary(self) -> str:
+        """该列统计的单行描述"""
+        parts = []
+        if self.numeric_count:
+            q25, q50, q75 = np.quantile(self.sample, [0.25, 0.5, 0.75])
+            parts.append(
+                f"min={_fmt(self.min)}, max={_fmt(self.max)}, mean={_fmt(self.total / self.numeric_count)}, "
+                f"p25={_fmt(q25)}, p50={_fmt(q50)}, p75={_fmt(q75)}"
+            )
+        if self.dt_min is not None:
+            parts.append(f"{self.dt_min} ~ {self.dt_max}")
+        if self.top:
+            distinct = f"≥{DISTINCT_LIMIT}" if self.distinct_overflow else str(len(self.distinct))
+            top = ", ".join(f"{_clip(value)}({count})" for value, count in self.top.most_common(5))
+            parts.append(f"唯一值 {distinct}，高频: {top}")
+        return "; ".join(parts)
+
+
+class TableProfile:
+    """一张表（CSV 文件或 Excel 工作表）的整体概要"""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.rows = 0
+        self.columns: Dict[str, ColumnProfile] = {}
+        self.head: Optional[pd.DataFrame] = None
+        self.tail: deque = deque(maxlen=SAMPLE_ROWS)
+
+    def update(self, chunk: pd.DataFrame):
+        """合并一个数据块"""
+        if self.head is None:
+            self.head = chunk.head(SAMPLE_ROWS)
+        self.rows += len(chunk)
+        for name in chunk.columns:
+            if name not in self.columns:
+                self.columns[name] = ColumnProfile(str(name))
+            self.columns[name].update(chunk[name])
+        self.tail.extend(chunk.tail(SAMPLE_ROWS).itertuples(index=False, name=None))
+
+    def schema(self) -> List[Tuple[str, str]]:
+        """(列名, SQL 类型) 列表"""
+        return [(col.name, col.sql_type or "VARCHAR") for col in self.columns.values()]
+
+    def to_text(self) -> str:
+        """格式化为给智能体阅读的紧凑摘要"""
+        lines = [f"=== {self.name} ===", f"共 {self.rows} 行 × {len(self.columns)} 列"]
+        if not self.columns:
+            return "\n".join(lines)
+
+        lines.append("| 列名 | 类型 | 空值率 | 统计 |")
+        lines.append("|---|---|---|---|")
+        for col in self.columns.values():
+            null_rate = col.nulls / col.count if col.count else 0
+            lines.append(f"| {col.name} | {col.kind} | {null_rate:.1%} | {col.summary()} |")
+
+        if self.head is not None and not self.head.empty:
+            lines.append(f"\n前 {len(self.head)} 行:")
+            lines.append(self.head.to_string(index=False))
+        # 行数不足首尾样本之和时，尾部只显示首部之后的行，避免重复
+        tail_rows = min(len(self.tail), self.rows - SAMPLE_ROWS)
+        if tail_rows > 0:
+            tail = pd.DataFrame(list(self.tail)[-tail_rows:], columns=list(self.columns))
+            lines.append(f"\n后 {len(tail)} 行:")
+            lines.append(tail.to_string(index=False))
+        return "\n".join(lines)
+
+
+def sql_type(series: pd.Series) -> str:
+    """pandas 列类型对应的 SQL 类型名称"""
+    if pd.api.types.is_bool_dtype(series):
+        return "BOOLEAN"
+    if pd.api.types.is_integer_dtype(series):
+        return "INTEGER"
+    if pd.api.types.is_numeric_dtype(series):
+        return "DOUBLE"
+    if pd.api.types.is_datetime64_any_dtype(series):
+        return "TIMESTAMP"
+    return "VARCHAR"
+
+
+def _merge_sql_types(current: Optional[str], incoming: str) -> str:
+    """合并两个数据块的列类型，与 pandas 拼接后的结果一致：整数 + 浮点为 DOUBLE，其余不一致为 VARCHAR"""
+    if current is None or current == incoming:
+        return incoming
+    if {current, incoming} == {"INTEGER", "DOUBLE"}:
+        return "DOUBLE"
+    return "VARCHAR"
+
+
+def _fmt(value: float) -> str:
+    """数值格式化：整数不带小数，其余保留 4 位有效数字"""
+    if float(value).is_integer() and abs(value) < 1e15:
+        return str(int(value))
+    return f"{value:.4g}"
+
+
+def _clip(value: str, limit: int = 30) -> str:
+    value = value.replace("|", "/").replace("\n", " ")
+    return value if len(value) <= limit else value[:limit] + "…"
+
+
+def _unique_headers(header: Tuple) -> List[str]:
+    """表头去重：空表头补为 列N，重复表头追加序号"""
+    names, seen = [], Counter()
+    for i, cell in enumerate(header):
+        name = str(cell).strip() if cell is not None and str(cell).strip() else f"列{i + 1}"
+        seen[name] += 1
+        names.append(name if seen[name] == 1 else f"{name}_{seen[name]}")
+    return names
+
+
+def _detect_csv_encoding(file_path: str) -> str:
+    """
+    判断 CSV 编码：整个文件能按 UTF-8 解码则用 utf-8-sig（兼容 BOM），否则按 gb18030 读取
+
+    在开始分块解析前确定编码，避免读到中途才遇到 GBK 字节而前面的数据块已计入统计
+    """
+    decoder = codecs.getincrementaldecoder("utf-8")()
+    try:
+        with open(file_path, "rb") as f:
+            for block in iter(lambda: f.read(1024 * 1024), b""):
+                decoder.decode(block)
+        decoder.decode(b"", final=True)
+    except UnicodeDecodeError:
+        return "gb18030"
+    return "utf-8-sig"
+
+
+def iter_csv_chunks(file_path: str, chunk_rows: int = CHUNK_ROWS) -> Iterator[pd.DataFrame]:
+    """分块读取 CSV（UTF-8 / GBK 编码）"""
+    encoding = _detect_csv_encoding(file_path)
+    with pd.read_csv(file_path, chunksize=chunk_rows, encoding=encoding, encoding_errors="replace") as reader:
+        for chunk in reader:
+            yield _coerce_types(chunk)
+
+
+def iter_parquet_chunks(file_path: str, chunk_rows: int = CHUNK_ROWS) -> Iterator[pd.DataFrame]:
+    """按批读取 Parquet（列类型已由文件给出，无需推断）"""
+    if pq is None:
+        raise RuntimeError("读取 Parquet 需要安装 pyarrow")
+    parquet = pq.ParquetFile(file_path, memory_map=True)
+    try:
+        for batch in parquet.iter_batches(batch_size=chunk_rows):
+            yield batch.to_pandas()
+    finally:
+        parquet.close()
+
+
+def iter_excel_chunks(sheet, chunk_rows: int = CHUNK_ROWS) -> Iterator[pd.DataFrame]:
+    """
+    分块读取 openpyxl 只读模式下的工作表
+
+    第一行非空行作为表头，之后每 chunk_rows 行组装为一个 DataFrame
+    """
+    rows = sheet.iter_rows(values_only=True)
+    header = None
+    for row in rows:
+        if any(cell is not None and str(cell).strip() for cell in row):
+            header = _unique_headers(row)
+            break
+    if header is None:
+        return
+
+    width = len(header)
+    buffer = []
+    for row in rows:
+        if not any(cell is not None and str(cell).strip() for cell in row):
+            continue
+        row = tuple(row[:width]) + (None,) * (width - len(row))
+        buffer.append(row)
+        if len(buffer) >= chunk_rows:
+            yield _infer_frame(buffer, header)
+            buffer = []
+    if buffer:
+        yield _infer_frame(buffer, header)
+
+
+def _infer_frame(rows: List[tuple], header: List[str]) -> pd.DataFrame:
+    """openpyxl 行转 DataFrame，并推断文本列中的数值/日期"""
+    return _coerce_types(pd.DataFrame(rows, columns=header))
+
+
+def _coerce_types(df: pd.DataFrame) -> pd.DataFrame:
+    """把全部可解析为数字或日期的文本列转换为对应类型"""
+    for name in df.columns:
+        column = df[name]
+        if not (pd.api.types.is_object_dtype(column) or pd.api.types.is_string_dtype(column)):
+            continue
+        non_null = column.notna().sum()
+        if not non_null:
+            continue
+
+        converted = pd.to_numeric(column, errors="coerce")
+        if converted.notna().sum() == non_null:
+            df[name] = converted
+            continue
+
+        # 只对形如日期的列尝试解析，避免在普通文本列上做昂贵的格式推断
+        head = column.dropna().astype(str).head(20)
+        if head.str.match(_DATE_PATTERN).all():
+            converted = pd.to_datetime(column, errors="coerce", format="mixed")
+            if converted.notna().sum() == non_null:
+                df[name] = converted
+    return df
+
+
+def iter_sheets(file_path: str, file_type: str) -> Iterator[Tuple[str, Iterator[pd.DataFrame]]]:
+    """
+    依次产出 (表名, 数据块迭代器)
+
+    CSV / Parquet 只有一张表，表名取文件名；Excel 每个工作表一张表
+    """
+    if file_type in ("csv", "parquet"):
+        reader = iter_csv_chunks if file_type == "csv" else iter_parquet_chunks
+        yield os.path.splitext(os.path.basename(file_path))[0], reader(file_path)
+        return
+
+    workbook = openpyxl.load_workbook(file_path, read_only=True, data_only=True)
+    try:
+        for sheet_name in workbook.sheetnames:
+            yield sheet_name, iter_excel_chunks(workbook[sheet_name])
+    finally:
+        # read_only 模式会一直持有文件句柄
+        workbook.close()
+
+
+def _file_digest(file_path: str) -> str:
+    """文件内容的 SHA-256（按路径 + 大小 + 修改时间记忆，同一文件不重复计算）"""
+    stat = os.stat(file_path)
+    key = (os.path.abspath(file_path), stat.st_size, stat.st_mtime_ns)
+    digest = _digest_memo.get(key)
+    if digest is None:
+        h = hashlib.sha256()
+        with open(file_path, "rb") as f:
+            for block in iter(lambda: f.read(1024 * 1024), b""):
+                h.update(block)
+        digest = h.hexdigest()
+        if len(_digest_memo) > 1024:
+            _digest_memo.clear()
+        _digest_memo[key] = digest
+    return digest
+
+
+def _to_arrow(chunk: pd.DataFrame):
+    """DataFrame 转 Arrow 表；混合类型的 object 列退化为字符串"""
+    try:
+        table = pa.Table.from_pandas(chunk, preserve_index=False)
+    except (pa.ArrowTypeError, pa.ArrowInvalid):
+        chunk = chunk.copy()
+        for name in chunk.columns:
+            if pd.api.types.is_object_dtype(chunk[name]):
+                chunk[name] = chunk[name].map(lambda v: None if pd.isna(v) else str(v))
+        table = pa.Table.from_pandas(chunk, preserve_index=False)
+    return table
+
+
+class TableHandle:
+    """
+    已解析表格文件的句柄
+
+    数据块只解析一次：统计摘要写入 manifest，各表的每个数据块写成一个 Parquet 分片
+    （按内容哈希 + 表序号存放，分片各自保留推断出的类型，读回时由 pandas 合并），
+    之后通过内存映射读回；未安装 pyarrow 时退化为每次重新解析
+    """
+
+    def __init__(self, file_path: str, file_type: str, digest: str):
+        self.file_path = file_path
+        self.file_type = file_type
+        self.digest = digest
+        self.source = os.path.basename(file_path)
+        self.cache_dir = os.path.join(TABLE_CACHE_DIR, digest)
+        self.sheets: List[str] = []
+        self.rows: Dict[str, int] = {}
+        self.schema: Dict[str, List[Tuple[str, str]]] = {}
+        self.summary = ""
+        self._frames: Dict[str, pd.DataFrame] = {}
+
+    @property
+    def cached(self) -> bool:
+        return pa is not None and os.path.exists(os.path.join(self.cache_dir, "manifest.json"))
+
+    def _sheet_dir(self, sheet: str) -> str:
+        return os.path.join(self.cache_dir, str(self.sheets.index(sheet)))
+
+    def load_manifest(self) -> bool:
+        """从缓存读取表名与统计摘要"""
+        if not self.cached:
+            return False
+        try:
+            with open(os.path.join(self.cache_dir, "manifest.json"), "r", encoding="utf-8") as f:
+                manifest = json.load(f)
+            self.source = manifest["source"]
+            self.sheets = manifest["sheets"]
+            self.rows = manifest["rows"]
+            self.summary = manifest["summary"]
+            # 旧版清单没有表结构，由调用方回退到读取 DataFrame
+            self.schema = {sheet: [tuple(col) for col in cols] for sheet, cols in manifest.get("schema", {}).items()}
+            # 刷新修改时间，清理缓存时按最近使用保留
+            os.utime(self.cache_dir)
+            return True
+        except (OSError, ValueError, KeyError) as e:
+            logger.warning("表格缓存清单损坏，重新解析: %s", e)
+            return False
+
+    def build(self):
+        """流式解析源文件：同时计算统计摘要并写入 Parquet 缓存"""
+        label = {"csv": "CSV", "parquet": "Parquet"}.get(self.file_type, "工作表")
+        texts = []
+        tmp_dir = None
+        if pa is not None:
+            tmp_dir = f"{self.cache_dir}.tmp-{os.getpid()}-{threading.get_ident()}"
+            os.makedirs(tmp_dir, exist_ok=True)
+
+        try:
+            for sheet, chunks in iter_sheets(self.file_path, self.file_type):
+                name = sheet if self.file_type == "xlsx" else os.path.basename(self.file_path)
+                profile = TableProfile(f"{label}: {name}")
+                sheet_dir = None
+                if tmp_dir is not None:
+                    sheet_dir = os.path.join(tmp_dir, str(len(self.sheets)))
+                    os.makedirs(sheet_dir)
+                for part, chunk in enumerate(chunks):
+                    profile.update(chunk)
+                    if tmp_dir is None:
+                        continue
+                    try:
+                        pq.write_table(_to_arrow(chunk), os.path.join(sheet_dir, f"part-{part:05d}.parquet"))
+                    except (pa.ArrowInvalid, pa.ArrowTypeError, pa.ArrowNotImplementedError) as e:
+                        logger.warning("表格 %s 无法写入 Parquet 缓存: %s", sheet, e)
+                        tmp_dir = self._discard(tmp_dir)
+                self.sheets.append(sheet)
+                self.rows[sheet] = profile.rows
+                self.schema[sheet] = profile.schema()
+                texts.append(profile.to_text())
+
+            self.summary = "\n\n".join(texts)
+            if tmp_dir is not None:
+                with open(os.path.join(tmp_dir, "manifest.json"), "w", encoding="utf-8") as f:
+                    json.dump({"source": os.path.basename(self.file_path), "sheets": self.sheets,
+                               "rows": self.rows, "schema": self.schema, "summary": self.summary},
+                              f, ensure_ascii=False)
+                try:
+                    os.replace(tmp_dir, self.cache_dir)
+                    tmp_dir = None
+                except OSError:
+                    # 其他进程/线程已写入同一内容的缓存
+                    pass
+                _prune_cache()
+        finally:
+            self._discard(tmp_dir)
+
+    @staticmethod
+    def _discard(tmp_dir: Optional[str]) -> None:
+        if tmp_dir is not None:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+        return None
+
+    def frame(self, sheet: Optional[str] = None) -> pd.DataFrame:
+        """
+        获取某张表的 DataFrame（默认第一张）
+
+        有 Parquet 缓存时内存映射读取，否则重新解析源文件；结果在句柄内复用
+        """
+        sheet = sheet or (self.sheets[0] if self.sheets else None)
+        if sheet not in self.sheets:
+            raise KeyError(f"表不存在: {sheet}，可用: {', '.join(self.sheets)}")
+        if sheet in self._frames:
+            return self._frames[sheet]
+
+        if self.cached:
+            sheet_dir = self._sheet_dir(sheet)
+            try:
+                parts = [
+                    pq.read_table(os.path.join(sheet_dir, part), memory_map=True).to_pandas()
+                    for part in sorted(os.listdir(sheet_dir))
+                ]
+            except OSError as e:
+                # 读取过程中缓存被清理
+                raise FileNotFoundError("表格缓存已过期，请重新上传文件") from e
+            df = pd.concat(parts, ignore_index=True) if parts else pd.DataFrame()
+        elif not self.file_path or not os.path.exists(self.file_path):
+            # 仅凭缓存恢复的句柄（源文件已删除），缓存又已被清理
+            raise FileNotFoundError("表格缓存已过期，请重新上传文件")
+        else:
+            df = pd.DataFrame()
+            for name, chunks in iter_sheets(self.file_path, self.file_type):
+                if name == sheet:
+                    df = pd.concat(list(chunks), ignore_index=True) if self.rows.get(sheet) else pd.DataFrame()
+                    break
+        self._frames[sheet] = df
+        return df
+
+
+def _prune_cache():
+    """只保留最近使用的 TABLE_CACHE_MAX_ENTRIES 份缓存，进程内仍持有句柄的不清理"""
+    with _handles_lock:
+        held = set(_handles)
+    try:
+        entries = [
+            os.path.join(TABLE_CACHE_DIR, name) for name in os.listdir(TABLE_CACHE_DIR)
+            if ".tmp-" not in name and name not in held
+        ]
+        if len(entries) <= TABLE_CACHE_MAX_ENTRIES:
+            return
+        entries.sort(key=os.path.getmtime)
+        for path in entries[:len(entries) - TABLE_CACHE_MAX_ENTRIES]:
+            shutil.rmtree(path, ignore_errors=True)
+    except OSError as e:
+        logger.warning("清理表格缓存失败: %s", e)
+
+
+def open_table(file_path: str, file_type: Optional[str] = None) -> TableHandle:
+    """
+    打开表格文件（CSV / XLSX / Parquet），返回可查询的句柄
+
+    相同内容的文件只解析一次：进程内按内容哈希复用句柄，跨进程通过 Parquet 缓存复用
+    """
+    if file_type is None:
+        ext = os.path.splitext(file_path)[1].lower()
+        file_type = {".csv": "csv", ".xlsx": "xlsx", ".xls": "xlsx", ".parquet": "parquet"}.get(ext, "xlsx")
+
+    digest = _file_digest(file_path)
+    with _handles_lock:
+        handle = _handles.get(digest)
+        if handle is not None:
+            _handles.move_to_end(digest)
+    record_cache("table_handle", hit=handle is not None)
+    if handle is not None:
+        return handle
+
+    handle = TableHandle(file_path, file_type, digest)
+    cached = handle.load_manifest()
+    record_cache("table_parquet", hit=cached)
+    if not cached:
+        handle.build()
+        logger.debug("表格解析完成: %s", ", ".join(f"{s} {handle.rows[s]} 行" for s in handle.sheets))
+
+    _remember(handle)
+    return handle
+
+
+def get_table(digest: str) -> Optional[TableHandle]:
+    """
+    按内容哈希取回已打开过的表格（源文件可能已被删除，此时依赖 Parquet 缓存）
+
+    Returns:
+        表格句柄；既不在内存中也没有缓存时返回 None
+    """
+    if not re.fullmatch(r"[0-9a-f]{64}", digest or ""):
+        return None
+    with _handles_lock:
+        handle = _handles.get(digest)
+        if handle is not None:
+            _handles.move_to_end(digest)
+    record_cache("table_handle", hit=handle is not None)
+    if handle is not None:
+        return handle
+
+    handle = TableHandle("", "", digest)
+    cached = handle.load_manifest()
+    record_cache("table_parquet", hit=cached)
+    if not cached:
+        return None
+    _remember(handle)
+    return handle
+
+
+def _remember(handle: TableHandle):
+    """放入进程内句柄 LRU"""
+    with _handles_lock:
+        _handles[handle.digest] = handle
+        _handles.move_to_end(handle.digest)
+        while len(_handles) > TABLE_HANDLE_LIMIT:
+            _handles.popitem(last=False)
+
+
+def summarize_table_file(file_path: str, file_type: str) -> str:
+    """
+    生成表格文件的结构与统计摘要
+
+    Args:
+        file_path: 文件路径
+        file_type: csv / xlsx / parquet
+
+    Returns:
+        每张表的列类型、空值率、数值分布、高频值以及首尾样本
+    """
+    return open_table(file_path, file_type).summary
+
+
+__all__ = [
+    "ColumnProfile",
+    "TableProfile",
+    "TableHandle",
+    "iter_csv_chunks",
+    "iter_excel_chunks",
+    "iter_parquet_chunks",
+    "iter_sheets",
+    "sql_type",
+    "open_table",
+    "get_table",
+    "summarize_table_file"
+]
@@ -3,8 +3,9 @@
 为知识管理专家提供支持
 """
 
+import logging
 import os
-from typing import List, Dict, Optional, Any
+from typing import List, Dict, Optional, Any, Iterator, Tuple, Callable
 from langchain_chroma import Chroma
 from langchain_google_genai import GoogleGenerativeAIEmbeddings
 from langchain_community.document_loaders import TextLoader, PyPDFLoader, Docx2txtLoader
@@ -14,12 +15,24 @@ from dotenv import load_dotenv
 import hashlib
 import json
 
+from tools.document_catalog import DocumentCatalog
+from tools.document_tools import parse_sections
+from tools.retrieval import mmr_select, pack_context
+from tools import kb_snapshot
+from services.analytics import metrics_collector
+from services.metrics import record_cache
+
+logger = logging.getLogger(__name__)
+
 load_dotenv()
 
 
 class VectorStoreManager:
     """向量存储管理器"""
     
+    # 每批写入向量库的分块数量（控制内存占用与单次嵌入请求大小）
+    ADD_BATCH_SIZE = 64
+    
     def __init__(self, persist_directory: str = "./chroma_db"):
         """
         初始化向量存储管理器
@@ -54,59 +67,153 @@ class VectorStoreManager:
             length_function=len,
             separators=["\n\n", "\n", "。", "！", "？", "；", "，", " ", ""]
         )
+        
+        # 文档目录（文档级元数据索引，避免每次列表都扫描全部分块）
+        self.catalog = DocumentCatalog(os.path.join(persist_directory, "document_catalog.db"))
+        self._clear_stale_documents()
+        self._migrate_catalog()
+
+    def _clear_stale_documents(self):
+        """入库进程中途退出时，删除遗留的占位记录及其部分分块（其它进程正在入库的不受影响）"""
+        for doc_id in self.catalog.clear_stale_pending():
+            try:
+                self.vector_store.delete(where={"doc_id": doc_id})
+                logger.info("[VectorStore] 已清理未完成的入库: %s", doc_id)
+            except Exception as e:
+                logger.warning("清理未完成的入库失败 %s: %s", doc_id, e)
     
-    def add_document(self, file_path: str, metadata: Optional[Dict] = None) -> Dict[str, Any]:
+    def _migrate_catalog(self):
+        """首次启用目录时，从已有的向量集合回填文档记录"""
+        try:
+            if self.catalog.count() > 0:
+                return
+            results = self.vector_store.get(include=["metadatas"])
+            metadatas = results.get('metadatas') if results else None
+            if metadatas:
+                rebuilt = self.catalog.rebuild(metadatas)
+                logger.info("[VectorStore] 文档目录已从向量集合回填 %s 个文档", rebuilt)
+        except Exception as e:
+            logger.warning("文档目录回填失败: %s", e)
+    
+    def add_document(
+        self,
+        file_path: str,
+        metadata: Optional[Dict] = None,
+        source: Optional[str] = None,
+        progress_callback: Optional[Callable[[Dict[str, int]], None]] = None
+    ) -> Dict[str, Any]:
         """
         添加文档到向量存储
         
+        按页流式读取并增量分块，每积累一批分块就写入向量库，
+        内存占用与文档总页数无关；PDF 分块会带上页码元数据，
+        非分页文档的分块会带上所属章节路径（section）。
+        
         Args:
             file_path: 文档路径
             metadata: 额外的元数据
+            source: 来源名称（默认为文件名）
+            progress_callback: 每写入一批分块后回调 {"pages": 已处理页数, "chunks": 已写入分块数}
         
         Returns:
             添加结果
         """
+        doc_id = None
+        chunks_count = 0
+        claimed = False
         try:
-            # 读取文档内容
-            content = self._load_document(file_path)
+            # 生成文档ID（基于文件内容哈希，无需先读出全文）
+            doc_id = self._generate_doc_id(file_path)
+            
+            source = source or os.path.basename(file_path)
             
-            if not content:
+            # 原子占用文档ID：已入库或正在入库（并发上传相同内容）的文档无需重复向量化
+            claimed = self.catalog.claim(doc_id, source, os.path.getsize(file_path))
+            record_cache("kb_dedup", hit=not claimed)
+            if not claimed:
+                existing = self.catalog.get(doc_id) or {}
                 return {
-                    "success": False,
-                    "error": "无法读取文档内容"
+                    "success": True,
+                    "doc_id": doc_id,
+                    "chunks_count": existing.get("chunk_count", 0),
+                    "vector_ids": [],
+                    "duplicate": True,
+                    "in_progress": existing.get("status") == "pending"
                 }
+            ids = []
+            batch = []
+            pages_count = 0
             
-            # 生成文档ID（基于内容哈希）
-            doc_id = self._generate_doc_id(content)
+            for page_number, page_text in self._iter_document_pages(file_path):
+                pages_count += 1
+                # 非分页文档整篇一次读出，按章节树给分块标注所属章节
+                outline = parse_sections(page_text) if page_number is None else None
+                cursor = 0
+                for chunk in self.text_splitter.split_text(page_text):
+                    doc_metadata = {
+                        "source": source,
+                        "doc_id": doc_id,
+                        "chunk_index": chunks_count,
+                        **(metadata or {})
+                    }
+                    if page_number is not None:
+                        doc_metadata["page"] = page_number
+                    if outline is not None:
+                        offset = page_text.find(chunk, cursor)
+                        if offset >= 0:
+                            cursor = offset + 1
+                            section = outline.find(offset)
+                            if section is not outline:
+                                doc_metadata["section"] = " > ".join(section.path())
+                    batch.append(Document(page_content=chunk, metadata=doc_metadata))
+                    chunks_count += 1
+                
+                if len(batch) >= self.ADD_BATCH_SIZE:
+                    ids.extend(self._add_batch(batch))
+                    batch = []
+                    self.catalog.touch(doc_id)
+                    if progress_callback:
+                        progress_callback({"pages": pages_count, "chunks": len(ids)})
             
-            # 分割文档
-            chunks = self.text_splitter.split_text(content)
+            if batch:
+                ids.extend(self._add_batch(batch))
+                if progress_callback:
+                    progress_callback({"pages": pages_count, "chunks": len(ids)})
             
-            # 准备文档和元数据
-            documents = []
-            for i, chunk in enumerate(chunks):
-                doc_metadata = {
-                    "source": os.path.basename(file_path),
-                    "doc_id": doc_id,
-                    "chunk_index": i,
-                    "total_chunks": len(chunks),
-                    **(metadata or {})
+            if chunks_count == 0:
+                self.catalog.release(doc_id)
+                return {
+                    "success": False,
+                    "error": "无法读取文档内容"
                 }
-                documents.append(
-                    Document(page_content=chunk, metadata=doc_metadata)
-                )
             
-            # 添加到向量存储
-            ids = self.vector_store.add_documents(documents)
+            # 同步更新文档目录
+            self.catalog.upsert(
+                doc_id=doc_id,
+                source=source,
+                chunk_count=chunks_count,
+                size_bytes=os.path.getsize(file_path),
+                content_hash=doc_id,
+                metadata={"pages": pages_count, **(metadata or {})}
+            )
             
             return {
                 "success": True,
                 "doc_id": doc_id,
-                "chunks_count": len(chunks),
+                "chunks_count": chunks_count,
+                "pages_count": pages_count,
                 "vector_ids": ids
             }
         
         except Exception as e:
+            # 清理已写入的部分分块，避免留下不完整的文档
+            if doc_id and chunks_count:
+                try:
+                    self.vector_store.delete(where={"doc_id": doc_id})
+                except Exception:
+                    pass
+            if claimed:
+                self.catalog.release(doc_id)
             return {
                 "success": False,
                 "error": str(e)
@@ -147,7 +254,59 @@ class VectorStoreManager:
             return formatted_results
         
         except Exception as e:
-            print(f"搜索错误: {e}")
+            logger.error("搜索错误: %s", e)
+            return []
+    
+    def retrieve(
+        self,
+        query: str,
+        k: int = 8,
+        fetch_k: int = 20,
+        token_budget: int = 3000,
+        lambda_mult: float = 0.6
+    ) -> List[Dict]:
+        """
+        RAG 检索管线：过量召回 → MMR 重排去重 → 按 token 预算打包并合并相邻分块
+        
+        Args:
+            query: 查询文本
+            k: 重排后最多保留的分块数
+            fetch_k: 初始召回数量
+            token_budget: 上下文 token 预算
+            lambda_mult: MMR 相关性与多样性的权衡
+        
+        Returns:
+            段落列表（见 tools.retrieval.pack_context）
+        """
+        try:
+            with metrics_collector.track("embedding", "query", size=len(query.encode("utf-8"))):
+                query_embedding = self.embeddings.embed_query(query)
+            results = self.vector_store._collection.query(
+                query_embeddings=[query_embedding],
+                n_results=fetch_k,
+                include=["documents", "metadatas", "distances", "embeddings"]
+            )
+            
+            documents = results["documents"][0] if results.get("documents") else []
+            if not documents:
+                return []
+            metadatas = results["metadatas"][0]
+            distances = results["distances"][0]
+            embeddings = results["embeddings"][0]
+            
+            selected = mmr_select(query_embedding, embeddings, k=k, lambda_mult=lambda_mult)
+            chunks = [
+                {
+                    "content": documents[i],
+                    "metadata": metadatas[i] or {},
+                    "score": 1.0 / (1.0 + float(distances[i]))
+                }
+                for i in selected
+            ]
+            return pack_context(chunks, token_budget=token_budget)
+        
+        except Exception as e:
+            logger.error("检索错误: %s", e)
             return []
     
     def get_document_by_id(self, doc_id: str) -> Optional[List[Dict]]:
@@ -161,6 +320,9 @@ class VectorStoreManager:
             文档分块列表
         """
         try:
+            if not self.catalog.exists(doc_id):
+                return None
+            
             results = self.vector_store.get(
                 where={"doc_id": doc_id}
             )
@@ -185,7 +347,7 @@ class VectorStoreManager:
             return chunks
         
         except Exception as e:
-            print(f"获取文档错误: {e}")
+            logger.error("获取文档错误: %s", e)
             return None
     
     def delete_document(self, doc_id: str) -> bool:
@@ -202,69 +364,106 @@ class VectorStoreManager:
             self.vector_store.delete(
                 where={"doc_id": doc_id}
             )
+            self.catalog.delete(doc_id)
             return True
         except Exception as e:
-            print(f"删除文档错误: {e}")
+            logger.error("删除文档错误: %s", e)
             return False
     
-    def list_documents(self) -> List[Dict]:
+    def list_documents(self, limit: int = 50, offset: int = 0) -> List[Dict]:
         """
-        列出所有文档
+        分页列出文档（读取文档目录，不扫描向量集合）
+        
+        Args:
+            limit: 每页数量
+            offset: 偏移量
         
         Returns:
             文档列表
         """
         try:
-            # 获取所有文档的元数据
-            results = self.vector_store.get()
-            
-            if not results or not results.get('metadatas'):
-                return []
-            
-            # 按 doc_id 去重
-            docs_map = {}
-            for metadata in results['metadatas']:
-                doc_id = metadata.get('doc_id')
-                if doc_id and doc_id not in docs_map:
-                    docs_map[doc_id] = {
-                        "doc_id": doc_id,
-                        "source": metadata.get('source', 'unknown'),
-                        "total_chunks": metadata.get('total_chunks', 0)
-                    }
-            
-            return list(docs_map.values())
-        
+            return self.catalog.list(limit=limit, offset=offset)
         except Exception as e:
-            print(f"列出文档错误: {e}")
+            logger.error("列出文档错误: %s", e)
             return []
     
-    def _load_document(self, file_path: str) -> Optional[str]:
-        """加载文档内容"""
-        ext = os.path.splitext(file_path)[1].lower()
-        
+    def count_documents(self) -> int:
+        """文档总数"""
         try:
-            if ext == '.txt':
-                with open(file_path, 'r', encoding='utf-8') as f:
-                    return f.read()
-            elif ext == '.pdf':
-                loader = PyPDFLoader(file_path)
-                pages = loader.load()
-                return "\n\n".join([p.page_content for p in pages])
-            elif ext in ['.docx', '.doc']:
-                loader = Docx2txtLoader(file_path)
-                docs = loader.load()
-                return "\n\n".join([d.page_content for d in docs])
-            else:
-                # 尝试作为文本读取
-                with open(file_path, 'r', encoding='utf-8') as f:
-                    return f.read()
+            return self.catalog.count()
         except Exception as e:
-            print(f"加载文档失败 {file_path}: {e}")
-            return None
+            logger.error("统计文档错误: %s", e)
+            return 0
+    
+    def has_document(self, doc_id: str) -> bool:
+        """检查文档是否存在"""
+        return self.catalog.exists(doc_id)
+    
+    def export_snapshot(self, path: str, dtype: str = "float32") -> Dict[str, Any]:
+        """
+        导出知识库快照（包含向量，恢复时无需重新嵌入）
+        
+        Args:
+            path: 快照文件路径（.npz）
+            dtype: 向量存储精度 float16 / float32
+        
+        Returns:
+            快照清单
+        """
+        return kb_snapshot.export_collection(self.vector_store._collection, path, dtype=dtype)
+    
+    def restore_snapshot(self, path: str) -> Dict[str, Any]:
+        """
+        从快照批量恢复知识库，并重建文档目录
+        
+        Args:
+            path: 快照文件路径
+        
+        Returns:
+            快照清单
+        """
+        manifest = kb_snapshot.restore_collection(self.vector_store._collection, path)
+        self.catalog.rebuild(kb_snapshot.iter_snapshot_metadatas(path))
+        return manifest
+    
+    def _add_batch(self, batch: List[Document]) -> List[str]:
+        """嵌入并写入一批分块（记录嵌入耗时与文本字节数）"""
+        size = sum(len(doc.page_content.encode("utf-8")) for doc in batch)
+        with metrics_collector.track("embedding", "documents", size=size):
+            return self.vector_store.add_documents(batch)
+
+    def _iter_document_pages(self, file_path: str) -> Iterator[Tuple[Optional[int], str]]:
+        """
+        逐页读取文档内容
+        
+        Yields:
+            (页码, 页面文本)，非分页格式的页码为 None
+        """
+        ext = os.path.splitext(file_path)[1].lower()
+        
+        if ext == '.pdf':
+            loader = PyPDFLoader(file_path)
+            for page in loader.lazy_load():
+                if page.page_content.strip():
+                    yield page.metadata.get('page', 0) + 1, page.page_content
+        elif ext in ['.docx', '.doc']:
+            loader = Docx2txtLoader(file_path)
+            for doc in loader.lazy_load():
+                yield None, doc.page_content
+        else:
+            # 文本文件（及其他格式尝试作为文本读取）
+            with open(file_path, 'r', encoding='utf-8') as f:
+                content = f.read()
+            if content:
+                yield None, content
     
-    def _generate_doc_id(self, content: str) -> str:
-        """生成文档ID（基于内容哈希）"""
-        return hashlib.md5(content.encode('utf-8')).hexdigest()
+    def _generate_doc_id(self, file_path: str) -> str:
+        """生成文档ID（基于文件内容哈希，分块读取）"""
+        md5 = hashlib.md5()
+        with open(file_path, 'rb') as f:
+            for block in iter(lambda: f.read(1024 * 1024), b''):
+                md5.update(block)
+        return md5.hexdigest()
 
 
 # 全局实例
@@ -0,0 +1,122 @@
+"""
+日志配置 - 分级、惰性格式化、请求 ID 关联的结构化日志
+业务代码只调用 logging.getLogger(__name__)；记录先进入内存队列，由后台线程统一格式化并写出，
+请求线程不再同步写 stdout
+"""
+
+import atexit
+import contextvars
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import sys
+from datetime import datetime
+from typing import Optional
+
+# 当前请求 ID（由 app.py 的 HTTP 中间件设置，asyncio 任务与 to_thread 线程会继承）
+request_id_var: contextvars.ContextVar[str] = contextvars.ContextVar("request_id", default="-")
+
+TEXT_FORMAT = "%(asctime)s %(levelname)-7s [%(request_id)s] %(name)s: %(message)s"
+
+# LogRecord 的标准属性，其余属性视为 extra 字段输出到 JSON
+_RECORD_ATTRS = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime", "request_id"}
+
+_listener: Optional[logging.handlers.QueueListener] = None
+
+
+class RequestIdFilter(logging.Filter):
+    """在产生日志的线程中为记录附加当前请求 ID"""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.request_id = request_id_var.get()
+        return True
+
+
+class JsonFormatter(logging.Formatter):
+    """每条记录输出一行 JSON，extra 参数中的字段原样附加"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": datetime.fromtimestamp(record.created).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "request_id": getattr(record, "request_id", "-"),
+            "message": record.getMessage()
+        }
+        for key, value in record.__dict__.items():
+            if key not in _RECORD_ATTRS and not key.startswith("_"):
+                entry[key] = value
+        if record.exc_info:
+            entry["exc_info"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry["exc_info"] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class _QueueHandler(logging.handlers.QueueHandler):
+    """
+    只合并消息参数、不做完整格式化的 QueueHandler
+
+    标准实现会在调用线程里执行一次 format()（时间戳、异常堆栈拼接），
+    这里把这部分开销留给后台线程
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info and not record.exc_text:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+        record.exc_info = None
+        return record
+
+
+def setup_logging(level: Optional[str] = None, fmt: Optional[str] = None):
+    """
+    初始化根日志器（重复调用无副作用）
+
+    Args:
+        level: 日志级别，默认读取 LOG_LEVEL（INFO）
+        fmt: 输出格式 text/json，默认读取 LOG_FORMAT（text）
+    """
+    global _listener
+    if _listener is not None:
+        return
+
+    level = (level or os.getenv("LOG_LEVEL", "INFO")).upper()
+    fmt = (fmt or os.getenv("LOG_FORMAT", "text")).lower()
+
+    stream_handler = logging.StreamHandler(sys.stdout)
+    stream_handler.setFormatter(JsonFormatter() if fmt == "json" else logging.Formatter(TEXT_FORMAT))
+
+    log_queue: queue.SimpleQueue = queue.SimpleQueue()
+    queue_handler = _QueueHandler(log_queue)
+    queue_handler.addFilter(RequestIdFilter())
+
+    root = logging.getLogger()
+    root.handlers = [queue_handler]
+    root.setLevel(level)
+
+    # 第三方库的调试日志量很大，单独保持在 WARNING
+    for noisy in ("httpx", "httpcore", "urllib3", "chromadb", "google"):
+        logging.getLogger(noisy).setLevel(max(logging.WARNING, root.level))
+
+    _listener = logging.handlers.QueueListener(log_queue, stream_handler, respect_handler_level=True)
+    _listener.start()
+    atexit.register(shutdown_logging)
+
+
+def shutdown_logging():
+    """停止后台写出线程（写完队列中剩余的记录）"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+__all__ = [
+    "request_id_var",
+    "setup_logging",
+    "shutdown_logging"
+]
@@ -1,23 +1,33 @@
 """
 速率限制器 - 防止触发 API 配额限制
 """
+import logging
+import threading
 import time
 from functools import wraps
 from typing import Callable, Any
 import asyncio
 
+from services.metrics import RATE_LIMIT_WAITS, RATE_LIMIT_WAIT_SECONDS
+
+logger = logging.getLogger(__name__)
+
 class RateLimiter:
     """简单的速率限制器"""
     
-    def __init__(self, max_calls: int = 360, period: float = 60.0):
+    def __init__(self, max_calls: int = 360, period: float = 60.0, name: str = "default"):
         """
         Args:
             max_calls: 时间窗口内最大调用次数（默认360=Pro版配额）
             period: 时间窗口（秒，默认60秒=1分钟）
+            name: 限流器名称（用于 /metrics 标签）
         """
+        self.name = name
         self.max_calls = max_calls
         self.period = period
         self.calls = []
+        # 异步与同步调用（多个工作线程，如分段摘要）共用同一把锁；锁内只计算并预留调用时刻，不在锁内等待
+        self._lock = threading.Lock()
         
     def __call__(self, func: Callable) -> Callable:
         """装饰器"""
@@ -37,37 +47,45 @@ class RateLimiter:
         else:
             return sync_wrapper
     
+    def _reserve(self) -> float:
+        """
+        预留一个调用时刻，返回需要等待的秒数
+
+        预留按先后顺序排队：窗口已满时排在第 max_calls 个之前的调用过期之后，
+        且不早于已有的预留，因此任意时间窗口内的调用数不超过 max_calls
+        """
+        with self._lock:
+            now = time.time()
+            # 移除过期的调用记录（尚未到达的预留时刻保留）
+            self.calls = [call_time for call_time in self.calls if now - call_time < self.period]
+
+            slot = now
+            if self.calls:
+                slot = max(slot, self.calls[-1])
+            if len(self.calls) >= self.max_calls:
+                slot = max(slot, self.calls[-self.max_calls] + self.period + 0.1)  # 多等0.1秒确保安全
+            self.calls.append(slot)
+            return slot - now
+
     async def _wait_if_needed(self):
         """异步等待"""
-        now = time.time()
-        # 移除过期的调用记录
-        self.calls = [call_time for call_time in self.calls if now - call_time < self.period]
-        
-        if len(self.calls) >= self.max_calls:
-            # 需要等待
-            oldest_call = min(self.calls)
-            wait_time = self.period - (now - oldest_call) + 0.1  # 多等0.1秒确保安全
-            print(f"[RateLimiter] 达到速率限制，等待 {wait_time:.1f} 秒...")
+        wait_time = self._reserve()
+        if wait_time > 0:
+            logger.warning("[RateLimiter] 达到速率限制，等待 %.1f 秒...", wait_time)
+            self._record_wait(wait_time)
             await asyncio.sleep(wait_time)
-            now = time.time()
-            self.calls = [call_time for call_time in self.calls if now - call_time < self.period]
-        
-        self.calls.append(now)
     
     def _wait_if_needed_sync(self):
         """同步等待"""
-        now = time.time()
-        self.calls = [call_time for call_time in self.calls if now - call_time < self.period]
-        
-        if len(self.calls) >= self.max_calls:
-            oldest_call = min(self.calls)
-            wait_time = self.period - (now - oldest_call) + 0.1
-            print(f"[RateLimiter] 达到速率限制，等待 {wait_time:.1f} 秒...")
+        wait_time = self._reserve()
+        if wait_time > 0:
+            logger.warning("[RateLimiter] 达到速率限制，等待 %.1f 秒...", wait_time)
+            self._record_wait(wait_time)
             time.sleep(wait_time)
-            now = time.time()
-            self.calls = [call_time for call_time in self.calls if now - call_time < self.period]
-        
-        self.calls.append(now)
+
+    def _record_wait(self, wait_time: float):
+        RATE_LIMIT_WAITS.inc(limiter=self.name)
+        RATE_LIMIT_WAIT_SECONDS.observe(wait_time, limiter=self.name)
 
 # 全局速率限制器实例（Pro版配额：360 RPM）
-gemini_limiter = RateLimiter(max_calls=350, period=60.0)  # 留10个buffer
+gemini_limiter = RateLimiter(max_calls=350, period=60.0, name="gemini")  # 留10个buffer